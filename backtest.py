@@ -0,0 +1,382 @@
+"""
+Backtest vector hoá cho hai bộ chấm điểm của bot:
+- "signal": điểm MUA/BÁN của generate_signal (scoring.signal_scores +
+  classify_signal), chỉ báo như calculate_indicators;
+- "trend": score_up/score_down của analyze_tf (EMA5/20, MA50/200, MACD,
+  RSI14, SAR, volume, Supertrend), mỗi nến tính trên TREND_WINDOW nến cuối
+  như /trend (cửa sổ trượt, kernel 2 chiều).
+
+Chỉ báo được tính một lượt trên cả chuỗi nến (kernels), điểm của mọi nến là
+phép so sánh trên mảng, nên vài năm nến 15m chạy trong vài giây thay vì gọi
+pandas/ta cho từng nến. `--check N` đối chiếu N nến với chính
+generate_signal / analyze_tf của heli_bot.
+
+Mô phỏng: tín hiệu ở nến đóng t khớp ở giá mở nến t+1; MUA -> giữ long, BÁN
+-> đóng lệnh (hoặc short nếu --short), Trung lập / Sideway giữ nguyên vị thế.
+Mỗi lần vào / ra trả phí + trượt giá (bps mỗi chiều).
+
+    python backtest.py HELIUSDT                       # 3 năm nến 15m từ kho nến (đồng bộ MEXC)
+    python backtest.py HELIUSDT --no-sync --check 50  # chỉ dữ liệu đã lưu, đối chiếu 50 nến
+    python backtest.py --synthetic 200000             # chuỗi giả lập, đo thông lượng
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import sys
+import time
+from dataclasses import asdict, dataclass
+
+import numpy as np
+
+import kernels
+from candle_store import INTERVAL_MS, get_candle_store
+
+BACKTEST_FEE_BPS = float(os.getenv("BACKTEST_FEE_BPS", 10))       # phí mỗi chiều (0.1%)
+BACKTEST_SLIPPAGE_BPS = float(os.getenv("BACKTEST_SLIPPAGE_BPS", 5))
+BACKTEST_WARMUP = 200  # số nến đầu không giao dịch (EMA200 / MA200 chưa ổn định)
+BACKTEST_YEARS = 3
+TREND_WINDOW = 100   # = heli_bot.TREND_BARS: /trend gọi analyze_tf trên 100 nến cuối
+TREND_CHUNK = 8192   # số cửa sổ tính mỗi lượt (giới hạn bộ nhớ ma trận cửa sổ x nến)
+
+STRATEGIES = ("signal", "trend")
+DIRECTION_TEXT = {1: "MUA", -1: "BÁN", 0: "Trung lập"}
+
+
+# -------------------------------
+# Điểm cho mọi nến
+# -------------------------------
+def signal_scores(high, low, close, volume) -> tuple[np.ndarray, np.ndarray]:
+    """(điểm MUA, điểm BÁN) của generate_signal cho từng nến."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        smin = kernels.rolling(low, 14, np.min)
+        smax = kernels.rolling(high, 14, np.max)
+        stoch_k = 100 * (close - smin) / (smax - smin)
+        stoch_d = kernels.rolling(stoch_k, 3, np.mean)
+    macd = kernels.ewm(close, 12, span=12) - kernels.ewm(close, 26, span=26)
+    macd_signal = kernels.ewm(macd, 9, span=9)
+    ema8 = kernels.ewm(close, 8, span=8)
+    ema21 = kernels.ewm(close, 21, span=21)
+    rsi = kernels.rsi(close, 9)
+
+    buy = (
+        (ema8 > ema21).astype(np.int8)
+        + (macd > macd_signal)
+        + ((rsi > 40) & (rsi < 70))
+        + (close > ema8)
+        + (stoch_k > stoch_d)
+    )
+    sell = (
+        (ema8 < ema21).astype(np.int8)
+        + (macd < macd_signal)
+        + ((rsi > 70) | (rsi < 30))
+        + (close < ema21)
+        + (stoch_k < stoch_d)
+    )
+    return buy, sell
+
+
+def signal_direction(buy: np.ndarray, sell: np.ndarray) -> np.ndarray:
+    """1 / -1 / 0 theo classify_signal (MUA mạnh/yếu, BÁN mạnh/yếu, Trung lập)."""
+    return np.where((buy >= 4) & (sell <= 2), 1, np.where((sell >= 4) & (buy <= 2), -1, 0)).astype(np.int8)
+
+
+def trend_scores(high, low, close, volume, bars: int = TREND_WINDOW) -> tuple[np.ndarray, np.ndarray]:
+    """
+    (score_up, score_down) của analyze_tf cho từng nến, mỗi nến tính trên
+    `bars` nến cuối như /trend (EMA bắt đầu từ đầu cửa sổ, MA200 luôn NaN
+    khi bars < 200). Nến chưa đủ cửa sổ có điểm 0/0.
+    """
+    n = len(close)
+    up, down = np.zeros(n, dtype=np.int8), np.zeros(n, dtype=np.int8)
+    if n < bars:
+        return up, down
+    view = lambda x: np.lib.stride_tricks.sliding_window_view(x, bars)
+    h, l, c, v = view(high), view(low), view(close), view(volume)
+    for start in range(0, len(c), TREND_CHUNK):
+        part = slice(start, start + TREND_CHUNK)
+        # Thứ tự cột (Fortran): các kernel 2 chiều duyệt theo cột, đọc cột liền bộ nhớ
+        s_up, s_down = _window_trend_scores(*(np.asfortranarray(x[part]) for x in (h, l, c, v)))
+        up[bars - 1 + start:bars - 1 + start + len(s_up)] = s_up
+        down[bars - 1 + start:bars - 1 + start + len(s_down)] = s_down
+    return up, down
+
+
+def _window_trend_scores(h, l, c, v) -> tuple[np.ndarray, np.ndarray]:
+    """Điểm analyze_tf ở nến cuối của mỗi dòng (mỗi dòng là một cửa sổ nến)."""
+    last = lambda x: x[:, -1]
+    ema5 = last(kernels.ewm_2d(c, 5, span=5))
+    ema20 = last(kernels.ewm_2d(c, 20, span=20))
+    ma50 = last(kernels.rolling_2d(c, 50, np.mean))
+    ma200 = last(kernels.rolling_2d(c, 200, np.mean))
+    macd_line = kernels.ewm_2d(c, 12, span=12) - kernels.ewm_2d(c, 26, span=26)
+    macd = last(macd_line)
+    macd_signal = last(kernels.ewm_2d(macd_line, 9, span=9))
+    rsi = last(kernels.rsi_2d(c, 14))
+    sar = last(kernels.psar_2d(h, l, c))
+    vol_avg = last(kernels.rolling_2d(v, 20, np.mean))
+    st = last(kernels.supertrend_2d(h, l, c))
+    close, volume = last(c), last(v)
+
+    ema_up = ema5 > ema20
+    ma_up = ma50 > ma200
+    macd_up = macd > macd_signal
+    sar_up = close > sar
+    st_up = st == 1
+    vol_up = volume > vol_avg * 1.2
+    vol_down = ~vol_up & (volume < vol_avg * 0.8)
+
+    up = (
+        ema_up.astype(np.int8) + ma_up + macd_up + (rsi < 30) + sar_up + vol_up + st_up
+    )
+    down = (
+        (~ema_up).astype(np.int8) + ~ma_up + ~macd_up + (rsi > 70) + ~sar_up + vol_down + ~st_up
+    )
+    return up, down
+
+
+def trend_direction(up: np.ndarray, down: np.ndarray) -> np.ndarray:
+    """1 / -1 / 0 theo nhận định của analyze_tf (TĂNG / GIẢM / SIDEWAY)."""
+    return np.where(up >= down * 1.5, 1, np.where(down >= up * 1.5, -1, 0)).astype(np.int8)
+
+
+def directions(strategy: str, high, low, close, volume) -> np.ndarray:
+    if strategy == "signal":
+        return signal_direction(*signal_scores(high, low, close, volume))
+    if strategy == "trend":
+        return trend_direction(*trend_scores(high, low, close, volume))
+    raise ValueError(f"Chiến lược không hỗ trợ: {strategy}")
+
+
+# -------------------------------
+# Mô phỏng lệnh
+# -------------------------------
+@dataclass
+class BacktestResult:
+    strategy: str
+    bars: int
+    trades: int
+    hit_rate: float          # % lệnh có lãi (sau phí)
+    pnl_pct: float           # lãi/lỗ cộng dồn của vốn (sau phí)
+    buy_hold_pct: float
+    max_drawdown_pct: float
+    avg_trade_pct: float
+    exposure_pct: float      # % thời gian có vị thế
+    costs_pct: float         # phí + trượt giá cộng dồn qua mọi lần khớp (% giá trị lệnh)
+    seconds: float           # chỉ báo + điểm + mô phỏng
+    bars_per_second: float
+
+    def format(self) -> str:
+        return (
+            f"📊 {self.strategy}: {self.bars:,} nến, {self.trades:,} lệnh, thắng {self.hit_rate:.1f}%\n"
+            f"  PnL {self.pnl_pct:+.1f}% (mua & giữ {self.buy_hold_pct:+.1f}%), "
+            f"drawdown tối đa {self.max_drawdown_pct:.1f}%\n"
+            f"  TB mỗi lệnh {self.avg_trade_pct:+.2f}%, có vị thế {self.exposure_pct:.0f}% thời gian, "
+            f"phí + trượt giá {self.costs_pct:.0f}%\n"
+            f"  ⏱️ {self.seconds*1000:.0f}ms ({self.bars_per_second:,.0f} nến/s)"
+        )
+
+
+def positions(direction: np.ndarray, allow_short: bool = False, warmup: int = BACKTEST_WARMUP) -> np.ndarray:
+    """Vị thế sau mỗi nến: tín hiệu 0 giữ vị thế của nến trước (forward-fill)."""
+    raw = np.where(direction == 0, np.nan, direction.astype(np.float64))
+    if not allow_short:
+        raw[raw < 0] = 0.0  # BÁN = đóng long
+    raw[:warmup] = 0.0
+    idx = np.where(~np.isnan(raw), np.arange(len(raw)), 0)
+    np.maximum.accumulate(idx, out=idx)
+    return raw[idx]
+
+
+def simulate(open_: np.ndarray, direction: np.ndarray, fee_bps: float = BACKTEST_FEE_BPS,
+             slippage_bps: float = BACKTEST_SLIPPAGE_BPS, allow_short: bool = False,
+             warmup: int = BACKTEST_WARMUP) -> dict:
+    """
+    Khớp ở giá mở nến kế tiếp: vị thế chọn ở nến đóng t được giữ trong
+    khoảng [open t+1, open t+2). Trả về các chỉ số của BacktestResult
+    (trừ strategy / thời gian).
+    """
+    n = len(open_)
+    if n < 3:
+        raise ValueError("Cần ít nhất 3 nến")
+    pos = positions(direction, allow_short, warmup)
+    step = open_[1:] / open_[:-1] - 1          # khoảng k: open k -> open k+1
+    held = np.r_[0.0, pos[:-2]]                 # vị thế trong khoảng k = quyết định ở nến k-1
+    turnover = np.abs(np.diff(np.r_[0.0, held]))
+    cost_log = math.log1p(-(fee_bps + slippage_bps) / 1e4)
+    gross_log = np.log1p(held * step)
+    net_log = gross_log + turnover * cost_log
+    equity = np.exp(np.cumsum(net_log))
+    peak = np.maximum.accumulate(np.maximum(equity, 1.0))
+
+    # Mỗi lệnh là một đoạn `held` không đổi khác 0; phí vào + ra tính cho lệnh đó
+    starts = np.flatnonzero(np.r_[True, held[1:] != held[:-1]])
+    in_trade = held[starts] != 0
+    trade_log = np.add.reduceat(gross_log, starts)[in_trade] + 2 * cost_log
+    trade_ret = np.expm1(trade_log)
+
+    return {
+        "bars": n,
+        "trades": int(len(trade_ret)),
+        "hit_rate": float((trade_ret > 0).mean() * 100) if len(trade_ret) else 0.0,
+        "pnl_pct": float((equity[-1] - 1) * 100),
+        "buy_hold_pct": float((open_[-1] / open_[min(warmup + 1, n - 1)] - 1) * 100),
+        "max_drawdown_pct": float((1 - equity / peak).max() * 100),
+        "avg_trade_pct": float(trade_ret.mean() * 100) if len(trade_ret) else 0.0,
+        "exposure_pct": float((held != 0).mean() * 100),
+        "costs_pct": float(turnover.sum() * (fee_bps + slippage_bps) / 100),
+    }
+
+
+def run(strategy: str, cols: dict, fee_bps: float = BACKTEST_FEE_BPS,
+        slippage_bps: float = BACKTEST_SLIPPAGE_BPS, allow_short: bool = False) -> BacktestResult:
+    started = time.perf_counter()
+    direction = directions(strategy, cols["high"], cols["low"], cols["close"], cols["volume"])
+    stats = simulate(cols["open"], direction, fee_bps, slippage_bps, allow_short)
+    seconds = time.perf_counter() - started
+    return BacktestResult(strategy=strategy, seconds=seconds, bars_per_second=stats["bars"] / seconds, **stats)
+
+
+# -------------------------------
+# Dữ liệu
+# -------------------------------
+def columns(rows: list) -> dict:
+    """Dòng nến (theo candle_store.COLUMNS) -> {cột: mảng}."""
+    data = np.array([row[:6] for row in rows], dtype=np.float64).reshape(-1, 6)
+    return {
+        "open_time": data[:, 0].astype(np.int64),
+        "open": data[:, 1], "high": data[:, 2], "low": data[:, 3], "close": data[:, 4], "volume": data[:, 5],
+    }
+
+
+def synthetic_columns(n: int, interval: str = "15m", seed: int = 0) -> dict:
+    """Chuỗi giả lập (random walk có xu hướng theo đợt) để đo thông lượng."""
+    rng = np.random.default_rng(seed)
+    drift = np.repeat(rng.normal(0, 0.0005, n // 500 + 1), 500)[:n]
+    close = np.exp(np.cumsum(drift + rng.normal(0, 0.01, n))) * 0.001
+    open_ = np.r_[close[0], close[:-1]]
+    step = INTERVAL_MS[interval]
+    return {
+        "open_time": np.arange(n, dtype=np.int64) * step,
+        "open": open_,
+        "high": np.maximum(open_, close) * (1 + rng.random(n) * 0.01),
+        "low": np.minimum(open_, close) * (1 - rng.random(n) * 0.01),
+        "close": close,
+        "volume": rng.lognormal(10, 0.5, n),
+    }
+
+
+async def load_candles(symbol: str, interval: str, bars: int, sync: bool = True) -> list:
+    store = get_candle_store()
+    if not sync:
+        return store.load(symbol, interval, bars)
+    from clients import close_clients
+
+    try:
+        return await store.sync(symbol, interval, bars)
+    finally:
+        await close_clients()
+
+
+# -------------------------------
+# Đối chiếu với heli_bot
+# -------------------------------
+def check(cols: dict, samples: int) -> tuple[int, int, float]:
+    """
+    So hướng tín hiệu vector hoá với generate_signal / analyze_tf của
+    heli_bot ở `samples` nến rải đều. Trả về (số nến khớp, số nến đã so,
+    giây trung bình mỗi nến của bản gốc).
+    """
+    os.environ.setdefault("BOT_TOKEN", "0:backtest")
+    import pandas as pd
+
+    import heli_bot
+    from scoring import classify_signal, signal_scores as row_scores
+
+    n = len(cols["close"])
+    picks = np.unique(np.linspace(BACKTEST_WARMUP, n - 1, samples).astype(int))
+    signal_dir = directions("signal", cols["high"], cols["low"], cols["close"], cols["volume"])
+    trend_dir = directions("trend", cols["high"], cols["low"], cols["close"], cols["volume"])
+    ohlc = pd.DataFrame({k: cols[k] for k in ("open", "high", "low", "close", "volume")})
+    short = ohlc.rename(columns={"high": "h", "low": "l", "close": "c", "volume": "v"})
+
+    def as_direction(text: str, up: str, down: str) -> int:
+        return 1 if up in text else -1 if down in text else 0
+
+    matched = 0
+    started = time.perf_counter()
+    for t in picks:
+        # Bản gốc chỉ thấy các nến tới t: generate_signal trên cả lịch sử (engine
+        # streaming), analyze_tf trên TREND_WINDOW nến cuối như /trend
+        df = heli_bot.calculate_indicators(ohlc.iloc[:t + 1].copy())
+        signal, _ = heli_bot.generate_signal(df)
+        _, summary = heli_bot.analyze_tf(short.iloc[t + 1 - TREND_WINDOW:t + 1])
+        ok = (as_direction(signal, "MUA", "BÁN") == signal_dir[t]
+              and as_direction(summary, "TĂNG", "GIẢM") == trend_dir[t])
+        if not ok:
+            buy, sell = row_scores(df.iloc[-1])
+            print(f"  ⚠️ Nến {t}: signal {signal} ({buy}/{sell}, {classify_signal(buy, sell)[0]}) "
+                  f"/ vector {DIRECTION_TEXT[int(signal_dir[t])]}; trend {summary} / vector "
+                  f"{DIRECTION_TEXT[int(trend_dir[t])]}")
+        matched += ok
+    return matched, len(picks), (time.perf_counter() - started) / len(picks)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Backtest vector hoá generate_signal / analyze_tf")
+    ap.add_argument("symbol", nargs="?", default="HELIUSDT")
+    ap.add_argument("--interval", default="15m", choices=sorted(INTERVAL_MS))
+    ap.add_argument("--bars", type=int, help=f"số nến (mặc định {BACKTEST_YEARS} năm theo interval)")
+    ap.add_argument("--strategy", default="all", choices=(*STRATEGIES, "all"))
+    ap.add_argument("--fee-bps", type=float, default=BACKTEST_FEE_BPS, help="phí mỗi chiều (bps)")
+    ap.add_argument("--slippage-bps", type=float, default=BACKTEST_SLIPPAGE_BPS, help="trượt giá mỗi chiều (bps)")
+    ap.add_argument("--short", action="store_true", help="BÁN = mở short thay vì chỉ đóng long")
+    ap.add_argument("--no-sync", action="store_true", help="chỉ dùng nến đã lưu, không gọi MEXC")
+    ap.add_argument("--synthetic", type=int, metavar="N", help="dùng N nến giả lập thay cho kho nến")
+    ap.add_argument("--check", type=int, default=0, metavar="N", help="đối chiếu N nến với heli_bot")
+    ap.add_argument("--out", help="ghi kết quả ra file JSON")
+    args = ap.parse_args(argv)
+
+    if args.synthetic:
+        source = f"synthetic:{args.synthetic}"
+        cols = synthetic_columns(args.synthetic, args.interval)
+    else:
+        bars = args.bars or BACKTEST_YEARS * 365 * 86_400_000 // INTERVAL_MS[args.interval]
+        source = f"{args.symbol} {args.interval}"
+        started = time.perf_counter()
+        rows = asyncio.run(load_candles(args.symbol, args.interval, bars, sync=not args.no_sync))
+        cols = columns(rows)
+        print(f"📥 {len(rows):,} nến {source} ({time.perf_counter() - started:.1f}s)")
+    if len(cols["close"]) <= BACKTEST_WARMUP + 2:
+        print(f"⚠️ Không đủ dữ liệu: cần hơn {BACKTEST_WARMUP + 2} nến")
+        sys.exit(1)
+
+    strategies = STRATEGIES if args.strategy == "all" else (args.strategy,)
+    results = [run(s, cols, args.fee_bps, args.slippage_bps, args.short) for s in strategies]
+    for result in results:
+        print(result.format())
+
+    report = {
+        "source": source,
+        "fee_bps": args.fee_bps,
+        "slippage_bps": args.slippage_bps,
+        "short": args.short,
+        "results": [asdict(r) for r in results],
+    }
+    if args.check:
+        matched, total, per_bar = check(cols, args.check)
+        fast = min(r.seconds / r.bars for r in results)
+        print(f"🔎 Khớp heli_bot {matched}/{total} nến; bản gốc {per_bar*1000:.0f}ms/nến "
+              f"(cả chuỗi ước tính {per_bar * len(cols['close']) / 60:,.0f} phút, chậm hơn "
+              f"{per_bar / fast:,.0f}x)")
+        report["check"] = {"matched": matched, "total": total, "reference_seconds_per_bar": per_bar}
+    if args.out:
+        if os.path.dirname(args.out):
+            os.makedirs(os.path.dirname(args.out), exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
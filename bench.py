@@ -0,0 +1,598 @@
+"""
+Benchmark offline cho mọi lệnh của bot, không gọi MEXC/LCD thật.
+
+Một mock HTTP (thread riêng) phục vụ fixture LCD/MEXC/CoinGecko. Mỗi
+CommandHandler đã đăng ký trong `heli_bot.build_application()` được gọi qua
+Update/Context giả. Với từng lệnh, bench ghi lại:
+- thời gian lần đầu (cache lạnh) và các lần sau;
+- số request và số byte tải từ upstream;
+- bộ nhớ đỉnh (tracemalloc, đo ở một lượt riêng với cache lệnh lạnh).
+Mặc định snapshot nền được làm nóng trước như khi bot chạy; `--cold` bỏ
+snapshot + cache trước từng lệnh để lần đầu tự tải hết từ upstream.
+Kết quả ghi ra JSON để so sánh giữa các lần chạy.
+
+    python bench.py                                  # fixture tổng hợp (cố định seed)
+    python bench.py --record data/bench/fixtures.json  # ghi fixture từ LCD/MEXC thật
+    python bench.py --fixtures data/bench/fixtures.json --compare data/bench/old.json
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+from aiohttp import web
+
+BENCH_REPEAT = 5
+BENCH_TIMEOUT = 120  # giây cho mỗi lần gọi handler
+BENCH_ARGS = {       # tham số truyền cho từng lệnh (mặc định: không có)
+    "flow": ["1h"],
+    "support_resist": ["0.2"],
+    "grant": ["123456"],
+    "revoke": ["123456"],
+}
+KLINE_INTERVALS = ("5m", "15m", "60m", "4h", "1d")
+INTERVAL_ALIASES = {"1h": "60m"}
+INTERVAL_MS = {"1m": 60_000, "5m": 300_000, "15m": 900_000, "30m": 1_800_000,
+               "60m": 3_600_000, "4h": 14_400_000, "1d": 86_400_000}
+SYNTH_SYMBOLS = 50
+SYNTH_CANDLES = 1000
+SYNTH_TXS = 300  # tx chuyển ra mỗi ví theo dõi, rải trong 120 ngày
+
+
+# --- Fixture ---
+def _rng(*parts) -> random.Random:
+    seed = int(hashlib.sha1(":".join(map(str, parts)).encode()).hexdigest()[:12], 16)
+    return random.Random(seed)
+
+
+def synth_klines(symbol: str, interval: str, end_ms: int, count: int = SYNTH_CANDLES) -> list:
+    """Nến 8 cột kiểu MEXC, random walk cố định theo (symbol, interval)."""
+    step = INTERVAL_MS[interval]
+    rng = _rng(symbol, interval)
+    price = 0.0123 if symbol == "HELIUSDT" else rng.uniform(0.01, 100)
+    last_open = end_ms // step * step
+    rows = []
+    for i in range(count):
+        t = last_open - (count - 1 - i) * step
+        o = price
+        c = max(o * math.exp(rng.gauss(0, 0.01)), 1e-9)
+        h = max(o, c) * (1 + abs(rng.gauss(0, 0.004)))
+        l = min(o, c) * (1 - abs(rng.gauss(0, 0.004)))
+        v = rng.lognormvariate(10, 1)
+        rows.append([t, f"{o:.8g}", f"{h:.8g}", f"{l:.8g}", f"{c:.8g}", f"{v:.2f}", t + step - 1, f"{v * c:.2f}"])
+        price = c
+    return rows
+
+
+def synthetic_fixtures(seed: int = 42) -> dict:
+    """Bộ fixture tổng hợp đủ cho mọi lệnh (60 validator, ~1000 entry unbonding, orderbook 1000 mức)."""
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    validators = []
+    unbonding = {}
+    for i in range(60):
+        valoper = f"helivaloper1bench{i:03d}"
+        validators.append({
+            "operator_address": valoper,
+            "jailed": i % 17 == 0,
+            "status": "BOND_STATUS_UNBONDED" if i % 17 == 0 else "BOND_STATUS_BONDED",
+            "tokens": str(rng.randint(10**11, 5 * 10**13)),
+            "description": {"moniker": f"bench-{i}"},
+            "commission": {"commission_rates": {"rate": f"{rng.choice([0.05, 0.1, 0.2]):.2f}"}},
+        })
+        responses = []
+        for _ in range(rng.randint(0, 30)):
+            done = now + timedelta(days=rng.uniform(0, 21))
+            responses.append({
+                "delegator_address": f"heli1benchdelegator{rng.randint(0, 500):04d}",
+                "validator_address": valoper,
+                "entries": [{
+                    "creation_height": str(rng.randint(1, 10**6)),
+                    "completion_time": done.isoformat().replace("+00:00", "Z"),
+                    "initial_balance": "0",
+                    "balance": str(rng.randint(10**6, 5 * 10**12)),
+                }],
+            })
+        unbonding[valoper] = responses
+
+    bonded = sum(int(v["tokens"]) for v in validators if v["status"] == "BOND_STATUS_BONDED")
+    price = 0.0123
+    bids = [[f"{price * (1 - 0.0005 * (k + 1)):.8g}", f"{rng.lognormvariate(11, 1.5):.2f}"] for k in range(1000)]
+    asks = [[f"{price * (1 + 0.0005 * (k + 1)):.8g}", f"{rng.lognormvariate(11, 1.5):.2f}"] for k in range(1000)]
+    symbols = ["HELIUSDT"] + [f"BENCH{i:02d}USDT" for i in range(SYNTH_SYMBOLS - 1)]
+    static = {
+        "/cosmos/base/tendermint/v1beta1/blocks/latest":
+            {"block": {"header": {"height": "1234567", "proposer_address": "BENCHPROPOSER"}}},
+        "/cosmos/staking/v1beta1/pool":
+            {"pool": {"bonded_tokens": str(bonded), "not_bonded_tokens": str(bonded // 20)}},
+        "/cosmos/bank/v1beta1/supply": {"supply": [{"denom": "uheli", "amount": str(bonded * 3)}]},
+        "/cosmos/mint/v1beta1/inflation": {"inflation": "0.120000000000000000"},
+        "/cosmos/staking/v1beta1/validators": {"validators": validators, "pagination": {"next_key": None}},
+        "/api/v3/ticker/price": {"symbol": "HELIUSDT", "price": str(price)},
+        "/api/v3/depth": {"lastUpdateId": 1, "bids": bids, "asks": asks},
+        "/api/v3/defaultSymbols": {"code": 200, "data": symbols},
+        "/api/v3/simple/price": {"heli": {"usd": price}},
+    }
+    return {"source": "synthetic", "static": static, "unbonding": unbonding, "klines": {}}
+
+
+async def record_fixtures(path: str):
+    """Ghi fixture từ LCD/MEXC thật (endpoint theo biến môi trường như bot)."""
+    from clients import close_clients, get_coingecko, get_lcd, get_mexc
+
+    lcd, mexc = get_lcd(), get_mexc()
+    static, unbonding, klines = {}, {}, {}
+    lcd_paths = [
+        "/cosmos/base/tendermint/v1beta1/blocks/latest",
+        "/cosmos/staking/v1beta1/pool",
+        "/cosmos/bank/v1beta1/supply",
+        "/cosmos/mint/v1beta1/inflation",
+    ]
+    for path in lcd_paths:
+        static[path] = await lcd.get_json(path)
+    validators = await lcd.validators(limit=2000)
+    static["/cosmos/staking/v1beta1/validators"] = {"validators": validators, "pagination": {"next_key": None}}
+    for v in validators:
+        valoper, responses, key = v["operator_address"], [], None
+        while True:
+            page = await lcd.validator_unbonding_page(valoper, key)
+            responses += page.get("unbonding_responses", [])
+            key = (page.get("pagination") or {}).get("next_key")
+            if not key:
+                break
+        unbonding[valoper] = responses
+
+    os.environ.setdefault("BOT_TOKEN", "bench")
+    from heli_bot import CORE_WALLETS
+    for address in CORE_WALLETS:
+        for path in (f"/cosmos/bank/v1beta1/balances/{address}",
+                     f"/cosmos/staking/v1beta1/delegations/{address}",
+                     f"/cosmos/staking/v1beta1/delegators/{address}/unbonding_delegations"):
+            static[path] = await lcd.get_json(path)
+
+    static["/api/v3/ticker/price"] = await mexc.get_json("/api/v3/ticker/price", {"symbol": "HELIUSDT"})
+    static["/api/v3/depth"] = await mexc.depth("HELIUSDT", 1000)
+    symbols = [s for s in await mexc.default_symbols() if s.endswith("USDT")]
+    static["/api/v3/defaultSymbols"] = {"code": 200, "data": ["HELIUSDT"] + symbols[:SYNTH_SYMBOLS - 1]}
+    for interval in KLINE_INTERVALS:
+        klines[f"HELIUSDT:{interval}"] = await mexc.klines("HELIUSDT", interval, 1000)
+    try:
+        static["/api/v3/simple/price"] = await get_coingecko().get_json(
+            "/api/v3/simple/price", params={"ids": "heli", "vs_currencies": "usd"})
+    except Exception as e:
+        logging.warning(f"[bench] Không ghi được giá CoinGecko: {e}")
+    await close_clients()
+
+    fixtures = {"source": "recorded", "recorded_at": int(time.time() * 1000),
+                "static": static, "unbonding": unbonding, "klines": klines}
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(fixtures, f)
+    print(f"Đã ghi fixture: {len(static)} endpoint, {len(unbonding)} validator, {len(klines)} chuỗi nến -> {path}")
+
+
+# --- Mock upstream ---
+class MockUpstream:
+    """Server HTTP cục bộ phục vụ fixture; đếm request và byte trả về."""
+
+    def __init__(self, fixtures: dict):
+        self.fixtures = fixtures
+        self.requests = 0
+        self.bytes = 0
+        self.by_path = {}
+        self._klines = {}  # (symbol, interval) -> list nến (cache nến tổng hợp)
+        self._txs = {}     # sender -> list tx tổng hợp (mới nhất trước)
+        self._lock = threading.Lock()
+        self._loop = None
+        self._runner = None
+        self.url = None
+
+    def counters(self) -> tuple[int, int]:
+        with self._lock:
+            return self.requests, self.bytes
+
+    def _series(self, symbol: str, interval: str) -> list:
+        key = (symbol, interval)
+        if key not in self._klines:
+            recorded = self.fixtures["klines"].get(f"{symbol}:{interval}")
+            self._klines[key] = recorded or synth_klines(symbol, interval, int(time.time() * 1000))
+        return self._klines[key]
+
+    def _klines_response(self, q) -> list:
+        interval = INTERVAL_ALIASES.get(q.get("interval", "15m"), q.get("interval", "15m"))
+        if interval not in INTERVAL_MS:
+            return []
+        rows = self._series(q.get("symbol", "HELIUSDT"), interval)
+        limit = int(q.get("limit", 500))
+        if "startTime" in q:
+            start = int(q["startTime"])
+            rows = [r for r in rows if r[0] >= start]
+        if "endTime" in q:
+            end = int(q["endTime"])
+            rows = [r for r in rows if r[0] <= end]
+        return rows[:limit] if "startTime" in q else rows[-limit:]
+
+    def _unbonding_page(self, valoper: str, q) -> dict:
+        items = self.fixtures["unbonding"].get(valoper, [])
+        start = int(q.get("pagination.key") or 0)
+        limit = int(q.get("pagination.limit", 100))
+        end = start + limit
+        return {"unbonding_responses": items[start:end],
+                "pagination": {"next_key": str(end) if end < len(items) else None}}
+
+    def _account(self, path: str, address: str):
+        """Số dư / delegation / unbonding của ví ngoài fixture: sinh cố định theo địa chỉ."""
+        rng = _rng(address)
+        if "/balances/" in path:
+            return {"balances": [{"denom": "uheli", "amount": str(rng.randint(0, 10**14))}]}
+        if "/delegations/" in path:
+            return {"delegation_responses": [
+                {"balance": {"denom": "uheli", "amount": str(rng.randint(0, 10**13))}} for _ in range(3)]}
+        return {"unbonding_responses": [
+            {"entries": [{"balance": str(rng.randint(0, 10**12))}]} for _ in range(2)]}
+
+    def _tx_page(self, q) -> dict:
+        """/cosmos/tx/v1beta1/txs theo transfer.sender: tx tổng hợp, phân trang offset."""
+        sender = q.get("events", "").partition("=")[2].strip("'")
+        if sender not in self._txs:
+            rng, now = _rng("txs", sender), time.time()
+            ages = sorted(rng.uniform(0, 120 * 86400) for _ in range(SYNTH_TXS))
+            self._txs[sender] = [{
+                "txhash": f"{sender[-8:]}{i:08d}", "height": str(10_000_000 - i), "code": 0,
+                "timestamp": datetime.fromtimestamp(now - age, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "events": [{"type": "transfer", "attributes": [
+                    {"key": "recipient", "value": f"heli1bench{rng.randrange(10**6):06d}"},
+                    {"key": "sender", "value": sender},
+                    {"key": "amount", "value": f"{rng.randint(1, 10**12)}uheli"},
+                ]}],
+            } for i, age in enumerate(ages)]
+        offset, limit = int(q.get("pagination.offset", 0)), int(q.get("pagination.limit", 100))
+        txs = self._txs[sender]
+        return {"tx_responses": txs[offset:offset + limit], "pagination": {"total": str(len(txs))}}
+
+    def _body(self, path: str, q):
+        static = self.fixtures["static"]
+        if path == "/api/v3/klines":
+            return self._klines_response(q)
+        if path == "/api/v3/time":
+            return {"serverTime": int(time.time() * 1000)}
+        if path in static:
+            return static[path]
+        parts = path.strip("/").split("/")
+        if path.startswith("/cosmos/staking/v1beta1/validators/") and parts[-1] == "unbonding_delegations":
+            return self._unbonding_page(parts[-2], q)
+        if path.startswith(("/cosmos/bank/v1beta1/balances/", "/cosmos/staking/v1beta1/delegations/")):
+            return self._account(path, parts[-1])
+        if path.startswith("/cosmos/staking/v1beta1/delegators/"):
+            return self._account(path, parts[-2])
+        if path == "/cosmos/tx/v1beta1/txs":
+            return self._tx_page(q)
+        return None
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        body = self._body(request.path, request.query)
+        status = 200 if body is not None else 404
+        data = json.dumps(body if body is not None else {"error": "no fixture"}).encode()
+        with self._lock:
+            self.requests += 1
+            self.bytes += len(data)
+            self.by_path[request.path] = self.by_path.get(request.path, 0) + 1
+        return web.Response(body=data, status=status, content_type="application/json")
+
+    def start(self) -> str:
+        ready = threading.Event()
+
+        def serve():
+            self._loop = asyncio.new_event_loop()
+            app = web.Application()
+            app.router.add_route("GET", "/{tail:.*}", self._handle)
+            self._runner = web.AppRunner(app, access_log=None)
+            self._loop.run_until_complete(self._runner.setup())
+            site = web.TCPSite(self._runner, "127.0.0.1", 0)
+            self._loop.run_until_complete(site.start())
+            port = self._runner.addresses[0][1]
+            self.url = f"http://127.0.0.1:{port}"
+            ready.set()
+            self._loop.run_forever()
+
+        threading.Thread(target=serve, name="bench-mock", daemon=True).start()
+        ready.wait(10)
+        return self.url
+
+    def stop(self):
+        if self._loop is not None:
+            asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result(10)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+# --- Update / Context giả ---
+class _Recorder:
+    def __init__(self):
+        self.replies = 0
+        self.bytes = 0
+
+    def add(self, text: str):
+        self.replies += 1
+        self.bytes += len((text or "").encode())
+
+
+class FakeSent:
+    def __init__(self, rec: _Recorder):
+        self._rec = rec
+
+    async def edit_text(self, text, **kwargs):
+        self._rec.add(text)
+        return self
+
+
+class FakeMessage:
+    def __init__(self, rec: _Recorder):
+        self._rec = rec
+
+    async def reply_text(self, text, **kwargs):
+        self._rec.add(text)
+        return FakeSent(self._rec)
+
+
+class FakeUser:
+    def __init__(self, user_id: int):
+        self.id = user_id
+        self.username = "bench"
+        self.first_name = "Bench"
+
+
+class FakeChat:
+    def __init__(self, chat_id: int):
+        self.id = chat_id
+
+
+class FakeBot:
+    def __init__(self, rec: _Recorder):
+        self._rec = rec
+
+    async def send_message(self, chat_id=None, text=None, **kwargs):
+        self._rec.add(text)
+        return FakeSent(self._rec)
+
+    async def get_chat(self, chat_id):
+        return FakeUser(chat_id)
+
+
+class FakeUpdate:
+    def __init__(self, rec: _Recorder, user_id: int):
+        self.message = FakeMessage(rec)
+        self.effective_user = FakeUser(user_id)
+        self.effective_chat = FakeChat(user_id)
+
+
+class FakeContext:
+    def __init__(self, rec: _Recorder, args):
+        self.args = list(args)
+        self.bot = FakeBot(rec)
+        self.job_queue = None
+
+
+# --- Chạy bench ---
+def registered_commands(application) -> dict:
+    """{tên lệnh: callback} của mọi CommandHandler đã đăng ký."""
+    out = {}
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            for command in sorted(getattr(handler, "commands", ())):
+                out[command] = handler.callback
+    return out
+
+
+async def _call(callback, user_id: int, args) -> tuple[float, _Recorder, str | None]:
+    rec = _Recorder()
+    started = time.perf_counter()
+    error = None
+    try:
+        await asyncio.wait_for(callback(FakeUpdate(rec, user_id), FakeContext(rec, args)), BENCH_TIMEOUT)
+    except asyncio.TimeoutError:
+        error = f"timeout {BENCH_TIMEOUT}s"
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    return (time.perf_counter() - started) * 1000, rec, error
+
+
+async def warm_snapshots(refresher):
+    for name in refresher.names():
+        try:
+            await refresher.refresh(name)
+        except Exception as e:
+            logging.warning(f"[bench] Không làm nóng snapshot {name}: {e}")
+
+
+async def run_bench(commands: dict, mock: MockUpstream, user_id: int, repeat: int, cold: bool) -> dict:
+    """
+    Mặc định snapshot nền được làm nóng trước (như bot đang chạy), cache
+    lệnh thì lạnh. `cold`: bỏ mọi snapshot + cache trước từng lệnh để lần gọi
+    đầu tự tải hết, không phụ thuộc lệnh chạy trước.
+    """
+    from cache import command_cache
+    from heli_bot import refresher
+    from unbonding import invalidate_snapshot
+
+    def reset():
+        if cold:
+            refresher.clear()
+            invalidate_snapshot()
+        command_cache.invalidate()
+
+    if not cold:
+        await warm_snapshots(refresher)
+
+    results = {}
+    for command, callback in commands.items():
+        args = BENCH_ARGS.get(command, [])
+        times, reqs, sizes, errors = [], [], [], []
+        replies = reply_bytes = 0
+        reset()
+        for _ in range(max(1, repeat)):
+            r0, b0 = mock.counters()
+            ms, rec, error = await _call(callback, user_id, args)
+            r1, b1 = mock.counters()
+            times.append(ms)
+            reqs.append(r1 - r0)
+            sizes.append(b1 - b0)
+            replies, reply_bytes = rec.replies, rec.bytes
+            if error:
+                errors.append(error)
+
+        # Bộ nhớ đỉnh: lượt riêng vì tracemalloc làm chậm đáng kể; cache lệnh
+        # (và snapshot nếu `cold`) bị bỏ trước để đo lần gọi lạnh
+        reset()
+        r0, _ = mock.counters()
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        await _call(callback, user_id, args)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peak_requests = mock.counters()[0] - r0
+
+        warm_times = times[1:] or times
+        results[command] = {
+            "args": args,
+            "cold_ms": round(times[0], 2),
+            "warm_ms": round(statistics.median(warm_times), 2),
+            "warm_max_ms": round(max(warm_times), 2),
+            "requests_cold": reqs[0],
+            "requests_warm": round(statistics.mean(reqs[1:]), 2) if len(reqs) > 1 else reqs[0],
+            "bytes_cold": sizes[0],
+            "bytes_warm": round(statistics.mean(sizes[1:])) if len(sizes) > 1 else sizes[0],
+            "peak_kb": round(peak / 1024, 1),
+            "peak_requests": peak_requests,
+            "replies": replies,
+            "reply_bytes": reply_bytes,
+            "errors": errors[:3],
+        }
+        logging.info(f"[bench] /{command}: lạnh {times[0]:.1f}ms, nóng {results[command]['warm_ms']:.1f}ms")
+    return results
+
+
+def _git_rev() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def format_table(results: dict, baseline: dict | None = None) -> str:
+    head = f"{'lệnh':<18}{'lạnh ms':>10}{'nóng ms':>10}{'req':>6}{'KB':>9}{'peak KB':>10}"
+    if baseline:
+        head += f"{'Δ lạnh':>9}{'Δ nóng':>9}"
+    lines = [head]
+    for command, r in sorted(results.items(), key=lambda kv: -kv[1]["cold_ms"]):
+        line = (f"/{command:<17}{r['cold_ms']:>10.1f}{r['warm_ms']:>10.1f}{r['requests_cold']:>6}"
+                f"{r['bytes_cold'] / 1024:>9.1f}{r['peak_kb']:>10.1f}")
+        old = (baseline or {}).get(command)
+        if old:
+            pct = lambda new, prev: f"{(new / prev - 1) * 100:+.0f}%" if prev else "-"
+            line += f"{pct(r['cold_ms'], old['cold_ms']):>9}{pct(r['warm_ms'], old['warm_ms']):>9}"
+        if r["errors"]:
+            line += f"  ⚠️ {r['errors'][0][:60]}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark offline các lệnh của bot")
+    ap.add_argument("--fixtures", help="file fixture JSON (mặc định: fixture tổng hợp)")
+    ap.add_argument("--record", metavar="PATH", help="ghi fixture từ LCD/MEXC thật rồi thoát")
+    ap.add_argument("--out", help="file JSON kết quả (mặc định data/bench/bench-<thời điểm>.json)")
+    ap.add_argument("--compare", metavar="PATH", help="so sánh với một file kết quả trước")
+    ap.add_argument("--repeat", type=int, default=BENCH_REPEAT, help="số lần gọi mỗi lệnh")
+    ap.add_argument("--only", help="chỉ chạy các lệnh này (phân tách bằng dấu phẩy)")
+    ap.add_argument("--cold", action="store_true",
+                    help="không làm nóng snapshot nền; bỏ snapshot + cache trước từng lệnh")
+    args = ap.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    if args.record:
+        asyncio.run(record_fixtures(args.record))
+        return
+
+    if args.fixtures:
+        with open(args.fixtures) as f:
+            fixtures = json.load(f)
+        fixtures.setdefault("klines", {})
+        fixtures.setdefault("unbonding", {})
+    else:
+        fixtures = synthetic_fixtures()
+
+    mock = MockUpstream(fixtures)
+    url = mock.start()
+    workdir = tempfile.mkdtemp(prefix="heli-bench-")
+    # Cấu hình trước khi import bot: mọi upstream trỏ vào mock, kho dữ liệu tạm, tắt task realtime
+    os.environ.update({
+        "LCD_ENDPOINT": url, "MEXC_ENDPOINT": url, "RPC_ENDPOINT": url, "COINGECKO_ENDPOINT": url,
+        "CANDLE_DB": os.path.join(workdir, "candles.sqlite"),
+        "STATE_DB": os.path.join(workdir, "state.sqlite"),
+        "TRANSFER_DB": os.path.join(workdir, "transfers.sqlite"),
+        "UNBONDING_TRACKER": "0", "ORDERBOOK_STREAM": "0",
+    })
+    os.environ.setdefault("BOT_TOKEN", "0:bench")
+
+    import_started = time.perf_counter()
+    import heli_bot
+    import_ms = (time.perf_counter() - import_started) * 1000
+
+    commands = registered_commands(heli_bot.build_application())
+    if args.only:
+        wanted = {c.strip().lstrip("/") for c in args.only.split(",")}
+        commands = {c: cb for c, cb in commands.items() if c in wanted}
+
+    async def run():
+        try:
+            return await run_bench(commands, mock, heli_bot.ADMIN_ID, args.repeat, args.cold)
+        finally:
+            await heli_bot.close_clients()
+
+    results = asyncio.run(run())
+    mock.stop()
+
+    report = {
+        "meta": {
+            "started": datetime.now(timezone.utc).isoformat(),
+            "git": _git_rev(),
+            "python": platform.python_version(),
+            "fixtures": args.fixtures or fixtures.get("source", "synthetic"),
+            "repeat": args.repeat,
+            "cold": args.cold,
+            "import_ms": round(import_ms, 1),
+            "upstream_by_path": dict(sorted(mock.by_path.items(), key=lambda kv: -kv[1])),
+        },
+        "handlers": results,
+    }
+    out = args.out or os.path.join("data", "bench", f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    if os.path.dirname(out):
+        os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f).get("handlers")
+    print(format_table(results, baseline))
+    print(f"\nImport heli_bot {import_ms:.0f}ms | kết quả: {out}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+"""
+Theo dõi block mới qua RPC (`/block_results`) và chuyển event cho các
+consumer đã đăng ký (tracker unbonding, ...).
+
+Nhiều follower (mỗi cái một con trỏ height) đọc cùng block thì chỉ gọi RPC
+một lần: block vừa đọc được giữ lại trong RECENT_BLOCKS block gần nhất.
+
+Cũng đọc được block_results đã lưu ra file để replay khi test.
+"""
+import asyncio
+import base64
+import binascii
+import glob
+import json
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from clients import RpcClient, get_rpc
+from metrics import LOOP_SECONDS
+
+BLOCK_POLL_INTERVAL = float(os.getenv("BLOCK_POLL_INTERVAL", 3))  # giây
+BLOCK_MAX_CATCHUP = int(os.getenv("BLOCK_MAX_CATCHUP", 500))      # lệch quá thì báo gap
+RECENT_BLOCKS = 64  # số block đã parse giữ lại cho các follower khác
+
+_IDENT = re.compile(r"^[A-Za-z_][A-Za-z0-9_.]*$")
+
+
+@dataclass
+class BlockEvent:
+    type: str
+    attrs: dict
+    tx_index: int | None = None  # None = event của begin/end/finalize block
+
+
+def decode_attr(value):
+    """CometBFT <= 0.34 mã hoá key/value bằng base64; bản mới để nguyên chuỗi."""
+    if value is None:
+        return ""
+    try:
+        return base64.b64decode(value, validate=True).decode()
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return value
+
+
+def _parse_event(raw: dict, tx_index: int | None) -> BlockEvent:
+    attrs = {}
+    for attr in raw.get("attributes") or []:
+        key = attr.get("key") or ""
+        value = attr.get("value")
+        decoded = decode_attr(key)
+        if decoded != key and _IDENT.match(decoded):
+            key, value = decoded, decode_attr(value)
+        attrs[key] = value or ""
+    return BlockEvent(type=raw.get("type", ""), attrs=attrs, tx_index=tx_index)
+
+
+def parse_block_results(result: dict) -> list[BlockEvent]:
+    """Gom event của tx thành công + begin/end/finalize block theo đúng thứ tự."""
+    events = []
+    for raw in result.get("begin_block_events") or []:
+        events.append(_parse_event(raw, None))
+    for i, tx in enumerate(result.get("txs_results") or []):
+        if int(tx.get("code", 0) or 0) != 0:
+            continue  # tx lỗi không làm đổi state
+        for raw in tx.get("events") or []:
+            events.append(_parse_event(raw, i))
+    for key in ("end_block_events", "finalize_block_events"):
+        for raw in result.get(key) or []:
+            events.append(_parse_event(raw, None))
+    return events
+
+
+def load_block_results(path: str) -> tuple[int, dict]:
+    """Đọc 1 file block_results (response JSON-RPC đầy đủ hoặc chỉ phần `result`)."""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    result = data.get("result", data)
+    return int(result["height"]), result
+
+
+_recent = OrderedDict()  # (rpc, height) -> list[BlockEvent]
+_loading = {}            # (rpc, height) -> asyncio.Future
+
+
+async def _load_block(rpc: RpcClient, height: int) -> list[BlockEvent]:
+    events = parse_block_results(await rpc.block_results(height))
+    _recent[(rpc.base_url, height)] = events
+    while len(_recent) > RECENT_BLOCKS:
+        _recent.popitem(last=False)
+    return events
+
+
+async def fetch_block_events(rpc: RpcClient, height: int) -> list[BlockEvent]:
+    """Event của block `height`; các follower đọc trùng block chờ chung một lần gọi RPC."""
+    key = (rpc.base_url, height)
+    events = _recent.get(key)
+    if events is not None:
+        return events
+    future = _loading.get(key)
+    if future is None:
+        future = asyncio.ensure_future(_load_block(rpc, height))
+        _loading[key] = future
+        future.add_done_callback(lambda _: _loading.pop(key, None))
+    return await asyncio.shield(future)
+
+
+class BlockFollower:
+    """Đọc tuần tự từng block mới và gọi `consumer.apply_block(height, events)`."""
+
+    def __init__(self, rpc: RpcClient | None = None, poll_interval: float = BLOCK_POLL_INTERVAL,
+                 max_catchup: int = BLOCK_MAX_CATCHUP, name: str = "block_follower"):
+        self.rpc = rpc or get_rpc()
+        self.poll_interval = poll_interval
+        self.max_catchup = max_catchup
+        self.name = name  # nhãn vòng lặp trong /metrics
+        self.height = None       # block cuối đã xử lý
+        self.latest = None       # block mới nhất trên chain
+        self.last_ok = 0.0       # lần poll thành công gần nhất (time.time)
+        self.consumers = []
+
+    def subscribe(self, consumer):
+        """consumer có `apply_block(height, events)` và tuỳ chọn `on_gap(height)`."""
+        self.consumers.append(consumer)
+
+    def lag(self) -> int | None:
+        if self.height is None or self.latest is None:
+            return None
+        return self.latest - self.height
+
+    def _dispatch(self, height: int, events: list[BlockEvent]):
+        for consumer in self.consumers:
+            try:
+                consumer.apply_block(height, events)
+            except Exception as e:
+                logging.error(f"Lỗi xử lý block {height} ở {type(consumer).__name__}: {e}")
+        self.height = height
+
+    def _gap(self, height: int):
+        logging.warning(f"⛓ Bỏ qua từ block {self.height} tới {height} (lệch quá {self.max_catchup})")
+        for consumer in self.consumers:
+            on_gap = getattr(consumer, "on_gap", None)
+            if on_gap:
+                on_gap(height)
+        self.height = height
+
+    async def poll_once(self):
+        self.latest = await self.rpc.latest_height()
+        if self.height is None:
+            self.height = self.latest
+        elif self.latest - self.height > self.max_catchup:
+            self._gap(self.latest)
+        while self.height < self.latest:
+            h = self.height + 1
+            self._dispatch(h, await fetch_block_events(self.rpc, h))
+        self.last_ok = time.time()
+
+    async def run(self):
+        while True:
+            started = time.perf_counter()
+            try:
+                await self.poll_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.warning(f"⛓ Lỗi đọc block từ RPC: {e}")
+            LOOP_SECONDS.labels(self.name).observe(time.perf_counter() - started)
+            await asyncio.sleep(self.poll_interval)
+
+    def replay(self, paths) -> int:
+        """Replay các file block_results (theo thứ tự height). Trả về số block đã áp dụng."""
+        blocks = sorted((load_block_results(p) for p in paths), key=lambda b: b[0])
+        count = 0
+        for height, result in blocks:
+            if self.height is not None and height <= self.height:
+                continue
+            self._dispatch(height, parse_block_results(result))
+            count += 1
+        self.latest = self.height
+        self.last_ok = time.time()
+        return count
+
+    def replay_dir(self, directory: str) -> int:
+        return self.replay(glob.glob(os.path.join(directory, "*.json")))
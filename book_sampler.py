@@ -0,0 +1,120 @@
+"""
+Lấy mẫu tổng hợp orderbook theo chu kỳ cố định vào ring buffer numpy.
+
+Mỗi mẫu gồm: thời điểm, giá giữa, spread và tổng KL mua/bán trong từng
+biên độ quanh giá giữa (±1%, ±2%, ±5%, ±10%, ±20%). /flow so sánh mẫu mới
+nhất với mẫu cách đây 5m / 1h / 24h mà không cần lưu snapshot theo user.
+"""
+import asyncio
+import logging
+import os
+import time
+
+import numpy as np
+
+from metrics import LOOP_SECONDS
+from orderbook_stream import OrderBook, read_book
+
+ORDERBOOK_SAMPLE_INTERVAL = float(os.getenv("ORDERBOOK_SAMPLE_INTERVAL", 15))  # giây
+SAMPLE_HORIZON = 24 * 3600 + 600  # giây giữ lại (đủ cho /flow 24h)
+BANDS = (0.01, 0.02, 0.05, 0.10, 0.20)
+
+T, MID, SPREAD = 0, 1, 2  # cột cố định; sau đó là bids[band]..., asks[band]...
+
+
+class BookSampler:
+    def __init__(self, interval: float = ORDERBOOK_SAMPLE_INTERVAL,
+                 horizon: float = SAMPLE_HORIZON, bands=BANDS):
+        self.interval = interval
+        self.bands = tuple(bands)
+        self.capacity = int(horizon / interval) + 1
+        self.data = np.full((self.capacity, 3 + 2 * len(self.bands)), np.nan)
+        self.head = 0    # vị trí ghi kế tiếp
+        self.count = 0
+
+    def bid_col(self, k: int) -> int:
+        return 3 + k
+
+    def ask_col(self, k: int) -> int:
+        return 3 + len(self.bands) + k
+
+    def band_index(self, rng: float) -> int:
+        """Biên độ gần nhất với `rng` trong các biên độ đang lấy mẫu."""
+        return int(np.argmin([abs(b - rng) for b in self.bands]))
+
+    def record(self, book: OrderBook, t: float | None = None) -> bool:
+        mid = book.mid()
+        if mid is None:
+            return False
+        row = self.data[self.head]
+        row[T] = time.time() if t is None else t
+        row[MID] = mid
+        row[SPREAD] = book.best("asks") - book.best("bids")
+        for k, band in enumerate(self.bands):
+            lo, hi = mid * (1 - band), mid * (1 + band)
+            row[self.bid_col(k)] = book.volume_in_range("bids", lo, hi)
+            row[self.ask_col(k)] = book.volume_in_range("asks", lo, hi)
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        return True
+
+    def dump_state(self) -> dict | None:
+        """Các mẫu hiện có để lưu lại (None nếu chưa có mẫu)."""
+        if not self.count:
+            return None
+        return {"interval": self.interval, "bands": self.bands, "rows": self.ordered()}
+
+    def load_state(self, state: dict) -> bool:
+        """Nạp lại mẫu đã lưu; bỏ qua nếu khác chu kỳ / biên độ."""
+        if state.get("interval") != self.interval or tuple(state.get("bands", ())) != self.bands:
+            return False
+        rows = state["rows"][-self.capacity:]
+        self.data[:len(rows)] = rows
+        self.count = len(rows)
+        self.head = self.count % self.capacity
+        return True
+
+    def ordered(self) -> np.ndarray:
+        """Các mẫu theo thứ tự thời gian (cũ -> mới)."""
+        idx = (self.head - self.count + np.arange(self.count)) % self.capacity
+        return self.data[idx]
+
+    def latest(self) -> np.ndarray | None:
+        return self.data[(self.head - 1) % self.capacity] if self.count else None
+
+    def window(self, seconds: float) -> tuple[np.ndarray, np.ndarray] | None:
+        """
+        (mẫu cách mẫu mới nhất khoảng `seconds`, mẫu mới nhất). Nếu buffer chưa
+        đủ dài thì lấy mẫu cũ nhất hiện có. None nếu chưa có 2 mẫu.
+        """
+        if self.count < 2:
+            return None
+        rows = self.ordered()
+        newest = rows[-1]
+        i = int(np.searchsorted(rows[:, T], newest[T] - seconds, side="right")) - 1
+        return rows[max(i, 0)], newest
+
+
+async def run_book_sampler(sampler: BookSampler):
+    logging.info(f"📈 Lấy mẫu orderbook mỗi {sampler.interval:.0f}s đã khởi động nền...")
+    while True:
+        started = time.monotonic()
+        try:
+            sampler.record(await read_book(500))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.warning(f"[sampler] Lỗi lấy mẫu orderbook: {e}")
+        elapsed = time.monotonic() - started
+        LOOP_SECONDS.labels("book_sampler").observe(elapsed)
+        await asyncio.sleep(max(0.0, sampler.interval - elapsed))
+
+
+_sampler: BookSampler | None = None
+
+
+def get_book_sampler() -> BookSampler:
+    global _sampler
+    if _sampler is None:
+        _sampler = BookSampler()
+    return _sampler
@@ -0,0 +1,227 @@
+"""
+Khởi động nhanh cho cold start trên Render (gói free tắt container khi rảnh).
+
+`python boot.py` chỉ nạp phần nhẹ (telegram, aiohttp, users, light_commands)
+rồi bind webhook / polling ngay:
+- /ping, /help, /whoami, /price trả lời luôn;
+- heli_bot (pandas, ta, numpy, kho nến...) được import trong thread nền
+  (BOOT_PRELOAD=1, mặc định) hoặc ở lệnh nặng đầu tiên (BOOT_PRELOAD=0);
+- lệnh khác chờ nạp xong rồi chạy đúng handler trong heli_bot.COMMANDS.
+
+Các mốc khởi động (import nhẹ, bind cổng, phản hồi đầu tiên, nạp xong bộ
+phân tích) được log và xuất ở /metrics (heli_boot_seconds).
+`python heli_bot.py` vẫn khởi động kiểu cũ (nạp hết rồi mới bind).
+
+    python boot.py                  # chạy bot
+    python boot.py --import-report  # thời gian import theo gói (python -X importtime)
+"""
+import time
+
+BOOT_STARTED = time.perf_counter()
+
+import asyncio
+import functools
+import importlib
+import logging
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from telegram import Update
+from telegram.ext import Application, CommandHandler, ContextTypes, MessageHandler, filters
+from telegram.request import HTTPXRequest
+
+from clients import close_clients
+from light_commands import help_command, ping, price
+from metrics import instrument_command, register_collector
+from state_store import get_state_store
+from users import USER_STATE_KEYS, restore_users, whoami
+from webserver import run_webhook
+
+BOT_TOKEN = os.getenv("BOT_TOKEN")
+WEBHOOK_URL = os.getenv("RENDER_URL")  # https://<appname>.onrender.com
+BOOT_PRELOAD = os.getenv("BOOT_PRELOAD", "1") == "1"  # 0 = chỉ nạp heli_bot khi có lệnh nặng đầu tiên
+
+LIGHT_COMMANDS = {"ping": ping, "help": help_command, "whoami": whoami, "price": price}
+
+BOOT_TIMINGS = {"light_imports": time.perf_counter() - BOOT_STARTED}  # mốc -> giây từ lúc chạy boot.py
+FULL_IMPORT_SECONDS = None
+
+_loading: asyncio.Future | None = None  # import heli_bot + post_init, trả về bảng lệnh đã bọc metrics
+
+
+def mark(phase: str):
+    """Ghi mốc khởi động (chỉ lần đầu)."""
+    if phase not in BOOT_TIMINGS:
+        BOOT_TIMINGS[phase] = time.perf_counter() - BOOT_STARTED
+        logging.info(f"⏱️ Khởi động: {phase} sau {BOOT_TIMINGS[phase]*1000:.0f}ms")
+
+
+def boot_report() -> str:
+    parts = [f"{phase} {seconds*1000:.0f}ms" for phase, seconds in BOOT_TIMINGS.items()]
+    if FULL_IMPORT_SECONDS is not None:
+        parts.append(f"import heli_bot {FULL_IMPORT_SECONDS*1000:.0f}ms")
+    return "⏱️ Khởi động: " + " | ".join(parts)
+
+
+@register_collector
+def collect_boot_metrics():
+    samples = [({"phase": phase}, seconds) for phase, seconds in BOOT_TIMINGS.items()]
+    if FULL_IMPORT_SECONDS is not None:
+        samples.append(({"phase": "full_import"}, FULL_IMPORT_SECONDS))
+    return [("heli_boot_seconds", "gauge", "Mốc khởi động (giây từ lúc chạy boot.py)", samples)]
+
+
+def first_response(callback):
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        try:
+            return await callback(update, context)
+        finally:
+            mark("first_response")
+    return wrapper
+
+
+async def _load_full(application: Application) -> dict:
+    global FULL_IMPORT_SECONDS
+    started = time.perf_counter()
+    module = await asyncio.to_thread(importlib.import_module, "heli_bot")
+    FULL_IMPORT_SECONDS = time.perf_counter() - started
+    await module.post_init(application)
+    mark("full_stack")
+    logging.info(boot_report())
+    return {name: instrument_command(name, cb) for name, cb in module.COMMANDS.items()}
+
+
+async def load_full(application: Application) -> dict:
+    """Nạp heli_bot một lần; các lệnh gọi trùng lúc đó chờ chung."""
+    global _loading
+    if _loading is None:
+        _loading = asyncio.ensure_future(_load_full(application))
+    loading = _loading
+    try:
+        return await asyncio.shield(loading)
+    except Exception:
+        if _loading is loading and loading.done():
+            _loading = None  # lỗi import: lệnh sau thử lại
+        raise
+
+
+async def deferred_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Lệnh nặng: chờ heli_bot nạp xong rồi chạy handler thật."""
+    message = update.effective_message
+    command, *args = message.text.split()
+    command = command[1:].split("@")[0].lower()
+    if _loading is None or not _loading.done():
+        await message.reply_text("⏳ Bot vừa khởi động, đang nạp bộ phân tích...")
+    try:
+        commands = await load_full(context.application)
+    except Exception as e:
+        logging.error(f"Lỗi nạp heli_bot: {e}")
+        await message.reply_text("⚠️ Bot chưa sẵn sàng, thử lại sau ít phút.")
+        return
+    callback = commands.get(command)
+    if callback is None:
+        return
+    context.args = args
+    await callback(update, context)
+
+
+async def preload(application: Application):
+    try:
+        await load_full(application)
+    except Exception as e:
+        logging.error(f"Lỗi nạp heli_bot: {e}")
+
+
+async def post_init(application: Application):
+    # /grant, /revoke đã lưu phải có hiệu lực cho /price, /whoami ngay từ đầu,
+    # không chờ heli_bot nạp xong (chỉ đọc các key user, không unpickle snapshot)
+    try:
+        restore_users(get_state_store().load(USER_STATE_KEYS))
+    except Exception as e:
+        logging.error(f"Lỗi nạp quyền user đã lưu: {e}")
+    mark("initialized")
+    if BOOT_PRELOAD:
+        application.bot_data["boot_preload"] = asyncio.create_task(preload(application))
+
+
+async def post_stop(application: Application):
+    if _loading is None:
+        return
+    if not _loading.done():
+        _loading.cancel()
+    elif not _loading.cancelled() and _loading.exception() is None:
+        await sys.modules["heli_bot"].post_stop(application)
+
+
+def build_boot_application() -> Application:
+    request = HTTPXRequest(
+        connect_timeout=20,
+        read_timeout=20,
+        write_timeout=20,
+        pool_timeout=20
+    )
+    application = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .request(request)
+        .post_init(post_init)
+        .post_stop(post_stop)
+        .post_shutdown(close_clients)
+        .build()
+    )
+    for name, callback in LIGHT_COMMANDS.items():
+        application.add_handler(CommandHandler(name, first_response(instrument_command(name, callback))))
+    # block=False: lệnh nặng chờ nạp heli_bot không chặn các lệnh nhẹ phía sau
+    application.add_handler(MessageHandler(filters.COMMAND, first_response(deferred_command), block=False))
+    return application
+
+
+def import_report(module: str = "heli_bot", top: int = 15) -> str:
+    """Thời gian import theo gói (cộng `self` của python -X importtime) cho `module`."""
+    env = {**os.environ, "BOT_TOKEN": BOT_TOKEN or "0:import-report"}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    by_package = defaultdict(int)
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        by_package[name.strip().split(".")[0]] += int(self_us)
+        if name.strip() == module:
+            total = int(cumulative_us)
+    lines = [f"📦 import {module}: {total/1000:.0f}ms"]
+    for package, us in sorted(by_package.items(), key=lambda kv: -kv[1])[:top]:
+        lines.append(f"  {package:<24} {us/1000:8.1f}ms")
+    return "\n".join(lines)
+
+
+def main():
+    if "--import-report" in sys.argv:
+        print(import_report("boot"))
+        print(import_report("heli_bot"))
+        return
+    if not BOT_TOKEN:
+        raise ValueError("⚠️ Chưa thiết lập biến môi trường BOT_TOKEN")
+
+    logging.basicConfig(
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
+    )
+    application = build_boot_application()
+    logging.info(f"🚀 Bot HeliChain khởi động nhanh (import nhẹ {BOOT_TIMINGS['light_imports']*1000:.0f}ms)...")
+
+    if os.getenv("RENDER") == "true":
+        port = int(os.environ.get("PORT", "10000"))
+        run_webhook(application, port, url_path=BOT_TOKEN, webhook_url=f"{WEBHOOK_URL}/{BOT_TOKEN}",
+                    on_started=lambda: mark("listening"))
+    else:
+        application.run_polling()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Gửi một tin nhắn tới nhiều chat song song trong giới hạn của Telegram:
+~30 tin/giây toàn bot và 1 tin/giây cho mỗi chat.
+
+RetryAfter (flood control) tạm dừng cả bot theo thời gian Telegram yêu
+cầu rồi gửi lại; lỗi mạng/timeout được thử lại có backoff; chat chặn bot
+hoặc request sai thì ghi lỗi và bỏ qua.
+"""
+import asyncio
+import logging
+import os
+import random
+import time
+from dataclasses import dataclass, field
+
+from telegram.error import BadRequest, NetworkError, RetryAfter
+
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", 25))                  # tin/giây toàn bot
+BROADCAST_CHAT_INTERVAL = float(os.getenv("BROADCAST_CHAT_INTERVAL", 1))  # giây giữa 2 tin cùng chat
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", 20))
+BROADCAST_RETRIES = int(os.getenv("BROADCAST_RETRIES", 3))
+
+
+@dataclass
+class BroadcastReport:
+    name: str
+    recipients: int = 0
+    sent: int = 0
+    retries: int = 0
+    flood_waits: int = 0                           # số lần nhận RetryAfter
+    failures: dict = field(default_factory=dict)   # chat_id -> lỗi cuối cùng
+    started: float = field(default_factory=time.perf_counter)
+    elapsed: float = 0.0
+
+    def summary(self) -> str:
+        return (
+            f"[{self.name}] gửi {self.sent}/{self.recipients} chat trong {self.elapsed:.2f}s, "
+            f"{self.retries} retry, {self.flood_waits} lần RetryAfter, {len(self.failures)} lỗi"
+        )
+
+
+class Broadcaster:
+    def __init__(self, rate: float = BROADCAST_RATE, chat_interval: float = BROADCAST_CHAT_INTERVAL,
+                 concurrency: int = BROADCAST_CONCURRENCY, retries: int = BROADCAST_RETRIES):
+        self.rate = rate
+        self.chat_interval = chat_interval
+        self.concurrency = concurrency
+        self.retries = retries
+        self._global_next = 0.0   # thời điểm (monotonic) được gửi tin kế tiếp
+        self._paused_until = 0.0  # do RetryAfter
+        self._chat_next = {}      # chat_id -> thời điểm được gửi tin kế tiếp
+
+    def _reserve(self, chat_id) -> float:
+        """Giữ chỗ gửi cho `chat_id`; trả về số giây phải chờ."""
+        now = time.monotonic()
+        t = max(now, self._global_next, self._paused_until, self._chat_next.get(chat_id, 0.0))
+        self._global_next = t + 1 / self.rate
+        self._chat_next[chat_id] = t + self.chat_interval
+        return t - now
+
+    async def _deliver(self, bot, chat_id, text: str, kwargs: dict, report: BroadcastReport):
+        attempt = 0
+        while True:
+            delay = self._reserve(chat_id)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                await bot.send_message(chat_id=chat_id, text=text, **kwargs)
+                report.sent += 1
+                return
+            except RetryAfter as e:
+                # Flood control áp dụng cho cả bot: dừng mọi lượt gửi
+                report.flood_waits += 1
+                self._paused_until = max(self._paused_until, time.monotonic() + float(e.retry_after))
+                err = e
+            except BadRequest as e:
+                report.failures[chat_id] = str(e)
+                return
+            except (NetworkError, asyncio.TimeoutError) as e:
+                err = e
+                await asyncio.sleep(0.5 * (2 ** attempt) * (1 + random.random()))
+            except Exception as e:
+                # Forbidden (user chặn bot), chat không tồn tại...
+                report.failures[chat_id] = str(e)
+                return
+            if attempt >= self.retries:
+                report.failures[chat_id] = str(err)
+                return
+            attempt += 1
+            report.retries += 1
+
+    async def send(self, bot, chat_ids, text: str, name: str = "broadcast", **kwargs) -> BroadcastReport:
+        """Gửi `text` tới mọi chat trong `chat_ids`; trả về BroadcastReport."""
+        chat_ids = list(dict.fromkeys(chat_ids))
+        report = BroadcastReport(name=name, recipients=len(chat_ids))
+        sem = asyncio.Semaphore(max(1, self.concurrency))
+
+        async def one(chat_id):
+            async with sem:
+                await self._deliver(bot, chat_id, text, kwargs, report)
+
+        await asyncio.gather(*(one(c) for c in chat_ids))
+        report.elapsed = time.perf_counter() - report.started
+        if report.failures:
+            logging.warning(f"{report.summary()}: {report.failures}")
+        else:
+            logging.info(report.summary())
+        return report
+
+
+_broadcaster = Broadcaster()
+
+
+def get_broadcaster() -> Broadcaster:
+    return _broadcaster
+
+
+async def broadcast(bot, chat_ids, text: str, name: str = "broadcast", **kwargs) -> BroadcastReport:
+    return await _broadcaster.send(bot, chat_ids, text, name=name, **kwargs)
@@ -0,0 +1,141 @@
+"""
+Cache TTL + stale-while-revalidate cho các giá trị tổng hợp của chain
+(pool, supply, inflation, danh sách validator).
+
+- Còn hạn (age <= ttl): trả ngay.
+- Hết hạn nhưng còn trong `stale` giây: trả giá trị cũ và refresh nền.
+- Không có / quá cũ: fetch; các lệnh gọi cùng key lúc đó chờ chung 1 lần fetch.
+
+`single_flight` dùng cùng cơ chế cho các phép tính đắt của lệnh bot: lệnh
+gọi trùng (tên, tham số chuẩn hoá) chờ chung kết quả đang tính và dùng lại
+kết quả đó thêm SINGLEFLIGHT_REUSE giây.
+"""
+import asyncio
+import functools
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Generic, TypeVar
+
+T = TypeVar("T")
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    stale_hits: int = 0
+    misses: int = 0
+    coalesced: int = 0   # miss nhưng chờ chung fetch đang chạy
+    refreshes: int = 0   # refresh nền
+    errors: int = 0
+
+    def hit_ratio(self) -> float:
+        total = self.hits + self.stale_hits + self.misses + self.coalesced
+        return (self.hits + self.stale_hits + self.coalesced) / total if total else 0.0
+
+
+@dataclass
+class _Entry(Generic[T]):
+    value: T
+    fetched_at: float = field(default_factory=time.monotonic)
+
+    def age(self) -> float:
+        return time.monotonic() - self.fetched_at
+
+
+class TTLCache:
+    def __init__(self, name: str):
+        self.name = name
+        self.stats = CacheStats()
+        self.key_stats = {}    # key -> CacheStats
+        self._entries = {}     # key -> _Entry
+        self._inflight = {}    # key -> asyncio.Future
+
+    def _stats_for(self, key: str) -> CacheStats:
+        return self.key_stats.setdefault(key, CacheStats())
+
+    def _count(self, key: str, attr: str):
+        for st in (self.stats, self._stats_for(key)):
+            setattr(st, attr, getattr(st, attr) + 1)
+
+    async def get(self, key: str, fetch: Callable[[], Awaitable[T]], ttl: float, stale: float = 0) -> T:
+        entry = self._entries.get(key)
+        if entry is not None:
+            age = entry.age()
+            if age <= ttl:
+                self._count(key, "hits")
+                return entry.value
+            if age <= ttl + stale:
+                self._count(key, "stale_hits")
+                if key not in self._inflight:
+                    self._count(key, "refreshes")
+                    self._start_fetch(key, fetch)
+                return entry.value
+
+        if key in self._inflight:
+            self._count(key, "coalesced")
+        else:
+            self._count(key, "misses")
+            self._start_fetch(key, fetch)
+        return await asyncio.shield(self._inflight[key])
+
+    def _start_fetch(self, key: str, fetch: Callable[[], Awaitable[T]]):
+        future = asyncio.ensure_future(fetch())
+        self._inflight[key] = future
+
+        def done(fut):
+            self._inflight.pop(key, None)
+            if fut.cancelled():
+                return
+            exc = fut.exception()
+            if exc is not None:
+                self._count(key, "errors")
+                logging.warning(f"[cache:{self.name}] Lỗi refresh {key}: {exc}")
+                return
+            self._entries[key] = _Entry(fut.result())
+
+        future.add_done_callback(done)
+
+    def peek(self, key: str):
+        """(value, age giây) nếu có trong cache, ngược lại (None, None)."""
+        entry = self._entries.get(key)
+        return (entry.value, entry.age()) if entry else (None, None)
+
+    def invalidate(self, key: str | None = None):
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+
+SINGLEFLIGHT_REUSE = float(os.getenv("SINGLEFLIGHT_REUSE", 5))  # giây dùng lại kết quả
+command_cache = TTLCache("commands")
+
+
+def _normalize(value):
+    if isinstance(value, str):
+        return value.strip().lower()
+    if isinstance(value, (list, tuple)):
+        return tuple(_normalize(v) for v in value)
+    return value
+
+
+def single_flight(name: str | None = None, reuse: float = SINGLEFLIGHT_REUSE):
+    """
+    Decorator cho hàm async: gộp các lệnh gọi trùng (name, tham số chuẩn hoá)
+    vào cùng một lần chạy. Thống kê ở `command_cache` (hits = dùng lại,
+    coalesced = chờ chung, misses = thực sự chạy).
+    """
+    def decorator(fn):
+        label = name or fn.__name__
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            key = label
+            if args or kwargs:
+                key += repr((_normalize(args), sorted((k, _normalize(v)) for k, v in kwargs.items())))
+            return await command_cache.get(key, lambda: fn(*args, **kwargs), ttl=reuse)
+
+        return wrapper
+    return decorator
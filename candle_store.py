@@ -0,0 +1,188 @@
+"""
+Kho nến OHLCV lưu trên đĩa (SQLite), khoá theo (symbol, interval).
+
+Mỗi lần gọi chỉ tải các nến mới hơn nến cuối đã lưu (nến cuối được tải lại
+vì có thể chưa đóng), bù khoảng trống và tải thêm lịch sử cũ khi cần nhiều
+nến hơn số đang có.
+"""
+import logging
+import os
+import sqlite3
+import threading
+
+from clients import MexcClient, get_mexc
+
+CANDLE_DB = os.getenv("CANDLE_DB", "data/candles.sqlite")
+MEXC_KLINES_MAX = 1000  # giới hạn limit của /api/v3/klines
+
+INTERVAL_MS = {
+    "1m": 60_000,
+    "5m": 5 * 60_000,
+    "15m": 15 * 60_000,
+    "30m": 30 * 60_000,
+    "60m": 60 * 60_000,
+    "1h": 60 * 60_000,
+    "4h": 4 * 60 * 60_000,
+    "1d": 24 * 60 * 60_000,
+    "1W": 7 * 24 * 60 * 60_000,
+}
+
+COLUMNS = ["open_time", "open", "high", "low", "close", "volume", "close_time", "quote_asset_volume"]
+
+
+def normalize_klines(data: list) -> list[tuple]:
+    """
+    Chuẩn hoá nến MEXC/Binance (12/8/6 cột) về tuple theo COLUMNS.
+    Dòng lỗi (thiếu số) bị bỏ qua.
+    """
+    rows = []
+    for k in data:
+        try:
+            open_time = int(k[0])
+            o, h, l, c, v = (float(x) for x in k[1:6])
+        except (TypeError, ValueError, IndexError):
+            continue
+        close_time = int(k[6]) if len(k) > 6 and k[6] is not None else None
+        quote = float(k[7]) if len(k) > 7 and k[7] is not None else None
+        rows.append((open_time, o, h, l, c, v, close_time, quote))
+    return rows
+
+
+class CandleStore:
+    def __init__(self, path: str = CANDLE_DB):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # check_same_thread=False: có thể gọi từ thread khác, đã khoá bằng _lock
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._history_exhausted = set()  # (symbol, interval) đã hết lịch sử cũ trên MEXC
+        self._gaps_checked = set()       # (symbol, interval, open_time) khoảng trống đã thử bù
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS candles (
+                    symbol TEXT NOT NULL,
+                    interval TEXT NOT NULL,
+                    open_time INTEGER NOT NULL,
+                    open REAL, high REAL, low REAL, close REAL, volume REAL,
+                    close_time INTEGER, quote_asset_volume REAL,
+                    PRIMARY KEY (symbol, interval, open_time)
+                ) WITHOUT ROWID"""
+            )
+
+    # --- Truy vấn cục bộ ---
+    def upsert(self, symbol: str, interval: str, rows: list[tuple]):
+        if not rows:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO candles VALUES (?,?,?,?,?,?,?,?,?,?)",
+                [(symbol, interval, *r) for r in rows],
+            )
+
+    def bounds(self, symbol: str, interval: str) -> tuple[int | None, int | None, int]:
+        """(open_time đầu, open_time cuối, số nến) đang lưu."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT MIN(open_time), MAX(open_time), COUNT(*) FROM candles WHERE symbol=? AND interval=?",
+                (symbol, interval),
+            ).fetchone()
+
+    def load(self, symbol: str, interval: str, limit: int, end_time: int | None = None) -> list[tuple]:
+        """`limit` nến gần nhất (tăng dần theo thời gian)."""
+        sql = "SELECT open_time, open, high, low, close, volume, close_time, quote_asset_volume " \
+              "FROM candles WHERE symbol=? AND interval=?"
+        args = [symbol, interval]
+        if end_time is not None:
+            sql += " AND open_time<=?"
+            args.append(end_time)
+        sql += " ORDER BY open_time DESC LIMIT ?"
+        args.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, args).fetchall()
+        rows.reverse()
+        return rows
+
+    def load_since(self, symbol: str, interval: str, open_time: int) -> list[tuple]:
+        """Các nến có open_time >= `open_time` (tăng dần)."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT open_time, open, high, low, close, volume, close_time, quote_asset_volume "
+                "FROM candles WHERE symbol=? AND interval=? AND open_time>=? ORDER BY open_time",
+                (symbol, interval, open_time),
+            ).fetchall()
+
+    # --- Đồng bộ với MEXC ---
+    async def sync(self, symbol: str, interval: str, limit: int, mexc: MexcClient | None = None) -> list[tuple]:
+        """Tải phần còn thiếu từ MEXC rồi trả về `limit` nến gần nhất."""
+        mexc = mexc or get_mexc()
+        first, last, count = self.bounds(symbol, interval)
+
+        if last is None:
+            # Lần đầu: tải cửa sổ gần nhất
+            self.upsert(symbol, interval, normalize_klines(
+                await mexc.klines(symbol, interval, min(limit, MEXC_KLINES_MAX))
+            ))
+        else:
+            # Chỉ tải từ nến cuối (có thể chưa đóng) trở đi
+            start = last
+            while True:
+                rows = normalize_klines(await mexc.klines(symbol, interval, MEXC_KLINES_MAX, start_time=start))
+                self.upsert(symbol, interval, rows)
+                if len(rows) < MEXC_KLINES_MAX or rows[-1][0] <= start:
+                    break
+                start = rows[-1][0]
+
+        first, last, count = self.bounds(symbol, interval)
+        if first is not None and count < limit and (symbol, interval) not in self._history_exhausted:
+            await self.backfill(symbol, interval, limit - count, mexc)
+
+        rows = self.load(symbol, interval, limit)
+        await self._fill_gaps(symbol, interval, rows, mexc)
+        return self.load(symbol, interval, limit)
+
+    async def backfill(self, symbol: str, interval: str, need: int, mexc: MexcClient | None = None) -> int:
+        """Tải thêm `need` nến cũ hơn nến đầu tiên đang lưu. Trả về số nến đã thêm."""
+        mexc = mexc or get_mexc()
+        added = 0
+        while added < need:
+            first, _, _ = self.bounds(symbol, interval)
+            if first is None:
+                break
+            rows = normalize_klines(await mexc.klines(
+                symbol, interval, min(need - added, MEXC_KLINES_MAX), end_time=first - 1
+            ))
+            rows = [r for r in rows if r[0] < first]
+            if not rows:
+                self._history_exhausted.add((symbol, interval))
+                break  # hết lịch sử
+            self.upsert(symbol, interval, rows)
+            added += len(rows)
+        return added
+
+    async def _fill_gaps(self, symbol: str, interval: str, rows: list[tuple], mexc: MexcClient):
+        step = INTERVAL_MS.get(interval)
+        if not step or len(rows) < 2:
+            return
+        for prev, cur in zip(rows, rows[1:]):
+            missing = (cur[0] - prev[0]) // step - 1
+            if missing <= 0 or (symbol, interval, prev[0]) in self._gaps_checked:
+                continue
+            self._gaps_checked.add((symbol, interval, prev[0]))
+            try:
+                self.upsert(symbol, interval, normalize_klines(await mexc.klines(
+                    symbol, interval, min(missing, MEXC_KLINES_MAX),
+                    start_time=prev[0] + step, end_time=cur[0] - 1,
+                )))
+            except Exception as e:
+                logging.warning(f"[candles] Không bù được khoảng trống {symbol} {interval}: {e}")
+
+
+_store: CandleStore | None = None
+
+
+def get_candle_store() -> CandleStore:
+    global _store
+    if _store is None:
+        _store = CandleStore()
+    return _store
@@ -0,0 +1,240 @@
+"""
+HTTP client dùng chung cho LCD, RPC (HeliChain), MEXC và CoinGecko.
+
+Một session aiohttp cho mỗi event loop, giữ kết nối keep-alive, nén gzip và
+giới hạn số kết nối trên mỗi host. Các handler gọi qua đây thay cho
+`requests.get` để không chặn event loop của bot.
+"""
+import asyncio
+import logging
+import os
+import time
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from metrics import UPSTREAM_BYTES, UPSTREAM_REQUESTS, UPSTREAM_SECONDS, endpoint_label
+
+LCD_ENDPOINT = os.getenv("LCD_ENDPOINT", "https://lcd.helichain.com").rstrip("/")
+MEXC_ENDPOINT = os.getenv("MEXC_ENDPOINT", "https://api.mexc.com").rstrip("/")
+MEXC_WS_ENDPOINT = os.getenv("MEXC_WS_ENDPOINT", "wss://wbs.mexc.com/ws")
+RPC_ENDPOINT = os.getenv("RPC_ENDPOINT", "https://rpc.helichain.com").rstrip("/")
+COINGECKO_ENDPOINT = os.getenv("COINGECKO_ENDPOINT", "https://api.coingecko.com").rstrip("/")
+
+HTTP_LIMIT = int(os.getenv("HTTP_LIMIT", 100))                 # tổng số kết nối
+HTTP_LIMIT_PER_HOST = int(os.getenv("HTTP_LIMIT_PER_HOST", 20))  # kết nối / host
+HTTP_KEEPALIVE = 60  # giây giữ kết nối rảnh
+
+
+class UpstreamError(Exception):
+    """Lỗi HTTP (status >= 400) từ LCD/MEXC."""
+
+    def __init__(self, status: int, url: str, body: str = ""):
+        super().__init__(f"HTTP {status} khi gọi {url}: {body[:200]}")
+        self.status = status
+        self.url = url
+
+
+class JsonClient:
+    """Client JSON bất đồng bộ với connection pool dùng chung."""
+
+    def __init__(self, base_url: str, timeout: float = 15, name: str = "http"):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.name = name  # nhãn upstream trong /metrics
+        self._sessions = {}  # event loop -> ClientSession
+
+    def _session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=HTTP_LIMIT,
+                limit_per_host=HTTP_LIMIT_PER_HOST,
+                keepalive_timeout=HTTP_KEEPALIVE,
+                ttl_dns_cache=300,
+            )
+            session = aiohttp.ClientSession(
+                connector=connector,
+                headers={"Accept": "application/json", "Accept-Encoding": "gzip, deflate"},
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+            self._sessions[loop] = session
+        return session
+
+    async def get_json(self, path: str, params: dict | None = None, timeout: float | None = None):
+        """GET `base_url + path` và trả về JSON; raise UpstreamError nếu status >= 400."""
+        url = path if path.startswith("http") else f"{self.base_url}{path}"
+        kwargs = {"params": params}
+        if timeout is not None:
+            kwargs["timeout"] = aiohttp.ClientTimeout(total=timeout)
+        endpoint = endpoint_label(urlsplit(url).path)
+        started = time.perf_counter()
+        status = "error"
+        try:
+            async with self._session().get(url, **kwargs) as resp:
+                status = str(resp.status)
+                body = await resp.read()
+                UPSTREAM_BYTES.labels(self.name, endpoint).inc(len(body))
+                if resp.status >= 400:
+                    raise UpstreamError(resp.status, url, await resp.text())
+                return await resp.json(content_type=None)
+        finally:
+            UPSTREAM_SECONDS.labels(self.name, endpoint).observe(time.perf_counter() - started)
+            UPSTREAM_REQUESTS.labels(self.name, endpoint, status).inc()
+
+    def ws_connect(self, url: str, **kwargs):
+        """Mở websocket trên session dùng chung (dùng với `async with`)."""
+        return self._session().ws_connect(url, **kwargs)
+
+    async def close(self):
+        for session in list(self._sessions.values()):
+            if not session.closed:
+                await session.close()
+        self._sessions.clear()
+
+
+class LcdClient(JsonClient):
+    """Các endpoint Cosmos mà bot đang dùng."""
+
+    async def latest_block(self) -> dict:
+        return await self.get_json("/cosmos/base/tendermint/v1beta1/blocks/latest")
+
+    async def pool(self) -> dict:
+        data = await self.get_json("/cosmos/staking/v1beta1/pool")
+        return data.get("pool", {})
+
+    async def inflation(self) -> float:
+        data = await self.get_json("/cosmos/mint/v1beta1/inflation")
+        return float(data.get("inflation", 0))
+
+    async def supply_of(self, denom: str = "uheli") -> int | None:
+        data = await self.get_json("/cosmos/bank/v1beta1/supply")
+        for coin in data.get("supply", []):
+            if coin.get("denom") == denom:
+                return int(coin.get("amount", 0))
+        return None
+
+    async def validators(self, status: str | None = None, limit: int = 2000) -> list[dict]:
+        params = {"pagination.limit": limit}
+        if status:
+            params["status"] = status
+        data = await self.get_json("/cosmos/staking/v1beta1/validators", params=params)
+        return data.get("validators", [])
+
+    async def balance(self, address: str, denom: str = "uheli") -> int:
+        data = await self.get_json(f"/cosmos/bank/v1beta1/balances/{address}")
+        for coin in data.get("balances", []):
+            if coin.get("denom") == denom:
+                return int(coin.get("amount", "0"))
+        return 0
+
+    async def delegations(self, address: str) -> list[dict]:
+        data = await self.get_json(f"/cosmos/staking/v1beta1/delegations/{address}")
+        return data.get("delegation_responses", [])
+
+    async def delegator_unbonding(self, address: str) -> list[dict]:
+        data = await self.get_json(f"/cosmos/staking/v1beta1/delegators/{address}/unbonding_delegations")
+        return data.get("unbonding_responses", [])
+
+    async def txs_by_event(self, events: str, offset: int = 0, limit: int = 100, by_page: bool = False) -> dict:
+        """
+        Một trang tx khớp `events` (mới nhất trước), phân trang theo
+        pagination.offset hoặc `page`/`limit` (by_page, SDK mới bỏ qua pagination).
+        """
+        params = {"events": events, "order_by": "ORDER_BY_DESC"}
+        if by_page:
+            params.update({"page": offset // limit + 1, "limit": limit})
+        else:
+            params.update({"pagination.offset": offset, "pagination.limit": limit})
+        return await self.get_json("/cosmos/tx/v1beta1/txs", params=params)
+
+    async def validator_unbonding_page(self, valoper: str, key: str | None = None, limit: int = 200) -> dict:
+        """Một trang unbonding_delegations của validator (kèm pagination.next_key)."""
+        params = {"pagination.limit": limit}
+        if key:
+            params["pagination.key"] = key
+        return await self.get_json(
+            f"/cosmos/staking/v1beta1/validators/{valoper}/unbonding_delegations", params=params
+        )
+
+
+class RpcClient(JsonClient):
+    """CometBFT RPC (JSON-RPC qua HTTP GET)."""
+
+    async def _result(self, path: str, params: dict | None = None) -> dict:
+        data = await self.get_json(path, params=params)
+        if "error" in data and data["error"]:
+            raise UpstreamError(500, f"{self.base_url}{path}", str(data["error"]))
+        return data.get("result", data)
+
+    async def latest_height(self) -> int:
+        result = await self._result("/status")
+        return int(result["sync_info"]["latest_block_height"])
+
+    async def block_results(self, height: int) -> dict:
+        return await self._result("/block_results", params={"height": height})
+
+
+class MexcClient(JsonClient):
+    """REST spot API v3 của MEXC."""
+
+    async def ticker_price(self, symbol: str = "HELIUSDT") -> float:
+        data = await self.get_json("/api/v3/ticker/price", params={"symbol": symbol})
+        return float(data.get("price", 0))
+
+    async def klines(self, symbol: str, interval: str, limit: int = 500,
+                     start_time: int | None = None, end_time: int | None = None) -> list:
+        """Nến thô của MEXC (mỗi nến là 1 list); start/end tính bằng ms."""
+        params = {"symbol": symbol, "interval": interval, "limit": limit}
+        if start_time is not None:
+            params["startTime"] = start_time
+        if end_time is not None:
+            params["endTime"] = end_time
+        data = await self.get_json("/api/v3/klines", params=params)
+        return data if isinstance(data, list) else []
+
+    async def depth(self, symbol: str = "HELIUSDT", limit: int = 100) -> dict:
+        """Snapshot orderbook: {"lastUpdateId", "bids": [[giá, KL], ...], "asks": [...]}."""
+        return await self.get_json("/api/v3/depth", params={"symbol": symbol, "limit": limit})
+
+    async def server_time(self) -> int:
+        """Giờ server MEXC (ms)."""
+        data = await self.get_json("/api/v3/time")
+        return int(data["serverTime"])
+
+    async def default_symbols(self) -> list[str]:
+        """Các cặp giao dịch được qua API."""
+        data = await self.get_json("/api/v3/defaultSymbols")
+        return list(data.get("data") or []) if isinstance(data, dict) else []
+
+
+_lcd = LcdClient(LCD_ENDPOINT, name="lcd")
+_rpc = RpcClient(RPC_ENDPOINT, name="rpc")
+_mexc = MexcClient(MEXC_ENDPOINT, timeout=20, name="mexc")
+_coingecko = JsonClient(COINGECKO_ENDPOINT, timeout=10, name="coingecko")
+
+
+def get_lcd() -> LcdClient:
+    return _lcd
+
+
+def get_rpc() -> RpcClient:
+    return _rpc
+
+
+def get_mexc() -> MexcClient:
+    return _mexc
+
+
+def get_coingecko() -> JsonClient:
+    return _coingecko
+
+
+async def close_clients(*_):
+    """Đóng toàn bộ session (gắn vào post_shutdown của Application)."""
+    for client in (_lcd, _rpc, _mexc, _coingecko):
+        try:
+            await client.close()
+        except Exception as e:
+            logging.warning(f"Lỗi khi đóng HTTP client: {e}")
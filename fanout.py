@@ -0,0 +1,104 @@
+"""
+Fan-out có giới hạn cho các lượt quét LCD phân trang theo từng key
+(ví dụ: unbonding_delegations của từng validator).
+
+Nhiều key chạy song song (tối đa `concurrency` request cùng lúc), còn các
+trang của cùng một key vẫn được lấy tuần tự theo `pagination.next_key`.
+"""
+import asyncio
+import logging
+import os
+import random
+import time
+from dataclasses import dataclass, field
+
+import aiohttp
+
+from clients import UpstreamError
+
+LCD_SCAN_CONCURRENCY = int(os.getenv("LCD_SCAN_CONCURRENCY", 16))
+LCD_SCAN_RETRIES = int(os.getenv("LCD_SCAN_RETRIES", 3))
+
+
+@dataclass
+class ScanStats:
+    name: str
+    keys: int = 0
+    pages: int = 0
+    retries: int = 0
+    failures: dict = field(default_factory=dict)  # key -> lỗi cuối cùng
+    started: float = field(default_factory=time.perf_counter)
+    elapsed: float = 0.0
+
+    def summary(self) -> str:
+        return (
+            f"[{self.name}] {self.keys} key, {self.pages} trang, "
+            f"{self.retries} retry, {len(self.failures)} lỗi trong {self.elapsed:.2f}s"
+        )
+
+
+def is_transient(exc: Exception) -> bool:
+    """Lỗi mạng/timeout/429/5xx thì thử lại; lỗi 4xx khác thì bỏ qua luôn."""
+    if isinstance(exc, UpstreamError):
+        return exc.status == 429 or exc.status >= 500
+    return isinstance(exc, (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError))
+
+
+def _next_key(page: dict):
+    return (page.get("pagination") or {}).get("next_key")
+
+
+async def scan_paginated(
+    keys,
+    fetch_page,
+    *,
+    name: str = "scan",
+    concurrency: int = LCD_SCAN_CONCURRENCY,
+    retries: int = LCD_SCAN_RETRIES,
+    backoff: float = 0.5,
+    next_key=_next_key,
+):
+    """
+    Gọi `await fetch_page(key, page_key)` cho mọi key, đi hết các trang của
+    từng key theo thứ tự. Trả về ({key: [page, ...]}, ScanStats).
+    Key lỗi quá số lần retry được ghi vào stats.failures và bỏ qua.
+    """
+    keys = list(keys)
+    stats = ScanStats(name=name, keys=len(keys))
+    sem = asyncio.Semaphore(max(1, concurrency))
+    results = {}
+
+    async def fetch_with_retry(key, page_key):
+        attempt = 0
+        while True:
+            try:
+                async with sem:
+                    return await fetch_page(key, page_key)
+            except Exception as e:
+                if attempt >= retries or not is_transient(e):
+                    raise
+                attempt += 1
+                stats.retries += 1
+                # backoff lũy thừa + jitter để không dội cùng lúc vào LCD
+                await asyncio.sleep(backoff * (2 ** (attempt - 1)) * (1 + random.random()))
+
+    async def walk(key):
+        pages = []
+        page_key = None
+        try:
+            while True:
+                page = await fetch_with_retry(key, page_key)
+                pages.append(page)
+                stats.pages += 1
+                page_key = next_key(page)
+                if not page_key:
+                    break
+            results[key] = pages
+        except Exception as e:
+            stats.failures[key] = str(e)
+            logging.warning(f"[{name}] Bỏ qua {key}: {e}")
+
+    await asyncio.gather(*(walk(k) for k in keys))
+    stats.elapsed = time.perf_counter() - stats.started
+    logging.info(stats.summary())
+    return results, stats
@@ -1,40 +1,59 @@
+import numpy as np
 import pandas as pd
-import ta
-import json
 import time
 import aiohttp
 import os
 import re
 import asyncio
 from collections import deque, defaultdict
+from dataclasses import asdict
 from concurrent.futures import ThreadPoolExecutor, as_completed
-import logging, requests, json
+import logging, requests
 from telegram import Update
 from telegram.ext import Application, CommandHandler, ContextTypes
-from datetime import datetime, timedelta, timezone
-from dateutil import parser
-from bs4 import BeautifulSoup
-from ta.momentum import RSIIndicator, StochasticOscillator
-from ta.trend import MACD, EMAIndicator
-from ta.volatility import BollingerBands
-from ta.trend import PSARIndicator
+import kernels
+from clients import LCD_ENDPOINT, MEXC_ENDPOINT, get_lcd, close_clients
+from cache import command_cache, single_flight
+from candle_store import COLUMNS as CANDLE_COLUMNS, get_candle_store
+from indicator_engine import get_engine
+from scoring import classify_signal, signal_scores
+from scanner import SCAN_INTERVAL, SCAN_TOP_N, scan_market
+from scheduler import CandleCloseScheduler
+from orderbook_stream import ORDERBOOK_STREAM, ORDERBOOK_WALL, get_orderbook_stream, read_book, run_orderbook_stream
+from broadcast import broadcast
+from book_sampler import MID as SAMPLE_MID, T as SAMPLE_T, get_book_sampler, run_book_sampler
+from unbonding import UNBONDING_SCAN_INTERVAL, UNBONDING_TRACKER, get_tracker, get_unbonding_snapshot, run_unbonding_tracker
+from refresher import get_refresher
+from state_store import get_state_store
+from transfer_index import get_transfer_index
+from transfer_watcher import TRANSFER_WATCH, get_transfer_watcher, run_transfer_watcher
+from users import (
+    ADMIN_ID, ALLOWED_USERS, grant, is_allowed, on_revoke, restore_users, revoke, showusers_handler,
+    track_users, whoami,
+)
+from light_commands import help_command, ping, price
+from metrics import instrument_command, register_collector
+from webserver import run_webhook
 
 # --- Biến toàn cục ---
 auto_signal_enabled = False
 signal_symbols = ["HELIUSDT"]  # danh sách coin theo dõi tự động
+AUTO_SCAN = os.getenv("AUTO_SCAN", "1") == "1"  # quét thêm nhiều cặp MEXC trong auto-signal
 ACTIVE_SIGNAL_USERS = set()    # user đã bật /signal on
 
-# Khởi tạo order_memory lưu tối đa 12 lần check ≈ 1 phút
-order_memory = deque(maxlen=60)  # lưu 60 lần check ≈ 1 giờ nếu check mỗi phút
 THRESHOLD_COUNT = 8  # ngưỡng spam lệnh
 CHECK_INTERVAL = 60  # giây
 
-THRESHOLD_WALL = 1_000_000   # 1 triệu HELI
+THRESHOLD_WALL = ORDERBOOK_WALL   # 1 triệu HELI (ORDERBOOK_WALL)
 MAX_PRICEDISPLAY = 10              # số mức giá hiển thị
 
 # Lưu chat_id của user khi /start
 user_chats = set()
 
+def allowed_chats() -> list:
+    """Chat nhận cảnh báo: nhóm (id < 0) hoặc chat riêng của user còn quyền."""
+    return [c for c in user_chats.copy() if c < 0 or is_allowed(c)]
+
 # -------------------------------
 # Cấu hình
 # -------------------------------
@@ -46,14 +65,13 @@ logging.basicConfig(
 # 1. Lấy BOT_TOKEN từ biến môi trường
 # ===========================
 BOT_TOKEN = os.getenv("BOT_TOKEN")
-LCD = "https://lcd.helichain.com"
+LCD = LCD_ENDPOINT
 PORT = int(os.getenv("PORT", 8080))  # Render cấp PORT
 WEBHOOK_URL = os.getenv("RENDER_URL")  # https://<appname>.onrender.com
 EXPLORER_URL = "https://explorer.helichain.com/Helichain/tokens/native/uheli"
 
 # ====== API Helpers ======
-BASE_URL = "https://api.mexc.com/api/v3"
-API_URL = "https://api.mexc.com/api/v3/depth?symbol=HELIUSDT&limit=500"
+BASE_URL = f"{MEXC_ENDPOINT}/api/v3"
 
 if not BOT_TOKEN:
     raise ValueError("⚠️ Chưa thiết lập biến môi trường BOT_TOKEN")
@@ -65,88 +83,6 @@ CORE_WALLETS = {
     "heli196slpj6yrqxj74ftpqspuzd609rqu9wl6j6fde": "Ví nhận từ DAOs"
 }
 
-# Bộ nhớ tạm để lưu snapshot
-last_snapshot = {"asks": 0, "bids": 0, "time": 0}
-
-# -------------------------------
-# Quản lý User
-# -------------------------------
-ADMIN_ID = 2028673755
-# Đọc danh sách ID từ biến môi trường ALLOWED_IDS
-env_ids = os.getenv("ALLOWED_IDS", "")
-ALLOWED_USERS = set()
-
-if env_ids.strip():
-    # loại bỏ khoảng trắng khi split
-    ALLOWED_USERS = set(int(uid.strip()) for uid in env_ids.split(",") if uid.strip())
-
-# Luôn đảm bảo ADMIN_ID nằm trong danh sách
-ALLOWED_USERS.add(ADMIN_ID)
-
-def is_allowed(user_id: int) -> bool:
-    return user_id in ALLOWED_USERS
-
-async def whoami(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = update.effective_user.id
-    if is_allowed(user_id):
-        await update.message.reply_text(
-            f"👤 ID của bạn là `{user_id}` và đã có quyền.",
-            parse_mode="Markdown"
-        )
-    else:
-        await update.message.reply_text(
-            f"⚠️ ID của bạn là `{user_id}` nhưng *chưa được cấp quyền.*\n"
-            f"👉 Hãy gửi ID này cho admin để thêm vào biến `ALLOWED_IDS`.",
-            parse_mode="Markdown"
-        )
-
-async def showusers_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if not is_allowed(update.effective_user.id):
-        await update.message.reply_text("🚫 Bạn không có quyền dùng lệnh này.")
-        return
-
-    env_ids = os.getenv("ALLOWED_IDS", "")
-    if not env_ids.strip():
-        await update.message.reply_text("⚠️ Hiện chưa có ID nào trong ALLOWED_IDS (biến môi trường).")
-        return
-
-    ids = [uid.strip() for uid in env_ids.split(",") if uid.strip()]
-    ids_list = "\n".join(f"- `{uid}`" for uid in sorted(ids, key=lambda x: int(x)))
-    msg = f"👥 *Danh sách ID trong ALLOWED_IDS (Render Env):*\n{ids_list}"
-    await update.message.reply_text(msg, parse_mode="Markdown")
-
-
-async def grant(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if update.effective_user.id != ADMIN_ID:
-        await update.message.reply_text("🚫 Bạn không có quyền thêm user.")
-        return
-    if not context.args:
-        await update.message.reply_text("⚠️ Dùng: /grant <user_id>")
-        return
-    try:
-        new_id = int(context.args[0])
-        ALLOWED_USERS.add(new_id)
-        await update.message.reply_text(f"✅ Đã cấp quyền cho user {new_id}")
-    except ValueError:
-        await update.message.reply_text("⚠️ User ID không hợp lệ.")
-
-async def revoke(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if update.effective_user.id != ADMIN_ID:
-        await update.message.reply_text("🚫 Bạn không có quyền xoá user.")
-        return
-    if not context.args:
-        await update.message.reply_text("⚠️ Dùng: /revoke <user_id>")
-        return
-    try:
-        rem_id = int(context.args[0])
-        if rem_id in ALLOWED_USERS:
-            ALLOWED_USERS.remove(rem_id)
-            await update.message.reply_text(f"✅ Đã xoá quyền user {rem_id}")
-        else:
-            await update.message.reply_text("⚠️ User này chưa được cấp quyền.")
-    except ValueError:
-        await update.message.reply_text("⚠️ User ID không hợp lệ.")
-
 # -------------------------------
 # Helper Functions
 # -------------------------------
@@ -155,59 +91,23 @@ async def revoke(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def fetch_ohlcv(symbol: str, interval: str = "15m", limit: int = 200):
     """
-    Lấy OHLCV từ MEXC. Tự phát hiện schema (8/12/6 cột) và chuẩn hoá
-    thành các cột tối thiểu: timestamp, open, high, low, close, volume.
-    Trả về None nếu không có dữ liệu.
+    Lấy OHLCV từ kho nến cục bộ, chỉ tải thêm các nến mới từ MEXC.
+    Trả về DataFrame với các cột tối thiểu: timestamp, open, high, low,
+    close, volume. Trả về None nếu không có dữ liệu.
     """
-    url = f"https://api.mexc.com/api/v3/klines?symbol={symbol}&interval={interval}&limit={limit}"
-    async with aiohttp.ClientSession() as session:
-        try:
-            async with session.get(url, timeout=20) as resp:
-                text = await resp.text()
-        except Exception as e:
-            print(f"[MEXC] HTTP error: {e}")
-            return None
-
     try:
-        data = json.loads(text)
+        rows = await get_candle_store().sync(symbol, interval, limit)
     except Exception as e:
-        print(f"[MEXC] JSON decode error: {e} -> {text[:200]}")
+        print(f"[MEXC] HTTP error: {e}")
         return None
 
     # Không có dữ liệu
-    if not isinstance(data, list) or len(data) == 0:
-        print(f"[MEXC] Empty klines for {symbol} {interval}: {data}")
+    if not rows:
+        print(f"[MEXC] Empty klines for {symbol} {interval}")
         return None
 
-    # Chuẩn hoá schema theo số cột trả về
-    ncols = len(data[0])
-    df = pd.DataFrame(data)
-
-    if ncols == 12:
-        # Binance-like: 12 cột
-        df.columns = [
-            "open_time","open","high","low","close","volume",
-            "close_time","quote_asset_volume","num_trades",
-            "taker_buy_base","taker_buy_quote","ignore"
-        ]
-    elif ncols == 8:
-        # MEXC spot: 8 cột (turnover ~ quote_asset_volume)
-        df.columns = [
-            "open_time","open","high","low","close","volume",
-            "close_time","quote_asset_volume"
-        ]
-    elif ncols == 6:
-        # Một số nguồn rút gọn
-        df.columns = ["open_time","open","high","low","close","volume"]
-        df["close_time"] = pd.NA
-        df["quote_asset_volume"] = pd.NA
-    else:
-        # Fallback: lấy 6 cột đầu, bỏ phần thừa
-        base_cols = ["open_time","open","high","low","close","volume"]
-        df = df.iloc[:, :len(base_cols)]
-        df.columns = base_cols
-        df["close_time"] = pd.NA
-        df["quote_asset_volume"] = pd.NA
+    # Kho nến đã chuẩn hoá schema (12/8/6 cột) về COLUMNS
+    df = pd.DataFrame(rows, columns=CANDLE_COLUMNS)
 
     # Ép kiểu & đổi tên cột thời gian
     for col in ["open","high","low","close","volume"]:
@@ -230,6 +130,9 @@ def calculate_indicators(df: pd.DataFrame) -> pd.DataFrame:
     Tính toán các chỉ báo kỹ thuật được tinh chỉnh cho khung 15 phút.
     Phù hợp để phát hiện tín hiệu đảo chiều ngắn hạn và cảnh báo FOMO/Panic.
     """
+    from ta.momentum import RSIIndicator, StochasticOscillator
+    from ta.trend import MACD, EMAIndicator
+    from ta.volatility import BollingerBands
 
     # ===== RSI =====
     # RSI ngắn (9) phản ứng nhanh, RSI dài (21) giúp xác nhận xu hướng.
@@ -263,8 +166,7 @@ def calculate_indicators(df: pd.DataFrame) -> pd.DataFrame:
     df["bb_mid"] = bb.bollinger_mavg()
 
     # ===== Parabolic SAR =====
-    sar = PSARIndicator(high=df["high"], low=df["low"], close=df["close"], step=0.02, max_step=0.2)
-    df["sar"] = sar.psar()
+    df["sar"] = kernels.psar(df["high"].values, df["low"].values, df["close"].values, step=0.02, max_step=0.2)
 
     # ===== Volume động (giúp nhận biết FOMO/Panic) =====
     df["vol_ma"] = df["volume"].rolling(window=20).mean()
@@ -274,6 +176,29 @@ def calculate_indicators(df: pd.DataFrame) -> pd.DataFrame:
 
 
 
+# --- Chỉ báo streaming: chỉ cập nhật các nến mới thay vì tính lại toàn bộ ---
+SIGNAL_WARMUP = 1000  # số nến nạp lần đầu cho engine (đủ để EMA200 ổn định)
+
+@single_flight(reuse=0)  # chỉ gộp lệnh gọi đồng thời: /signal ngay sau nến đóng phải thấy nến mới
+async def stream_indicators(symbol: str, interval: str = "15m"):
+    """
+    Đồng bộ kho nến rồi đưa các nến mới (và nến cuối chưa đóng) vào engine
+    của (symbol, interval). Trả về engine, hoặc None nếu lỗi lấy dữ liệu.
+    """
+    engine = get_engine(symbol, interval)
+    store = get_candle_store()
+    try:
+        if engine.count == 0:
+            rows = await store.sync(symbol, interval, SIGNAL_WARMUP)
+        else:
+            await store.sync(symbol, interval, 1)
+            rows = store.load_since(symbol, interval, engine.last_open_time)
+    except Exception as e:
+        print(f"[MEXC] HTTP error: {e}")
+        return None
+    engine.feed(rows)
+    return engine
+
 # --- Tạo tín hiệu heuristic (MUA/BÁN/TRUNG LẬP) ---
 def generate_signal(df: pd.DataFrame):
     """
@@ -355,43 +280,10 @@ def generate_signal(df: pd.DataFrame):
         reasons.append("😨 Cảnh báo Panic: Bán tháo, khối lượng giảm mạnh.")
 
     # ====== CHẤM ĐIỂM ======
-    buy_conditions = [
-        (ema8 > ema21),
-        (macd > macd_signal),
-        (rsi > 40 and rsi < 70),
-        (price > ema8),
-        (stoch_k > stoch_d)
-    ]
-    sell_conditions = [
-        (ema8 < ema21),
-        (macd < macd_signal),
-        (rsi > 70 or rsi < 30),
-        (price < ema21),
-        (stoch_k < stoch_d)
-    ]
-
-    buy_score = sum(buy_conditions)
-    sell_score = sum(sell_conditions)
+    buy_score, sell_score = signal_scores(last)
 
     # ====== KẾT LUẬN HEURISTIC ======
-    strength_text = "Trung lập"
-    if buy_score >= 4 and sell_score <= 2:
-        if buy_score == 5:
-            signal = "🟢 MUA mạnh"
-            strength_text = "Tín hiệu mua rất mạnh (5/5 chỉ báo ủng hộ)"
-        else:
-            signal = "🟢 MUA yếu"
-            strength_text = "Xu hướng nghiêng tăng (đa phần chỉ báo ủng hộ)"
-    elif sell_score >= 4 and buy_score <= 2:
-        if sell_score == 5:
-            signal = "🔴 BÁN mạnh"
-            strength_text = "Tín hiệu bán rất mạnh (5/5 chỉ báo ủng hộ)"
-        else:
-            signal = "🔴 BÁN yếu"
-            strength_text = "Xu hướng nghiêng giảm (đa phần chỉ báo ủng hộ)"
-    else:
-        signal = "⚪ Trung lập yếu"
-        strength_text = "Thị trường sideway hoặc tín hiệu yếu."
+    signal, strength_text = classify_signal(buy_score, sell_score)
 
     # ====== HIỂN THỊ CHI TIẾT ======
     reasons.append(f"✅ Tổng điểm MUA: {buy_score}, BÁN: {sell_score}")
@@ -409,37 +301,15 @@ def generate_signal(df: pd.DataFrame):
 
 # Supertrend helper
 def supertrend(df, period=10, multiplier=3):
-    hl2 = (df['h'] + df['l']) / 2
-    atr = ta.volatility.AverageTrueRange(df['h'], df['l'], df['c'], window=period).average_true_range()
-    upperband = hl2 + (multiplier * atr)
-    lowerband = hl2 - (multiplier * atr)
-
-    final_upperband = upperband.copy()
-    final_lowerband = lowerband.copy()
-
-    for i in range(1, len(df)):
-        if df['c'].iloc[i-1] <= final_upperband.iloc[i-1]:
-            final_upperband.iloc[i] = min(upperband.iloc[i], final_upperband.iloc[i-1])
-        else:
-            final_upperband.iloc[i] = upperband.iloc[i]
-
-        if df['c'].iloc[i-1] >= final_lowerband.iloc[i-1]:
-            final_lowerband.iloc[i] = max(lowerband.iloc[i], final_lowerband.iloc[i-1])
-        else:
-            final_lowerband.iloc[i] = lowerband.iloc[i]
-
-    st = pd.Series(index=df.index)
-    for i in range(len(df)):
-        if df['c'].iloc[i] > final_upperband.iloc[i]:
-            st.iloc[i] = 1   # tăng
-        elif df['c'].iloc[i] < final_lowerband.iloc[i]:
-            st.iloc[i] = -1  # giảm
-        else:
-            st.iloc[i] = st.iloc[i-1] if i > 0 else 1
-    return st
+    return pd.Series(
+        kernels.supertrend(df['h'].values, df['l'].values, df['c'].values, period, multiplier),
+        index=df.index,
+    )
 
 # Hàm phân tích kỹ thuật cho 1 timeframe
 def analyze_tf(df):
+    import ta
+
     if df.empty:
         return ["⚠️ Không có dữ liệu"], "❓ Không xác định"
 
@@ -454,7 +324,7 @@ def analyze_tf(df):
 
     rsi = ta.momentum.RSIIndicator(df['c'], 14).rsi().iloc[-1]
 
-    sar = ta.trend.PSARIndicator(df['h'], df['l'], df['c']).psar().iloc[-1]
+    sar = kernels.psar(df['h'].values, df['l'].values, df['c'].values)[-1]
     close = df['c'].iloc[-1]
 
     vol = df['v'].iloc[-1]
@@ -565,242 +435,95 @@ def make_ascii_chart(data, label, total):
 
 
 
-def get_unbonding_heatmap():
+# --- Snapshot nền: handler đọc dữ liệu đã làm mới sẵn (lịch ở refresher.py) ---
+refresher = get_refresher()
+
+async def fetch_chain_stats() -> dict:
+    """Block mới nhất, pool, supply, inflation trong một lượt gọi LCD."""
+    lcd = get_lcd()
+    block, pool, supply_uheli, inflation = await asyncio.gather(
+        lcd.latest_block(), lcd.pool(), lcd.supply_of("uheli"), lcd.inflation()
+    )
+    return {"block": block, "pool": pool, "supply": supply_uheli, "inflation": inflation}
+
+async def fetch_latest_block() -> dict:
+    return (await refresher.value("chain"))["block"]
+
+async def fetch_pool() -> dict:
+    return (await refresher.value("chain"))["pool"]
+
+async def fetch_supply_uheli() -> int | None:
+    return (await refresher.value("chain"))["supply"]
+
+async def fetch_inflation() -> float:
+    return (await refresher.value("chain"))["inflation"]
+
+async def fetch_validators() -> list[dict]:
+    """Danh sách validator (dùng chung, không sửa tại chỗ)."""
+    return await refresher.value("validators")
+
+@single_flight()
+async def get_unbonding_heatmap():
     """Trả về heatmap HELI unbonding theo số ngày còn lại."""
     try:
-        base = "https://lcd.helichain.com/cosmos/staking/v1beta1"
-        vals = requests.get(f"{base}/validators?pagination.limit=200", timeout=20).json()
-        validators = vals.get("validators", [])
-        heatmap = {i: 0 for i in range(15)}  # 0..14 ngày
-
-        now = datetime.now(timezone.utc)
-
-        for val in validators:
-            valoper = val.get("operator_address")
-            if not valoper:
-                continue
-            page_key = None
-            while True:
-                url = f"{base}/validators/{valoper}/unbonding_delegations"
-                params = {"pagination.limit": 200}
-                if page_key:
-                    params["pagination.key"] = page_key
-                r = requests.get(url, params=params, timeout=20).json()
-
-                for ub in r.get("unbonding_responses", []):
-                    for entry in ub.get("entries", []):
-                        bal = int(entry.get("balance", "0"))
-                        ts = entry.get("completion_time")
-                        if not ts:
-                            continue
-                        try:
-                            dt = parser.isoparse(ts)
-                            if dt.tzinfo is None:
-                                dt = dt.replace(tzinfo=timezone.utc)
-                            else:
-                                dt = dt.astimezone(timezone.utc)
-                            days_left = (dt - now).days
-                            if 0 <= days_left <= 14:
-                                heatmap[days_left] += bal
-                        except Exception as e:
-                            logging.warning(f"Lỗi parse completion_time: {e}")
-
-                page_key = r.get("pagination", {}).get("next_key")
-                if not page_key:
-                    break
-
+        snapshot = await refresher.value("unbonding")
         # Chuyển về HELI
-        for d in heatmap:
-            heatmap[d] = heatmap[d] / 1e6
-        return heatmap
+        return {d: bal / 1e6 for d, bal in snapshot.heatmap(days=14).items()}
     except Exception as e:
         logging.error(f"Lỗi khi lấy heatmap unbonding: {e}")
         return {}
 
-def get_total_unbonding_with_top10():
+@single_flight()
+async def get_total_unbonding_with_top10():
     """Tính tổng HELI unbonding và top 10 ví unbonding nhiều nhất."""
     try:
-        base = "https://lcd.helichain.com/cosmos/staking/v1beta1"
-        vals = requests.get(f"{base}/validators?pagination.limit=200", timeout=20).json()
-        validators = vals.get("validators", [])
-        total = 0
-        wallets = {}
-
-        for val in validators:
-            valoper = val.get("operator_address")
-            if not valoper:
-                continue
-            page_key = None
-            while True:
-                url = f"{base}/validators/{valoper}/unbonding_delegations"
-                params = {"pagination.limit": 200}
-                if page_key:
-                    params["pagination.key"] = page_key
-                r = requests.get(url, params=params, timeout=20).json()
-
-                for ub in r.get("unbonding_responses", []):
-                    delegator = ub.get("delegator_address")
-                    for entry in ub.get("entries", []):
-                        bal = int(entry.get("balance", "0"))
-                        total += bal
-                        wallets[delegator] = wallets.get(delegator, 0) + bal
-
-                page_key = r.get("pagination", {}).get("next_key")
-                if not page_key:
-                    break
-
-        # Sắp xếp top 10 ví
-        top10 = sorted(wallets.items(), key=lambda x: x[1], reverse=True)[:10]
-        return total / 1e6, [(addr, bal / 1e6) for addr, bal in top10]
+        snapshot = await refresher.value("unbonding")
+        top10 = snapshot.top_wallets(10)
+        return snapshot.total() / 1e6, [(addr, bal / 1e6) for addr, bal in top10]
 
     except Exception as e:
         logging.error(f"Lỗi khi lấy unbonding: {e}")
         return None, []
 
-def get_total_supply_uheli():
+async def get_total_supply_uheli():
     """Trả về tổng cung HELI (uheli, int)."""
     try:
-        url = "https://lcd.helichain.com/cosmos/bank/v1beta1/supply"
-        r = requests.get(url, timeout=15)
-        r.raise_for_status()
-        amounts = r.json().get("supply", [])
-        for coin in amounts:
-            if coin.get("denom") == "uheli":
-                return int(coin.get("amount", 0))
-        return None
+        return await fetch_supply_uheli()
     except Exception as e:
         logging.error(f"Lỗi khi lấy supply: {e}")
         return None
 
 
-def get_tx_last_7d(address):
-    url = "https://lcd.helichain.com/cosmos/tx/v1beta1/txs"
-    end_time = datetime.now(timezone.utc)             # UTC aware
-    start_time = end_time - timedelta(days=7)
-    page_key = None
-    total_sent = 0
-
+async def get_pool():
     try:
-        while True:
-            params = {
-                "events": f"transfer.sender='{address}'",
-                "pagination.limit": 100
-            }
-            if page_key:
-                params["pagination.key"] = page_key
-
-            r = requests.get(url, params=params, timeout=20).json()
-            txs = r.get("tx_responses", [])
-
-            for tx in txs:
-                try:
-                    ts = parser.isoparse(tx.get("timestamp", ""))
-
-                    # ✅ ép về UTC aware
-                    if ts.tzinfo is None:
-                        ts = ts.replace(tzinfo=timezone.utc)
-                    ts = ts.astimezone(timezone.utc)
-
-                except Exception as e:
-                    logging.warning(f"Lỗi parse timestamp: {e}")
-                    continue
-
-                # ✅ ép start_time và end_time cũng thành UTC aware
-                s = start_time.astimezone(timezone.utc)
-                e = end_time.astimezone(timezone.utc)
-
-                # So sánh UTC aware <-> UTC aware
-                if ts < s:
-                    return total_sent  # dừng khi ra khỏi 7 ngày
-
-                if s <= ts <= e:
-                    for log in tx.get("logs", []):
-                        for event in log.get("events", []):
-                            if event.get("type") == "transfer":
-                                for attr in event.get("attributes", []):
-                                    if attr.get("key") == "amount" and attr.get("value", "").endswith("uheli"):
-                                        try:
-                                            val = int(attr["value"].replace("uheli", ""))
-                                            total_sent += val / 1_000_000
-                                        except Exception as e:
-                                            logging.warning(f"Lỗi parse amount: {e}")
-
-            page_key = r.get("pagination", {}).get("next_key")
-            if not page_key:
-                break
-
-    except Exception as e:
-        logging.error(f"Lỗi khi lấy tx của {address}: {e}")
-
-    return total_sent
-
-def get_pool():
-    try:
-        url = f"{LCD}/cosmos/staking/v1beta1/pool"
-        r = requests.get(url, timeout=10)
-        r.raise_for_status()
-        return r.json().get("pool", {})
+        return await fetch_pool()
     except Exception as e:
         logging.error(f"Lỗi lấy pool: {e}")
         return {}
 
-def get_inflation():
+async def get_inflation():
     try:
-        url = f"{LCD}/cosmos/mint/v1beta1/inflation"
-        r = requests.get(url, timeout=10)
-        r.raise_for_status()
-        return float(r.json().get("inflation", 0))
+        return await fetch_inflation()
     except Exception as e:
         logging.error(f"Lỗi lấy inflation: {e}")
         return 0.0
 
-def get_top_validator():
+async def get_top_validator():
     try:
-        url = f"{LCD}/cosmos/staking/v1beta1/validators?status=BOND_STATUS_BONDED"
-        r = requests.get(url, timeout=10)
-        r.raise_for_status()
-        validators = r.json().get("validators", [])
+        validators = [v for v in await fetch_validators() if v.get("status") == "BOND_STATUS_BONDED"]
         if not validators:
             return None
-        validators.sort(key=lambda v: int(v.get("tokens", 0)), reverse=True)
-        return validators[0]  # Top 1
+        return max(validators, key=lambda v: int(v.get("tokens", 0)))  # Top 1
     except Exception as e:
         logging.error(f"Lỗi lấy danh sách validator: {e}")
         return None
 
-def get_total_unbonding():
+@single_flight()
+async def get_total_unbonding():
     """Tính tổng HELI đang unbonding từ tất cả delegator trên toàn mạng."""
     try:
-        base = "https://lcd.helichain.com/cosmos/staking/v1beta1"
-        # 1. Lấy danh sách validator
-        vals = requests.get(f"{base}/validators?pagination.limit=200", timeout=20).json()
-        validators = vals.get("validators", [])
-        total = 0
-
-        for val in validators:
-            valoper = val.get("operator_address")
-            if not valoper:
-                continue
-            page_key = None
-            while True:
-                url = f"{base}/validators/{valoper}/unbonding_delegations"
-                params = {"pagination.limit": 200}
-                if page_key:
-                    params["pagination.key"] = page_key
-                r = requests.get(url, params=params, timeout=20).json()
-
-                for ub in r.get("unbonding_responses", []):
-                    for entry in ub.get("entries", []):
-                        try:
-                            total += int(entry.get("balance", "0"))
-                        except:
-                            pass
-
-                page_key = r.get("pagination", {}).get("next_key")
-                if not page_key:
-                    break
-
-        return total / 1e6
+        snapshot = await refresher.value("unbonding")
+        return snapshot.total() / 1e6
     except Exception as e:
         logging.error(f"Lỗi khi lấy unbonding: {e}")
         return None
@@ -852,58 +575,40 @@ def _sum_unbonding_for_validator(valoper: str) -> int:
         logging.error(f"Lỗi lấy unbonding cho {valoper}: {e}")
         return 0
 
-def get_balance(address):
+async def get_balance(address):
     """Lấy balance HELI của ví"""
     try:
-        r = requests.get(
-            f"https://lcd.helichain.com/cosmos/bank/v1beta1/balances/{address}",
-            timeout=10
-        )
-        r.raise_for_status()
-        balances = r.json().get("balances", [])
-        for b in balances:
-            if b.get("denom") == "uheli":
-                return int(b.get("amount", "0")) / 1_000_000
-    except requests.exceptions.Timeout:
+        return await get_lcd().balance(address, "uheli") / 1_000_000
+    except asyncio.TimeoutError:
         logging.error(f"⏱ Timeout khi gọi get_balance({address})")
     except Exception as e:
         logging.error(f"Lỗi get_balance({address}): {e}")
     return 0
 
 
-def get_staked(address):
+async def get_staked(address):
     """Lấy tổng HELI đang stake"""
     try:
-        r = requests.get(
-            f"https://lcd.helichain.com/cosmos/staking/v1beta1/delegations/{address}",
-            timeout=10
-        )
-        r.raise_for_status()
         total = 0
-        for d in r.json().get("delegation_responses", []):
+        for d in await get_lcd().delegations(address):
             total += int(d.get("balance", {}).get("amount", "0"))
         return total / 1_000_000
-    except requests.exceptions.Timeout:
+    except asyncio.TimeoutError:
         logging.error(f"⏱ Timeout khi gọi get_staked({address})")
     except Exception as e:
         logging.error(f"Lỗi get_staked({address}): {e}")
     return 0
 
 
-def get_unstaking(address):
+async def get_unstaking(address):
     """Lấy tổng HELI đang unstake"""
     try:
-        r = requests.get(
-            f"https://lcd.helichain.com/cosmos/staking/v1beta1/delegators/{address}/unbonding_delegations",
-            timeout=10
-        )
-        r.raise_for_status()
         total = 0
-        for u in r.json().get("unbonding_responses", []):
+        for u in await get_lcd().delegator_unbonding(address):
             for entry in u.get("entries", []):
                 total += int(entry.get("balance", "0"))
         return total / 1_000_000
-    except requests.exceptions.Timeout:
+    except asyncio.TimeoutError:
         logging.error(f"⏱ Timeout khi gọi get_unstaking({address})")
     except Exception as e:
         logging.error(f"Lỗi get_unstaking({address}): {e}")
@@ -915,205 +620,208 @@ def get_unstaking(address):
 # -------------------------------
 # --- Lệnh /start ---
 
+def chat_jobs(chat_id: int) -> tuple:
+    return (
+        (f"doilai:{chat_id}", job_detect_doilai, 300, 10),
+        (f"trend:{chat_id}", job_trend, 900, 30),
+    )
+
+def schedule_chat_jobs(job_queue, chat_id: int):
+    """Tạo (lại) các job định kỳ của chat; job cũ cùng tên bị thay để /start nhiều lần không nhân đôi."""
+    if job_queue is None:
+        logging.warning("JobQueue chưa được cài (python-telegram-bot[job-queue]), bỏ qua job định kỳ.")
+        return
+    for name, callback, interval, first in chat_jobs(chat_id):
+        for job in job_queue.get_jobs_by_name(name):
+            job.schedule_removal()
+        job_queue.run_repeating(callback, interval=interval, first=first, chat_id=chat_id, name=name)
+
+@on_revoke
+def drop_user_chat(user_id: int, context: ContextTypes.DEFAULT_TYPE):
+    """/revoke: ngừng gửi cảnh báo / tín hiệu cho chat riêng của user."""
+    user_chats.discard(user_id)
+    ACTIVE_SIGNAL_USERS.discard(user_id)
+    if context.job_queue is not None:
+        for name, *_ in chat_jobs(user_id):
+            for job in context.job_queue.get_jobs_by_name(name):
+                job.schedule_removal()
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_allowed(update.effective_user.id):
+        await update.message.reply_text("🚫 Bạn không có quyền dùng bot này. Dùng /whoami để lấy ID gửi admin.")
+        return
     chat_id = update.effective_chat.id
     await update.message.reply_text("✅ Bot khởi động. Sẽ gửi cảnh báo tự động. Bạn đã bắt đầu nhận cảnh báo lệnh mồi.")
-    job_queue: JobQueue = context.job_queue
-    job_queue.run_repeating(job_detect_doilai, interval=300, first=10, chat_id=chat_id)
-    job_queue.run_repeating(job_trend, interval=900, first=30, chat_id=chat_id)
-
-async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    help_text = """
-📖 Danh sách lệnh khả dụng:
-
-/help - Xem hướng dẫn
-/whoami - Hiển thị ID và quyền của bạn
-/grant <id> - Cấp quyền tạm thời cho user (admin)
-/revoke <id> - Thu hồi tạm thời quyền user (admin)
-/clear - Xóa 50 tin nhắn gần đây
-/showusers - Liệt kê ID được cấp quyền
-/heliinfo - Tổng quan HELI
-
-/staked - Xem tổng HELI đã staking
-/unstake - Xem tổng HELI đang unstake
-/unbonding_wallets - Xem số ví đang unbonding
-/validator - Danh sách validator & trạng thái jail
-/status - Trạng thái hệ thống
-
-/price - Giá HELI hiện tại
-/supply - Tổng cung HELI
-/apy - Tính APY staking (đã trừ commission)
-/coreteam - Tình trạng các ví Core Team
-
-/heatmap - Chi tiết lượng unstake trong 14 ngày
-/orderbook - Tổng quan cung cầu MUA - BÁN
-/flow - Biến động M-B trong 1h
-/detect_doilai - Phát hiện ĐỘI LÁI
-/alert - Cảnh báo Spam lệnh mồi
-/trend - Đánh giá xu hướng HELI
-/signal - Chỉ báo tín hiệu Mua/ Bán
-"""
-    await update.message.reply_text(help_text)
+    user_chats.add(chat_id)
+    schedule_chat_jobs(context.job_queue, chat_id)
+
+# --- /heliinfo: các mục chạy song song, mỗi mục có thời hạn riêng ---
+HELIINFO_FIRST_REPLY = 0.8      # giây: gửi bản đầu tiên với các mục đã xong
+HELIINFO_EDIT_INTERVAL = 1.0    # giây: giãn cách giữa 2 lần edit tin nhắn
+HELIINFO_DEADLINES = {          # giây cho từng mục
+    "status": 5, "validator": 8, "bonded_ratio": 8, "apy": 8, "top3": 8,
+    "staked": 8, "supply": 8, "price": 5,
+    "unstake": 90, "wallets": 90, "top5": 90,
+}
+PENDING_TXT = "⏳ Đang tải..."
+
+HELIINFO_SNAPSHOTS = ("chain", "validators", "unbonding", "price")
+
+def render_heliinfo(sec: dict, footer: str = "") -> str:
+    t = lambda k: sec.get(k, PENDING_TXT)
+    return (
+        "📊 *HELI Overview*\n\n"
+        "🌐 *Mạng & Validator*\n"
+        f"{t('status')}\n"
+        f"🖥 Validator: {t('validator')}\n"
+        f"📈 Bonded Ratio: {t('bonded_ratio')}\n"
+        f"💰 APY: {t('apy')}\n"
+        f"🏆 Top 3 Validator:\n{t('top3')}\n\n"
+        "🔗 *Tokenomics*\n"
+        f"💎 Staked: {t('staked')}\n"
+        f"🔓 Unstake: {t('unstake')}\n"
+        f"👛 Unbonding Wallets: {t('wallets')}\n"
+        f"💰 Supply: {t('supply')}\n"
+        f"📤 Top 5 Unstake:\n{t('top5')}\n\n"
+        "💹 *Thị trường*\n"
+        f"💲 Price: {t('price')}"
+        + (f"\n\n{footer}" if footer else "")
+    )
+
+def heliinfo_sections(inputs: dict) -> dict:
+    """Trả về {tên mục: (coroutine function, text khi lỗi)} đọc từ input dùng chung."""
+    # shield để timeout của một mục không huỷ input mà mục khác đang dùng
+    need = lambda name: asyncio.shield(inputs[name])
+
+    async def status_sec():
+        r = await need("block")
+        height = r.get("block", {}).get("header", {}).get("height", "N/A")
+        proposer = r.get("block", {}).get("header", {}).get("proposer_address", "N/A")
+        return f"⛓ Block height: {height}\n👤 Proposer: {proposer}"
+
+    async def validator_sec():
+        vals = await need("validators")
+        total = len(vals)
+        jailed = sum(1 for v in vals if v.get("jailed", False))
+        bonded = sum(1 for v in vals if v.get("status") == "BOND_STATUS_BONDED" and not v.get("jailed", False))
+        return f"Tổng: {total} | Bonded: {bonded} | Jail: {jailed}"
+
+    async def bonded_ratio_sec():
+        bonded = int((await need("pool")).get("bonded_tokens", 0))
+        supply_uheli = await need("supply")
+        ratio = bonded / supply_uheli * 100 if bonded and supply_uheli else 0
+        return f"{ratio:.2f}%"
+
+    async def apy_sec():
+        bonded = int((await need("pool")).get("bonded_tokens", 0))
+        supply_uheli = await need("supply")
+        inflation = await need("inflation")
+        bonded_vals = [v for v in await need("validators") if v.get("status") == "BOND_STATUS_BONDED"]
+        top_val = max(bonded_vals, key=lambda v: int(v.get("tokens", 0)), default=None)
+        commission = float(top_val.get("commission", {}).get("commission_rates", {}).get("rate", 0)) if top_val else 0
+        apy_value = inflation / (bonded / supply_uheli) * (1 - commission) * 100 if bonded and supply_uheli else 0
+        return f"{apy_value:.2f}%"
+
+    async def top3_sec():
+        bonded = int((await need("pool")).get("bonded_tokens", 0))
+        sorted_vals = sorted(await need("validators"), key=lambda v: int(v.get("tokens", 0)), reverse=True)[:3]
+        lines = []
+        for i, v in enumerate(sorted_vals, 1):
+            moniker = v.get("description", {}).get("moniker", "N/A")
+            tokens = int(v.get("tokens", 0))
+            percent = tokens / bonded * 100 if bonded else 0
+            lines.append(f"{i}. {moniker} — {tokens/1e6:,.0f} HELI ({percent:.2f}%)")
+        return "\n".join(lines)
+
+    async def staked_sec():
+        pool = await need("pool")
+        return f"{int(pool.get('bonded_tokens',0))/1e6:,.2f} HELI"
+
+    async def supply_sec():
+        return f"{await need('supply') / 1e6:,.0f} HELI"
+
+    async def unstake_sec():
+        return f"{(await need('unbonding')).total()/1e6:,.2f} HELI"
+
+    async def wallets_sec():
+        return f"{(await need('unbonding')).wallet_count()} ví"
+
+    async def top5_sec():
+        snapshot = await need("unbonding")
+        total_unbonding = snapshot.total()
+        lines = []
+        for i, (addr, amt) in enumerate(snapshot.top_wallets(5), 1):
+            percent = amt / total_unbonding * 100 if total_unbonding else 0
+            lines.append(f"{i}. {addr[:8]}... — {amt/1e6:,.0f} HELI ({percent:.2f}%)")
+        return "\n".join(lines) if lines else "Không có ví unbonding"
+
+    async def price_sec():
+        return f"${await need('price'):.6f}"
+
+    return {
+        "status": (status_sec, "⚠️ Không lấy được trạng thái mạng"),
+        "validator": (validator_sec, "⚠️ Không lấy được validator"),
+        "bonded_ratio": (bonded_ratio_sec, "⚠️ Không tính được"),
+        "apy": (apy_sec, "⚠️ Không tính được"),
+        "top3": (top3_sec, "⚠️ Không lấy được Top Validator"),
+        "staked": (staked_sec, "⚠️ Không lấy được staking"),
+        "supply": (supply_sec, "⚠️ Không lấy được supply"),
+        "unstake": (unstake_sec, "⚠️ Không lấy được unstake"),
+        "wallets": (wallets_sec, "⚠️ Không lấy được"),
+        "top5": (top5_sec, "⚠️ Không lấy được Top Unstake"),
+        "price": (price_sec, "⚠️ Không lấy được giá"),
+    }
 
 async def heliinfo(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_allowed(update.effective_user.id):
         await update.message.reply_text("🚫 Bạn chưa được cấp quyền. Dùng /whoami gửi admin.")
         return
-    
-    try:
-        # --- Nhóm 1: Mạng & Validator ---
-        # Status
-        try:
-            url = f"{LCD}/cosmos/base/tendermint/v1beta1/blocks/latest"
-            r = requests.get(url, timeout=10).json()
-            height = r.get("block", {}).get("header", {}).get("height", "N/A")
-            proposer = r.get("block", {}).get("header", {}).get("proposer_address", "N/A")
-            status_txt = f"⛓ Block height: {height}\n👤 Proposer: {proposer}"
-        except:
-            status_txt = "⚠️ Không lấy được trạng thái mạng"
-        
-        # Validator
-        vals, validator_txt = [], ""
-        try:
-            url = f"{LCD}/cosmos/staking/v1beta1/validators?pagination.limit=2000"
-            r = requests.get(url, timeout=15).json()
-            vals = r.get("validators", [])
-            total = len(vals)
-            jailed = sum(1 for v in vals if v.get("jailed", False))
-            bonded = sum(1 for v in vals if v.get("status") == "BOND_STATUS_BONDED" and not v.get("jailed", False))
-            validator_txt = f"Tổng: {total} | Bonded: {bonded} | Jail: {jailed}"
-        except:
-            validator_txt = "⚠️ Không lấy được validator"
-
-        # Bonded Ratio
-        bonded_ratio_txt, bonded, supply_uheli = "", 0, 0
-        try:
-            pool = get_pool()
-            bonded = int(pool.get("bonded_tokens", 0))
-            supply_uheli = get_total_supply_uheli()
-            ratio = bonded / supply_uheli * 100 if bonded and supply_uheli else 0
-            bonded_ratio_txt = f"{ratio:.2f}%"
-        except:
-            bonded_ratio_txt = "⚠️ Không tính được"
-
-        # APY
-        apy_txt = ""
-        try:
-            inflation = get_inflation()
-            top_val = get_top_validator()
-            commission = float(top_val.get("commission", {}).get("commission_rates", {}).get("rate", 0)) if top_val else 0
-            apy_value = inflation / (bonded / supply_uheli) * (1 - commission) * 100 if bonded and supply_uheli else 0
-            apy_txt = f"{apy_value:.2f}%"
-        except:
-            apy_txt = "⚠️ Không tính được"
-
-        # Top 3 Validator
-        top3_validators_txt = ""
-        try:
-            sorted_vals = sorted(vals, key=lambda v: int(v.get("tokens", 0)), reverse=True)[:3]
-            lines = []
-            for i, v in enumerate(sorted_vals, 1):
-                moniker = v.get("description", {}).get("moniker", "N/A")
-                tokens = int(v.get("tokens", 0))
-                percent = tokens / bonded * 100 if bonded else 0
-                lines.append(f"{i}. {moniker} — {tokens/1e6:,.0f} HELI ({percent:.2f}%)")
-            top3_validators_txt = "\n".join(lines)
-        except:
-            top3_validators_txt = "⚠️ Không lấy được Top Validator"
-
-        # --- Nhóm 2: Tokenomics ---
-        supply_txt, staked_txt, unstake_txt, unbonding_wallets_txt = "", "", "", ""
-
-        # Supply
-        try:
-            supply = get_total_supply_uheli() / 1e6
-            supply_txt = f"{supply:,.0f} HELI"
-        except:
-            supply_txt = "⚠️ Không lấy được supply"
 
-        # Staked
-        try:
-            pool = get_pool()
-            staked_txt = f"{int(pool.get('bonded_tokens',0))/1e6:,.2f} HELI"
-        except:
-            staked_txt = "⚠️ Không lấy được staking"
-
-        # Unstake
-        total_unbonding = 0
-        try:
-            total_unbonding = get_total_unbonding()
-            unstake_txt = f"{total_unbonding:,.2f} HELI"
-        except:
-            unstake_txt = "⚠️ Không lấy được unstake"
-
-        # Unbonding wallets
-        try:
-            vals_url = f"{LCD}/cosmos/staking/v1beta1/validators?pagination.limit=2000"
-            vals = requests.get(vals_url, timeout=15).json().get("validators", [])
-            wallets = set()
-            for v in vals:
-                valoper = v.get("operator_address")
-                url = f"{LCD}/cosmos/staking/v1beta1/validators/{valoper}/unbonding_delegations?pagination.limit=2000"
-                r = requests.get(url, timeout=15).json()
-                for resp in r.get("unbonding_responses", []):
-                    wallets.add(resp.get("delegator_address"))
-            unbonding_wallets_txt = f"{len(wallets)} ví"
-        except:
-            unbonding_wallets_txt = "⚠️ Không lấy được"
-
-        # Top 5 Unstake
-        top5_unstake_txt = ""
-        try:
-            vals_url = f"{LCD}/cosmos/staking/v1beta1/validators?pagination.limit=2000"
-            vals = requests.get(vals_url, timeout=15).json().get("validators", [])
-            wallet_unbond = {}
-            for v in vals:
-                valoper = v.get("operator_address")
-                url = f"{LCD}/cosmos/staking/v1beta1/validators/{valoper}/unbonding_delegations?pagination.limit=2000"
-                r = requests.get(url, timeout=15).json()
-                for resp in r.get("unbonding_responses", []):
-                    delegator = resp.get("delegator_address")
-                    entries = resp.get("entries", [])
-                    total_amt = sum(int(e.get("balance", 0)) for e in entries)
-                    wallet_unbond[delegator] = wallet_unbond.get(delegator, 0) + total_amt
-
-            sorted_wallets = sorted(wallet_unbond.items(), key=lambda x: x[1], reverse=True)[:5]
-            lines = []
-            for i, (addr, amt) in enumerate(sorted_wallets, 1):
-                percent = amt / total_unbonding * 100 if total_unbonding else 0
-                lines.append(f"{i}. {addr[:8]}... — {amt/1e6:,.0f} HELI ({percent:.2f}%)")
-            top5_unstake_txt = "\n".join(lines) if lines else "Không có ví unbonding"
-        except:
-            top5_unstake_txt = "⚠️ Không lấy được Top Unstake"
-
-        # --- Nhóm 3: Thị trường ---
-        price_txt = ""
-        try:
-            url = "https://api.mexc.com/api/v3/ticker/price?symbol=HELIUSDT"
-            r = requests.get(url, timeout=10).json()
-            price_txt = f"${float(r.get('price', 0)):.6f}"
-        except:
-            price_txt = "⚠️ Không lấy được giá"
-
-        # --- Kết quả tổng hợp ---
-        msg = (
-            "📊 *HELI Overview*\n\n"
-            "🌐 *Mạng & Validator*\n"
-            f"{status_txt}\n"
-            f"🖥 Validator: {validator_txt}\n"
-            f"📈 Bonded Ratio: {bonded_ratio_txt}\n"
-            f"💰 APY: {apy_txt}\n"
-            f"🏆 Top 3 Validator:\n{top3_validators_txt}\n\n"
-            "🔗 *Tokenomics*\n"
-            f"💎 Staked: {staked_txt}\n"
-            f"🔓 Unstake: {unstake_txt}\n"
-            f"👛 Unbonding Wallets: {unbonding_wallets_txt}\n"
-            f"💰 Supply: {supply_txt}\n"
-            f"📤 Top 5 Unstake:\n{top5_unstake_txt}\n\n"
-            "💹 *Thị trường*\n"
-            f"💲 Price: {price_txt}"
-        )
-        await update.message.reply_text(msg, parse_mode="Markdown")
+    try:
+        # Mỗi input chỉ fetch 1 lần, các mục dùng chung
+        inputs = {
+            "block": fetch_latest_block(),
+            "validators": fetch_validators(),
+            "pool": fetch_pool(),
+            "supply": fetch_supply_uheli(),
+            "inflation": fetch_inflation(),
+            "unbonding": refresher.value("unbonding"),
+            "price": get_market_price(),
+        }
+        inputs = {k: asyncio.ensure_future(c) for k, c in inputs.items()}
+        for task in inputs.values():
+            # input có thể chạy tiếp sau khi mục hết hạn: tránh cảnh báo exception không được đọc
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+        sec = {}
+
+        async def run_section(name, fn, error_txt):
+            try:
+                sec[name] = await asyncio.wait_for(fn(), HELIINFO_DEADLINES[name])
+            except asyncio.TimeoutError:
+                sec[name] = "⏱ Quá thời gian, thử lại sau"
+            except Exception as e:
+                logging.warning(f"heliinfo: lỗi mục {name}: {e}")
+                sec[name] = error_txt
+
+        pending = {
+            asyncio.ensure_future(run_section(name, fn, err))
+            for name, (fn, err) in heliinfo_sections(inputs).items()
+        }
+
+        # Bản đầu tiên: các mục nhanh, hoặc đầy đủ nếu tất cả đã xong
+        _, pending = await asyncio.wait(pending, timeout=HELIINFO_FIRST_REPLY)
+        footer = refresher.freshness(*HELIINFO_SNAPSHOTS)
+        msg = render_heliinfo(sec, footer)
+        sent = await update.message.reply_text(msg, parse_mode="Markdown")
+
+        # Edit dần khi các mục chậm hoàn tất
+        while pending:
+            _, pending = await asyncio.wait(pending, timeout=HELIINFO_EDIT_INTERVAL)
+            new_msg = render_heliinfo(sec, footer)
+            if new_msg != msg:
+                msg = new_msg
+                await sent.edit_text(msg, parse_mode="Markdown")
     except Exception as e:
         await update.message.reply_text(f"⚠️ Lỗi khi lấy heliinfo: {e}")
 
@@ -1122,13 +830,8 @@ async def heliinfo(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # 2. Dữ liệu giả lập / placeholder
 # ===========================
 async def get_orderbook2():
-    async with aiohttp.ClientSession() as session:
-        async with session.get(f"{BASE_URL}/depth?symbol=HELIUSDT&limit=50") as resp:
-            data = await resp.json()
-            return {
-                "bids": [(float(p), float(q)) for p, q in data["bids"]],
-                "asks": [(float(p), float(q)) for p, q in data["asks"]]
-            }
+    book = await refresher.value("book")
+    return book.to_depth(50)
 
 async def get_price_data():
     async with aiohttp.ClientSession() as session:
@@ -1211,8 +914,7 @@ async def alert_loop(bot):
                 msg += f"...và {len(summary) - MAX_DISPLAY} giá khác không hiển thị"
 
             # Gửi cảnh báo cho tất cả user
-            for chat_id in user_chats:
-                await bot.send_message(chat_id=chat_id, text=msg)
+            await broadcast(bot, allowed_chats(), msg, name="alert")
 
         await asyncio.sleep(CHECK_INTERVAL)
 
@@ -1248,62 +950,42 @@ async def alert_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # 5. Đánh giá xu hướng Heli (trend)
 # ===========================
 
-async def trend_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if not is_allowed(update.effective_user.id):
-        await update.message.reply_text("🚫 Bạn chưa được cấp quyền.")
-        return
-    symbol = "HELIUSDT"
-    base_url = "https://api.mexc.com/api/v3/klines"
-    tf_map = {"1h": "Ngắn hạn (1h)", "4h": "Trung hạn (4h)", "1d": "Dài hạn (1D)"}
-
-    results = {}
-    summaries = {}
-    labels = {}
-
-    for tf, label in tf_map.items():
-        limit = 100
-        url = f"{base_url}?symbol={symbol}&interval={tf}&limit={limit}"
-        data = requests.get(url).json()
-
-        fallback_used = False
-
-        # Fallback cho 1h → thử lại với 15m
-        if tf == "1h" and (not isinstance(data, list) or len(data) == 0):
-            url = f"{base_url}?symbol={symbol}&interval=15m&limit={limit}"
-            data = requests.get(url).json()
-            if isinstance(data, list) and len(data) > 0:
-                label = "Ngắn hạn (15m fallback)"
-                fallback_used = True
-
-        if not isinstance(data, list) or len(data) == 0:
-            results[tf] = ["⚠️ MEXC chưa có dữ liệu nến cho HELIUSDT"]
-            summaries[tf] = "❓ Không xác định"
-            labels[tf] = label
-            continue
-
-        # MEXC klines trả về 8 cột
-        df = pd.DataFrame(data, columns=["t","o","h","l","c","v","ct","q"])
-        df["c"] = df["c"].astype(float)
-        df["h"] = df["h"].astype(float)
-        df["l"] = df["l"].astype(float)
-        df["v"] = df["v"].astype(float)
-
-        print(f"[DEBUG] {tf} - Lấy {len(df)} nến từ MEXC")
-
-        signals, summary = analyze_tf(df)
-
-        # Nếu fallback → thêm cảnh báo
-        if fallback_used:
-            summary = f"{summary} ⚠️ (dùng 15m thay cho 1h)"
+# --- /trend: một chuỗi nến 60m trong kho nến, gộp cục bộ thành 1h / 4h / 1D ---
+TREND_BASE_INTERVAL = "60m"
+TREND_BARS = 100  # số nến mỗi khung
+TREND_FRAMES = {  # khung -> (nhãn, số nến 60m mỗi nến khung)
+    "1h": ("Ngắn hạn (1h)", 1),
+    "4h": ("Trung hạn (4h)", 4),
+    "1d": ("Dài hạn (1D)", 24),
+}
 
-        results[tf] = signals
-        summaries[tf] = summary
-        labels[tf] = label
+def trend_frames(rows: list[tuple]) -> dict:
+    """{khung: DataFrame t/o/h/l/c/v (TREND_BARS nến cuối)} gộp từ nến 60m."""
+    base = np.array([r[:6] for r in rows], dtype=np.float64).reshape(-1, 6)
+    open_time = np.array([r[0] for r in rows], dtype=np.int64)
+    frames = {}
+    for tf, (_, hours) in TREND_FRAMES.items():
+        cols = kernels.resample_ohlcv(open_time, *base[:, 1:].T, hours * 3_600_000)
+        frames[tf] = pd.DataFrame(dict(zip(("t", "o", "h", "l", "c", "v"), cols))).tail(TREND_BARS)
+    return frames
+
+@single_flight()
+async def trend_report(symbol: str = "HELIUSDT") -> str:
+    rows = await get_candle_store().sync(symbol, TREND_BASE_INTERVAL, TREND_BARS * TREND_FRAMES["1d"][1])
+    frames = trend_frames(rows)
+    # Các khung độc lập: tính song song trong thread, không chặn event loop
+    ready = [tf for tf, df in frames.items() if len(df)]
+    analyses = await asyncio.gather(*(asyncio.to_thread(analyze_tf, frames[tf]) for tf in ready))
+
+    results = {tf: [f"⚠️ MEXC chưa có dữ liệu nến cho {symbol}"] for tf in frames}
+    summaries = {tf: "❓ Không xác định" for tf in frames}
+    for tf, (signals, summary) in zip(ready, analyses):
+        results[tf], summaries[tf] = signals, summary
 
     # Xuất báo cáo
     msg = "💹 *Xu hướng HELI*\n━━━━━━━━━━━━━━━\n"
-    for tf in tf_map:
-        msg += f"\n⏱ {labels[tf]}:\n" + "\n".join(results[tf]) + f"\n👉 {summaries[tf]}\n"
+    for tf, (label, _) in TREND_FRAMES.items():
+        msg += f"\n⏱ {label}:\n" + "\n".join(results[tf]) + f"\n👉 {summaries[tf]}\n"
 
     msg += "\n━━━━━━━━━━━━━━━\n📊 *Nhận định tổng thể:*\n"
     msg += f"• Xu hướng 1h: {summaries['1h']}\n"
@@ -1315,32 +997,38 @@ async def trend_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         msg += f"• Trung & Dài hạn: {summaries['4h']}\n"
     else:
         msg += f"• Trung & Dài hạn: {summaries['4h']} / {summaries['1d']}\n"
+    return msg
 
+async def trend_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_allowed(update.effective_user.id):
+        await update.message.reply_text("🚫 Bạn chưa được cấp quyền.")
+        return
+    try:
+        msg = await trend_report()
+    except Exception as e:
+        await update.message.reply_text(f"⚠️ Lỗi khi lấy dữ liệu nến: {e}")
+        return
     await update.message.reply_text(msg, parse_mode="Markdown")
 
-# Hàm lấy orderbook async
+# Hàm lấy orderbook (book cục bộ từ websocket, REST nếu chưa đồng bộ)
+def fmt_price(p: float) -> str:
+    return np.format_float_positional(p, trim="-")
+
 async def get_orderbook():
-    async with aiohttp.ClientSession() as session:
-        async with session.get(API_URL) as resp:
-            data = await resp.json()
-            asks = data.get("asks", [])
-            bids = data.get("bids", [])
+    book = await refresher.value("book")
+    asks = book.top("asks", 500)
+    bids = book.top("bids", 500)
 
-            total_asks = sum(float(qty) for price, qty in asks)
-            total_bids = sum(float(qty) for price, qty in bids)
+    total_asks = sum(qty for price, qty in asks)
+    total_bids = sum(qty for price, qty in bids)
 
-            return total_asks, total_bids, asks[:5], bids[:5]
+    top_asks = [(fmt_price(p), fmt_price(q)) for p, q in asks[:5]]
+    top_bids = [(fmt_price(p), fmt_price(q)) for p, q in bids[:5]]
+    return total_asks, total_bids, top_asks, top_bids
 
 async def get_orderbookfull():
-    async with aiohttp.ClientSession() as session:
-        async with session.get(API_URL) as resp:
-            data = await resp.json()
-            asks = data.get("asks", [])
-            bids = data.get("bids", [])
-
-            total_asks = sum(float(qty) for price, qty in asks)
-            total_bids = sum(float(qty) for price, qty in bids)
-            return total_asks, total_bids
+    book = await refresher.value("book")
+    return book.total("asks", 500), book.total("bids", 500)
 
 # ====== Job Tasks ======
 async def job_detect_doilai(context: ContextTypes.DEFAULT_TYPE):
@@ -1375,69 +1063,78 @@ async def job_trend(context: ContextTypes.DEFAULT_TYPE):
     await context.bot.send_message(chat_id, msg)
 
 # Command handler cho Telegram
-# Lệnh /flow
+# Lệnh /flow [5m|1h|24h] [biên độ]
+FLOW_WINDOWS = {"5m": 300, "1h": 3600, "24h": 86400}
+
 async def flow(update, context):
     if not is_allowed(update.effective_user.id):
         await update.message.reply_text("🚫 Bạn chưa được cấp quyền. Dùng /whoami gửi admin.")
         return
-    global last_snapshot
-    
-    # Biên độ mặc định ±20% (0.20)
-    try:
-        RANGE = float(context.args[0]) if context.args else 0.20
-    except ValueError:
-        RANGE = 0.20
 
-    # Lấy orderbook đầy đủ (có lọc theo biên độ)
-    total_asks, total_bids, market_price = await get_orderbookfull_filtered(RANGE)
-    now = int(time.time())
-
-    msg = f"📊 Dòng tiền Orderbook HELI/USDT (MEXC)\n(Trong biên độ ±{RANGE*100:.0f}% quanh giá {market_price:.8f})\n"
-
-    if last_snapshot["time"] == 0:
-        # Lần đầu chạy
-        last_snapshot = {"asks": total_asks, "bids": total_bids, "time": now}
-        msg += "✅ Snapshot đầu tiên đã lưu. Hãy gọi lại lệnh sau để xem biến động."
-    else:
-        delta_time = (now - last_snapshot["time"]) / 60
-        asks_diff = total_asks - last_snapshot["asks"]
-        bids_diff = total_bids - last_snapshot["bids"]
-
-        msg += (
-            f"⏱️ Thời gian so sánh: {delta_time:.1f} phút\n"
-            f"🔴 Lệnh Bán: {last_snapshot['asks']:,.2f} → {total_asks:,.2f} "
-            f"({asks_diff:+,.2f})\n"
-            f"🟢 Lệnh Mua: {last_snapshot['bids']:,.2f} → {total_bids:,.2f} "
-            f"({bids_diff:+,.2f})\n\n"
+    # Mặc định so sánh với 1h trước, biên độ ±20% (0.20)
+    window, RANGE = "1h", 0.20
+    for arg in context.args or []:
+        if arg.lower() in FLOW_WINDOWS:
+            window = arg.lower()
+        else:
+            try:
+                RANGE = float(arg)
+            except ValueError:
+                pass
+
+    sampler = get_book_sampler()
+    k = sampler.band_index(RANGE)
+    pair = sampler.window(FLOW_WINDOWS[window])
+    if pair is None:
+        await context.bot.send_message(
+            chat_id=update.effective_chat.id,
+            text="⏳ Chưa đủ mẫu orderbook để so sánh, hãy thử lại sau ít phút."
         )
+        return
+    old, new = pair
+    old_asks, total_asks = old[sampler.ask_col(k)], new[sampler.ask_col(k)]
+    old_bids, total_bids = old[sampler.bid_col(k)], new[sampler.bid_col(k)]
+    asks_diff = total_asks - old_asks
+    bids_diff = total_bids - old_bids
+    delta_time = (new[SAMPLE_T] - old[SAMPLE_T]) / 60
+    price_change = (new[SAMPLE_MID] / old[SAMPLE_MID] - 1) * 100
 
-        if asks_diff > bids_diff and asks_diff > 0:
-            msg += "⚠️ Lực **bán** bổ sung nhiều hơn → áp lực giá xuống.\n"
-        elif bids_diff > asks_diff and bids_diff > 0:
-            msg += "✅ Lực **mua** bổ sung nhiều hơn → có hỗ trợ tăng giá.\n"
-        else:
-            msg += "➖ Dòng tiền chưa rõ rệt, thị trường cân bằng.\n"
+    msg = (
+        f"📊 Dòng tiền Orderbook HELI/USDT (MEXC)\n"
+        f"(Trong biên độ ±{sampler.bands[k]*100:.0f}% quanh giá {new[SAMPLE_MID]:.8f})\n"
+        f"⏱️ Thời gian so sánh: {delta_time:.1f} phút"
+    )
+    if delta_time * 60 < FLOW_WINDOWS[window] * 0.9:
+        msg += f" (chưa đủ {window} dữ liệu)"
+    msg += (
+        f"\n🔴 Lệnh Bán: {old_asks:,.2f} → {total_asks:,.2f} "
+        f"({asks_diff:+,.2f})\n"
+        f"🟢 Lệnh Mua: {old_bids:,.2f} → {total_bids:,.2f} "
+        f"({bids_diff:+,.2f})\n"
+        f"💲 Giá giữa: {old[SAMPLE_MID]:.8f} → {new[SAMPLE_MID]:.8f} ({price_change:+.2f}%)\n\n"
+    )
 
-        # Cập nhật snapshot
-        last_snapshot = {"asks": total_asks, "bids": total_bids, "time": now}
+    if asks_diff > bids_diff and asks_diff > 0:
+        msg += "⚠️ Lực **bán** bổ sung nhiều hơn → áp lực giá xuống.\n"
+    elif bids_diff > asks_diff and bids_diff > 0:
+        msg += "✅ Lực **mua** bổ sung nhiều hơn → có hỗ trợ tăng giá.\n"
+    else:
+        msg += "➖ Dòng tiền chưa rõ rệt, thị trường cân bằng.\n"
 
     await context.bot.send_message(chat_id=update.effective_chat.id, text=msg)
 
 # Hàm lọc theo biên độ
 async def get_orderbookfull_filtered(RANGE=0.20):
-    url = "https://api.mexc.com/api/v3/depth?symbol=HELIUSDT&limit=500"
-    data = requests.get(url).json()
-    bids = [(float(p), float(q)) for p, q in data["bids"]]
-    asks = [(float(p), float(q)) for p, q in data["asks"]]
+    book = await refresher.value("book")
 
     # Giá thị trường = trung bình bid top1 và ask top1
-    market_price = (bids[0][0] + asks[0][0]) / 2
+    market_price = book.mid()
     min_price = market_price * (1 - RANGE)
     max_price = market_price * (1 + RANGE)
 
     # Lọc trong biên độ
-    total_bids = sum(q for p, q in bids if min_price <= p <= max_price)
-    total_asks = sum(q for p, q in asks if min_price <= p <= max_price)
+    total_bids = book.volume_in_range("bids", min_price, max_price)
+    total_asks = book.volume_in_range("asks", min_price, max_price)
 
     return total_asks, total_bids, market_price
 
@@ -1473,20 +1170,32 @@ async def orderbook(update, context):
 
     await context.bot.send_message(chat_id=update.effective_chat.id, text=msg)
 
-async def ping(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await update.message.reply_text("✅ Bot đang hoạt động!")
+async def cachestats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id != ADMIN_ID:
+        await update.message.reply_text("🚫 Lệnh này chỉ dành cho admin.")
+        return
+    lines = [refresher.summary()]
+    cst = command_cache.stats
+    lines.append(
+        f"\n🔁 Lệnh gộp: chạy {cst.misses} | chờ chung {cst.coalesced} | dùng lại {cst.hits} | "
+        f"lỗi {cst.errors} | đã tránh {cst.coalesced + cst.hits} lần tính"
+    )
+    for key, kst in sorted(command_cache.key_stats.items()):
+        if kst.coalesced or kst.hits:
+            lines.append(f"• {key}: chạy {kst.misses}, chờ chung {kst.coalesced}, dùng lại {kst.hits}")
+    await update.message.reply_text("\n".join(lines))
 
 async def status(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_allowed(update.effective_user.id):
         await update.message.reply_text("🚫 Bạn chưa được cấp quyền. Dùng /whoami gửi admin.")
         return
     try:
-        url = f"{LCD}/cosmos/base/tendermint/v1beta1/blocks/latest"
-        r = requests.get(url, timeout=10).json()
+        r = await fetch_latest_block()
         height = r.get("block", {}).get("header", {}).get("height", "N/A")
         proposer = r.get("block", {}).get("header", {}).get("proposer_address", "N/A")
         await update.message.reply_text(
-            f"📊 Trạng thái mạng HeliChain:\n⛓ Block height: {height}\n👤 Proposer: {proposer}"
+            f"📊 Trạng thái mạng HeliChain:\n⛓ Block height: {height}\n👤 Proposer: {proposer}\n"
+            f"{refresher.freshness('chain')}"
         )
     except Exception as e:
         await update.message.reply_text(f"⚠️ Lỗi khi lấy trạng thái mạng: {e}")
@@ -1494,19 +1203,9 @@ async def status(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def unbonding_wallets(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Đếm tổng số ví đang unbonding trên toàn bộ validators."""
     try:
-        vals_url = f"{LCD}/cosmos/staking/v1beta1/validators?pagination.limit=2000"
-        vals = requests.get(vals_url, timeout=15).json().get("validators", [])
-        wallets = set()
-
-        for v in vals:
-            valoper = v.get("operator_address")
-            url = f"{LCD}/cosmos/staking/v1beta1/validators/{valoper}/unbonding_delegations?pagination.limit=2000"
-            r = requests.get(url, timeout=15).json()
-            for resp in r.get("unbonding_responses", []):
-                wallets.add(resp.get("delegator_address"))
-
-        count = len(wallets)
-        await update.message.reply_text(f"🔓 Tổng số ví đang unbonding: {count}")
+        snapshot = await refresher.value("unbonding")
+        count = snapshot.wallet_count()
+        await update.message.reply_text(f"🔓 Tổng số ví đang unbonding: {count}\n{refresher.freshness('unbonding')}")
     except Exception as e:
         await update.message.reply_text(f"⚠️ Lỗi khi lấy danh sách unbonding: {e}")
 
@@ -1517,8 +1216,7 @@ async def heatmap(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     sent = await update.message.reply_text("⏳ Đang phân tích heatmap unbonding...")
-    loop = asyncio.get_running_loop()
-    heatmap = await loop.run_in_executor(None, get_unbonding_heatmap)
+    heatmap = await get_unbonding_heatmap()
 
     if not heatmap:
         await sent.edit_text("⚠️ Không lấy được dữ liệu heatmap từ LCD.")
@@ -1528,6 +1226,7 @@ async def heatmap(update: Update, context: ContextTypes.DEFAULT_TYPE):
     for d in range(15):
         if heatmap.get(d, 0) > 0:
             msg += f"\n🗓️ Ngày +{d}: {heatmap[d]:,.2f} HELI"
+    msg += f"\n\n{refresher.freshness('unbonding')}"
 
     await sent.edit_text(msg)
 
@@ -1538,8 +1237,7 @@ async def unstake(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     sent = await update.message.reply_text("⏳ Đang tính tổng HELI unbonding toàn mạng...")
-    loop = asyncio.get_running_loop()
-    total, top10 = await loop.run_in_executor(None, get_total_unbonding_with_top10)
+    total, top10 = await get_total_unbonding_with_top10()
 
     if total is None:
         await sent.edit_text("⚠️ Không lấy được dữ liệu unbonding từ LCD.")
@@ -1548,6 +1246,7 @@ async def unstake(update: Update, context: ContextTypes.DEFAULT_TYPE):
     msg = f"🔓 Tổng HELI đang unbonding toàn mạng: {total:,.2f} HELI\n\n🏆 Top 10 ví unbonding:"
     for addr, bal in top10:
         msg += f"\n- {addr[:12]}...: {bal:,.2f} HELI"
+    msg += f"\n\n{refresher.freshness('unbonding')}"
 
     await sent.edit_text(msg)
 
@@ -1556,53 +1255,45 @@ async def bonded_ratio(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("🚫 Bạn chưa được cấp quyền.")
         return
 
-    sent = await update.message.reply_text("⏳ Đang tính Bonded Ratio...")
-
-    loop = asyncio.get_running_loop()
-
-    def work_sync():
+    async def work():
         try:
-            r = requests.get("https://lcd.helichain.com/cosmos/staking/v1beta1/pool", timeout=10)
-            r.raise_for_status()
-            pool = r.json().get("pool", {})
+            pool = await fetch_pool()
             bonded_uheli = int(pool.get("bonded_tokens", 0))
         except Exception as e:
             logging.error(f"Lỗi lấy bonded: {e}")
             return None, None, "Không lấy được dữ liệu bonded."
 
-        supply_uheli = get_total_supply_uheli()
+        supply_uheli = await get_total_supply_uheli()
         if not supply_uheli:
             return None, None, "Không lấy được total supply."
 
         return bonded_uheli, supply_uheli, None
 
-    bonded_uheli, supply_uheli, err = await loop.run_in_executor(None, work_sync)
+    bonded_uheli, supply_uheli, err = await work()
 
     if err:
-        await sent.edit_text(f"⚠️ {err}")
+        await update.message.reply_text(f"⚠️ {err}")
         return
 
     bonded = bonded_uheli / 1e6
     supply = supply_uheli / 1e6
     ratio = bonded / supply * 100
 
-    await sent.edit_text(f"📊 Bonded Ratio: {ratio:.4f}%")
+    await update.message.reply_text(f"📊 Bonded Ratio: {ratio:.4f}%\n{refresher.freshness('chain')}")
 
 
 async def apy(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_allowed(update.effective_user.id):
         await update.message.reply_text("🚫 Bạn chưa được cấp quyền. Dùng /whoami gửi admin.")
         return
-    pool = get_pool()
+    pool, supply_uheli = await asyncio.gather(get_pool(), get_total_supply_uheli())
     bonded = int(pool.get("bonded_tokens", 0))
     not_bonded = int(pool.get("not_bonded_tokens", 0))
-    supply_uheli = get_total_supply_uheli()
-    if bonded == 0 or supply_uheli == 0:
+    if bonded == 0 or not supply_uheli:
         await update.message.reply_text("⚠️ Không thể tính APY.")
         return
     bonded_ratio = bonded / supply_uheli
-    inflation = get_inflation()
-    top_val = get_top_validator()
+    inflation, top_val = await asyncio.gather(get_inflation(), get_top_validator())
     if not top_val:
         await update.message.reply_text("⚠️ Không lấy được validator top 1.")
         return
@@ -1613,7 +1304,8 @@ async def apy(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(
         f"💰 APY staking (theo validator top 1: {val_name})\n➡️ {apy_value:.2f}%/năm\n\n"
         f"(Inflation: {inflation*100:.2f}%, Bonded ratio: {bonded_ratio*100:.2f}%, "
-        f"Commission: {commission_rate*100:.2f}%, Stake top 1: {val_tokens:,.0f} HELI)"
+        f"Commission: {commission_rate*100:.2f}%, Stake top 1: {val_tokens:,.0f} HELI)\n"
+        f"{refresher.freshness('chain', 'validators')}"
     )
 
 async def supply(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -1621,51 +1313,18 @@ async def supply(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("🚫 Bạn chưa được cấp quyền. Dùng /whoami gửi admin.")
         return
     try:
-        url = f"{LCD}/cosmos/bank/v1beta1/supply"
-        r = requests.get(url, timeout=10).json()
-        heli_supply = 0
-        for item in r.get("supply", []):
-            if item["denom"] == "uheli":
-                heli_supply = int(item["amount"]) / 1e6
-                break
-        await update.message.reply_text(f"💰 Tổng cung HELI: {heli_supply:,.0f} HELI")
+        heli_supply = (await fetch_supply_uheli() or 0) / 1e6
+        await update.message.reply_text(f"💰 Tổng cung HELI: {heli_supply:,.0f} HELI\n{refresher.freshness('chain')}")
     except Exception as e:
         await update.message.reply_text(f"⚠️ Lỗi khi lấy supply: {e}")
 
-async def price(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if not is_allowed(update.effective_user.id):
-        await update.message.reply_text("🚫 Bạn chưa được cấp quyền. Dùng /whoami gửi admin.")
-        return
-    try:
-        # Ưu tiên lấy giá từ MEXC
-        url = "https://api.mexc.com/api/v3/ticker/price?symbol=HELIUSDT"
-        r = requests.get(url, timeout=10).json()
-        price_usd = float(r.get("price", 0))
-
-        if price_usd > 0:
-            await update.message.reply_text(f"💲 Giá HELI hiện tại (MEXC): ${price_usd:,.6f}")
-            return
-
-        # Fallback CoinGecko
-        url_cg = "https://api.coingecko.com/api/v3/simple/price"
-        params = {"ids": "heli", "vs_currencies": "usd"}
-        r = requests.get(url_cg, params=params, timeout=10).json()
-        price_usd = r.get("heli", {}).get("usd")
-
-        if price_usd:
-            await update.message.reply_text(f"💲 Giá HELI hiện tại (CoinGecko): ${price_usd:,.6f}")
-        else:
-            await update.message.reply_text("⚠️ Không lấy được giá HELI từ API.")
-    except Exception as e:
-        await update.message.reply_text(f"⚠️ Lỗi khi lấy giá: {e}")
-
 async def staked(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_allowed(update.effective_user.id):
         await update.message.reply_text("🚫 Bạn chưa được cấp quyền. Dùng /whoami gửi admin.")
         return
-    pool = get_pool()
+    pool = await get_pool()
     bonded = int(pool.get("bonded_tokens", 0)) / 1e6
-    await update.message.reply_text(f"💎 Tổng HELI đang staking: {bonded:,.2f} HELI")
+    await update.message.reply_text(f"💎 Tổng HELI đang staking: {bonded:,.2f} HELI\n{refresher.freshness('chain')}")
 
 async def validator(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_allowed(update.effective_user.id):
@@ -1673,9 +1332,7 @@ async def validator(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     """Thống kê tổng số validator và số node bị jail."""
     try:
-        url = f"{LCD}/cosmos/staking/v1beta1/validators?pagination.limit=2000"
-        r = requests.get(url, timeout=15).json()
-        vals = r.get("validators", [])
+        vals = await fetch_validators()
 
         total = len(vals)
         jailed = sum(1 for v in vals if v.get("jailed", False))
@@ -1684,64 +1341,70 @@ async def validator(update: Update, context: ContextTypes.DEFAULT_TYPE):
         msg = (
             f"🖥️ Tổng số validator: {total}\n"
             f"✅ Đang hoạt động (bonded): {bonded}\n"
-            f"🚨 Bị jail: {jailed}"
+            f"🚨 Bị jail: {jailed}\n"
+            f"{refresher.freshness('validators')}"
         )
         await update.message.reply_text(msg)
     except Exception as e:
         await update.message.reply_text(f"⚠️ Lỗi khi lấy thông tin validator: {e}")
 
-async def coreteam(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if not is_allowed(update.effective_user.id):
-        await update.message.reply_text("🚫 Bạn chưa được cấp quyền. Dùng /whoami gửi admin.")
-        return
-    chat_id = update.effective_chat.id
-    await update.message.reply_text("⏳ Đang kiểm tra ví core team...")
+async def fetch_coreteam() -> dict:
+    """{địa chỉ: (balance, staked, unstake)} của các ví core team, gọi song song."""
+    wallets = await asyncio.gather(
+        *(asyncio.gather(get_balance(a), get_staked(a), get_unstaking(a)) for a in CORE_WALLETS),
+    )
+    return dict(zip(CORE_WALLETS, wallets))
 
-    CORE_WALLETS = {
-    "heli1ve27kkz6t8st902a6x4tz9fe56j6c87w92vare": "Ví Incentive Ecosystem",
-    "heli1vzu8p83d2l0rswtllpqdelj4dewlty6r4kjfwa": "Ví Core Team",
-    "heli13w3en6ny39srs23gayt7wz9faayezqwqekzwmt": "Ví DAOs treasury",
-    "heli196slpj6yrqxj74ftpqspuzd609rqu9wl6j6fde": "Ví nhận từ DAOs"
-    }
+async def sync_transfers() -> int:
+    """
+    Job nền riêng cập nhật chỉ mục chuyển khoản (transfer_index.py): lần đầu
+    tải 90 ngày mỗi ví nên không để /coreteam chờ; ví chưa có con trỏ hiện
+    "đang đồng bộ...".
+    """
+    return await get_transfer_index().sync_all(CORE_WALLETS)
 
+async def coreteam_report() -> str:
+    """Số dư / stake / unstake (snapshot) + lượng chuyển ra 7d/30d/90d (chỉ mục cục bộ)."""
+    wallets = await refresher.value("coreteam")
+    index = get_transfer_index()
     results = []
-    cutoff = datetime.utcnow() - timedelta(days=7)
-
     for address, note in CORE_WALLETS.items():
-        try:
-            balance = get_balance(address)
-            staked = get_staked(address)
-            unstake = get_unstaking(address)
-
-            results.append(
-                f"🔹 `{address}` ({note})\n"
-                f"   💰 Balance: {balance:,.0f} HELI\n"
-                f"   🔒 Staked: {staked:,.0f} HELI\n"
-                f"   ⏳ Unstake: {unstake:,.0f} HELI\n"
-            )
-        except Exception as e:
+        if address not in wallets:
             results.append(f"⚠️ Lỗi khi xử lý ví {address} ({note})")
+            continue
+        balance, staked, unstake = wallets[address]
+        if index.cursor(address) is None:
+            outflow = "đang đồng bộ..."
+        else:
+            outflow = " | ".join(f"{label} {uheli / 1e6:,.0f}" for label, uheli in index.outflows(address).items())
+        results.append(
+            f"🔹 `{address}` ({note})\n"
+            f"   💰 Balance: {balance:,.0f} HELI\n"
+            f"   🔒 Staked: {staked:,.0f} HELI\n"
+            f"   ⏳ Unstake: {unstake:,.0f} HELI\n"
+            f"   📤 Chuyển ra: {outflow} HELI\n"
+        )
+    return (
+        "📊 **Tình trạng ví Core Team**\n\n" + "\n\n".join(results)
+        + f"\n{refresher.freshness('coreteam')}"
+    )
 
-    msg = "📊 **Tình trạng ví Core Team**\n\n" + "\n\n".join(results)
-    await context.bot.send_message(chat_id=chat_id, text=msg, parse_mode="Markdown")
+async def coreteam(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_allowed(update.effective_user.id):
+        await update.message.reply_text("🚫 Bạn chưa được cấp quyền. Dùng /whoami gửi admin.")
+        return
+    if refresher.get("coreteam") is None:
+        await update.message.reply_text("⏳ Đang kiểm tra ví core team...")
+    try:
+        msg = await coreteam_report()
+    except Exception as e:
+        await update.message.reply_text(f"⚠️ Lỗi khi kiểm tra ví core team: {e}")
+        return
+    await update.message.reply_text(msg, parse_mode="Markdown")
 
 async def get_market_price():
     try:
-        # Ưu tiên lấy giá từ MEXC
-        url = "https://api.mexc.com/api/v3/ticker/price?symbol=HELIUSDT"
-        r = requests.get(url, timeout=10).json()
-        price_usd = float(r.get("price", 0))
-
-        if price_usd > 0:
-            return price_usd
-
-        # Fallback CoinGecko
-        url_cg = "https://api.coingecko.com/api/v3/simple/price"
-        params = {"ids": "heli", "vs_currencies": "usd"}
-        r = requests.get(url_cg, params=params, timeout=10).json()
-        price_usd = r.get("heli", {}).get("usd")
-
-        return price_usd if price_usd else None
+        return (await refresher.value("price"))[0]
     except Exception as e:
         print(f"⚠️ Lỗi khi lấy giá: {e}")
         return None
@@ -1769,24 +1432,14 @@ async def support_resist_handler(update: Update, context: ContextTypes.DEFAULT_T
     max_price = market_price * (1 + RANGE)
 
     # Lấy orderbook
-    orderbook = await get_orderbook2()
-    bids = orderbook["bids"]
-    asks = orderbook["asks"]
-    if not bids or not asks:
+    book = await refresher.value("book")
+    if not len(book.bids) or not len(book.asks):
         await update.message.reply_text("❌ Không lấy được dữ liệu orderbook.")
         return
 
-    # Gom support/resistance
-    support = defaultdict(float)
-    resistance = defaultdict(float)
-
-    for price, qty in bids:
-        if qty >= THRESHOLD_WALL and min_price <= price <= max_price:
-            support[price] += qty
-
-    for price, qty in asks:
-        if qty >= THRESHOLD_WALL and min_price <= price <= max_price:
-            resistance[price] += qty
+    # Gom support/resistance (tường KL >= THRESHOLD_WALL trong biên độ)
+    support = dict(book.levels_in_range("bids", min_price, max_price, THRESHOLD_WALL))
+    resistance = dict(book.levels_in_range("asks", min_price, max_price, THRESHOLD_WALL))
 
     # -------------------------
     # 1️⃣ Tổng quan
@@ -1865,6 +1518,27 @@ def format_reasons(reasons: list[str]) -> str:
 
 
 # --- Handler cho lệnh /signal ---
+SIGNAL_SNAPSHOT_SYMBOL = "HELIUSDT"
+
+async def signal_report(symbol: str) -> str:
+    """Tin nhắn tín hiệu khung 15m; ValueError nếu không đủ dữ liệu."""
+    engine = await stream_indicators(symbol, interval="15m")
+    if engine is None or engine.count == 0:
+        raise ValueError(f"⚠️ Không có dữ liệu nến cho {symbol} trên MEXC.")
+    if engine.count < 50:
+        raise ValueError(f"⚠️ Không đủ dữ liệu để phân tích {symbol}.")
+    df = engine.frame()
+    if len(df) < 5:
+        raise ValueError(f"⚠️ Dữ liệu không đủ để tạo tín hiệu cho {symbol}.")
+
+    sig, reasons = generate_signal(df)
+    return (
+        f"📊 Tín hiệu {symbol}\n"
+        f"⏱️ Khung 15 phút\n"
+        f"Kết luận: {sig}\n\n"
+        f"🔍 Phân tích:\n{format_reasons(reasons)}"
+    )
+
 async def signal_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     global ACTIVE_SIGNAL_USERS
 
@@ -1915,6 +1589,8 @@ async def signal_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 user_lines.append(f"• {name_display}")
 
             msg = "📋 Danh sách user đang bật auto-signal:\n" + "\n".join(user_lines)
+            if signal_scheduler is not None:
+                msg += f"\n\n⏱ Độ trễ sau đóng nến: {signal_scheduler.summary()}"
             await update.message.reply_text(msg)
             return
 
@@ -1922,90 +1598,308 @@ async def signal_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         else:
             symbol = arg
 
-    # ✅ Phân tích tín hiệu thủ công
+    # ✅ Phân tích tín hiệu thủ công (HELIUSDT đọc snapshot nền)
     try:
-        df = await fetch_ohlcv(symbol, interval="15m", limit=200)
-        if df is None or len(df) == 0:
-            await update.message.reply_text(f"⚠️ Không có dữ liệu nến cho {symbol} trên MEXC.")
-            return
-        if df is None or len(df) < 50:
-            await update.message.reply_text(f"⚠️ Không đủ dữ liệu để phân tích {symbol}.")
-            return
-        df = calculate_indicators(df)
-        if len(df) < 5:
-            await update.message.reply_text(f"⚠️ Dữ liệu không đủ để tạo tín hiệu cho {symbol}.")
-            return
-
-        sig, reasons = generate_signal(df)
-        analysis_text = format_reasons(reasons)
-
-        msg = (
-            f"📊 Tín hiệu {symbol}\n"
-            f"⏱️ Khung 15 phút\n"
-            f"Kết luận: {sig}\n\n"
-            f"🔍 Phân tích:\n{analysis_text}"
-        )
+        if symbol == SIGNAL_SNAPSHOT_SYMBOL:
+            msg = f"{await refresher.value('signal')}\n\n{refresher.freshness('signal')}"
+        else:
+            msg = await signal_report(symbol)
         await update.message.reply_text(msg)
+    except ValueError as e:
+        await update.message.reply_text(str(e))
     except Exception as e:
         await update.message.reply_text(f"❌ Lỗi khi xử lý tín hiệu: {e}")
 
 
 
+# --- Handler cho lệnh /scan ---
+# /scan do nhiều user gọi cùng lúc dùng chung 1 lượt quét (và kết quả trong 60s);
+# auto-scan khi nến đóng vẫn gọi scan_market trực tiếp để luôn có nến mới.
+run_scan = single_flight("scan_market", reuse=60)(scan_market)
+
+async def scan_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_allowed(update.effective_user.id):
+        await update.message.reply_text("🚫 Bạn chưa được cấp quyền. Dùng /whoami gửi admin.")
+        return
+    await update.message.reply_text("⏳ Đang quét các cặp USDT trên MEXC...")
+    try:
+        report = await run_scan()
+        await update.message.reply_text(report.format(SCAN_TOP_N))
+    except Exception as e:
+        logging.error(f"Lỗi /scan: {e}")
+        await update.message.reply_text(f"❌ Lỗi khi quét thị trường: {e}")
+
+
 import traceback
 
-last_signal = {}  # lưu tín hiệu cuối cùng của từng symbol
+last_signal = {}  # lưu tín hiệu cuối cùng của từng (symbol, khung)
+
+# Khung auto-signal: tên khung MEXC -> tên hiển thị
+SIGNAL_INTERVALS = {"15m": "15m", "60m": "1h", "4h": "4h"}
+signal_scheduler = None  # CandleCloseScheduler, tạo trong post_init
+
+async def send_to_signal_users(app, msg: str, name: str = "auto-signal"):
+    recipients = [uid for uid in ACTIVE_SIGNAL_USERS.copy() if uid in ALLOWED_USERS]
+    return await broadcast(app.bot, recipients, msg, name=name)
 
-async def check_auto_signal(app):
-    """Tự động kiểm tra tín hiệu và gửi đến user đã bật /signal on"""
+async def check_auto_signal(app, intervals, close_ms):
+    """Chạy ngay sau khi nến của `intervals` đóng, gửi tín hiệu đến user đã bật /signal on"""
     global last_signal, ACTIVE_SIGNAL_USERS
 
-    while True:
-        if ACTIVE_SIGNAL_USERS:  # chỉ chạy nếu có user bật on
-            for symbol in signal_symbols:
-                try:
-                    df = await fetch_ohlcv(symbol)
-                    df = calculate_indicators(df)
-                    sig, reasons = generate_signal(df)
-
-                    # Chỉ gửi khi tín hiệu thay đổi
-                    if sig != "⚪ Trung lập yếu":  # hoặc tùy điều kiện gửi
-                        # Lấy dòng tổng điểm + 4 dòng chi tiết
-                        summary_lines = []
-                        for r in reasons:
-                            if r.startswith("✅ Tổng điểm"):
-                                summary_lines.append(r)
-                            if r.startswith("• "):  # các dòng chi tiết đã format sẵn
-                                summary_lines.append(r)
-                        summary_text = "\n- " + "\n- ".join(summary_lines[:5]) if summary_lines else ""
-
-                        msg = (
-                            f"⚡ [Tự động] Tín hiệu {symbol}\n"
-                            f"Kết luận: {sig}"
-                            f"{summary_text}"
-                        )
-
-                        # Gửi tới từng user đã bật /signal on
-                        for user_id in ACTIVE_SIGNAL_USERS.copy():
-                            try:
-                                if user_id in ALLOWED_USERS:
-                                    await app.bot.send_message(chat_id=user_id, text=msg)
-                            except Exception as send_err:
-                                print(f"❌ Không gửi được tới {user_id}: {send_err}")
-
-                except Exception as e:
-                    print("Signal check error:", e)
-                    traceback.print_exc()
-
-        # Kiểm tra lại mỗi 1 giờ
-        await asyncio.sleep(3600)
+    if not ACTIVE_SIGNAL_USERS:  # chỉ chạy nếu có user bật on
+        return
+
+    for interval in intervals:
+        label = SIGNAL_INTERVALS.get(interval, interval)
+        for symbol in signal_symbols:
+            try:
+                engine = await stream_indicators(symbol, interval)
+                df = engine.frame() if engine else None
+                if df is not None and not df.empty:
+                    # Bỏ nến vừa mở sau thời điểm đóng, chỉ xét nến đã chốt
+                    df = df[df["timestamp"] < pd.to_datetime(close_ms, unit="ms")]
+                sig, reasons = generate_signal(df)
+
+                # Chỉ gửi khi tín hiệu thay đổi
+                key = (symbol, interval)
+                changed = last_signal.get(key) != sig
+                last_signal[key] = sig
+                if sig != "⚪ Trung lập yếu" and changed:
+                    # Lấy dòng tổng điểm + 4 dòng chi tiết
+                    summary_lines = []
+                    for r in reasons:
+                        if r.startswith("✅ Tổng điểm"):
+                            summary_lines.append(r)
+                        if r.startswith("• "):  # các dòng chi tiết đã format sẵn
+                            summary_lines.append(r)
+                    summary_text = "\n- " + "\n- ".join(summary_lines[:5]) if summary_lines else ""
+
+                    lag = (signal_scheduler.clock.now_ms() - close_ms) / 1000
+                    msg = (
+                        f"⚡ [Tự động] Tín hiệu {symbol}\n"
+                        f"⏱️ Khung {label} (sau đóng nến {lag:.1f}s)\n"
+                        f"Kết luận: {sig}"
+                        f"{summary_text}"
+                    )
+
+                    # Gửi tới các user đã bật /signal on
+                    await send_to_signal_users(app, msg, name=f"signal {symbol} {label}")
+                    delay = signal_scheduler.record_delivery(interval, close_ms)
+                    logging.info(f"⚡ Tín hiệu {symbol} {label} gửi xong sau đóng nến {delay:.1f}s")
+
+            except Exception as e:
+                print("Signal check error:", e)
+                traceback.print_exc()
+
+        # Quét nhiều cặp, chỉ gửi các cặp mạnh nhất
+        if AUTO_SCAN and interval == SCAN_INTERVAL:
+            try:
+                report = await scan_market(interval=interval)
+                if report.top():
+                    await send_to_signal_users(app, "⚡ [Tự động] " + report.format(SCAN_TOP_N), name=f"scan {label}")
+                    delay = signal_scheduler.record_delivery(interval, close_ms)
+                    logging.info(f"🛰 Kết quả quét {label} gửi xong sau đóng nến {delay:.1f}s")
+            except Exception as e:
+                logging.error(f"Lỗi quét thị trường: {e}")
 
 # =============================================================
 
+# Các task nền chạy trên event loop của Application
+# --- Lịch làm mới snapshot nền ---
+refresher.register("chain", fetch_chain_stats)
+refresher.register("validators", lambda: get_lcd().validators(limit=2000))
+# Tracker không live (UNBONDING_TRACKER=0, RPC lỗi): mỗi lần làm mới là một lượt quét LCD mọi validator
+refresher.register("unbonding", get_unbonding_snapshot, live=lambda: get_tracker().is_live(),
+                   idle_interval=UNBONDING_SCAN_INTERVAL)
+refresher.register("book", lambda: read_book(500))
+refresher.register("signal", lambda: signal_report(SIGNAL_SNAPSHOT_SYMBOL))
+refresher.register("coreteam", fetch_coreteam)
+refresher.register("transfers", sync_transfers)
+
+# --- Cảnh báo ví lớn theo block (transfer_watcher.py) ---
+transfer_watcher = get_transfer_watcher()
+transfer_watcher.watch_many(CORE_WALLETS)
+
+async def notify_transfer(app, alert):
+    await broadcast(app.bot, allowed_chats(), alert.format(), name="watch")
+
+# --- Lưu / khôi phục state qua các lần khởi động lại (state_store.py) ---
+STATE_SNAPSHOTS = ("chain", "validators", "unbonding", "price", "book", "signal", "coreteam")
+STATE_SNAPSHOT_MAX_AGE = 6 * 3600  # giây: snapshot cũ hơn thì chờ làm mới thay vì phục vụ
+
+def track_state():
+    store = get_state_store()
+    track_users(store)
+    store.track("signal_users", lambda: sorted(ACTIVE_SIGNAL_USERS))
+    store.track("user_chats", lambda: sorted(user_chats))
+    store.track("last_signal", lambda: dict(last_signal))
+    for name in STATE_SNAPSHOTS:
+        store.track(f"snapshot:{name}", lambda name=name: refresher.get(name), every=30)
+    store.track("book_sampler", get_book_sampler().dump_state, every=60)
+    store.track("transfer_watch_height", lambda: transfer_watcher.height)
+
+def restore_state(application: Application):
+    """Nạp state đã lưu: quyền user, đăng ký tín hiệu, chat /start (kèm job), snapshot."""
+    started = time.perf_counter()
+    state = get_state_store().load()
+    restore_users(state)
+    ACTIVE_SIGNAL_USERS.update(uid for uid in state.get("signal_users", ()) if is_allowed(uid))
+    # Chat riêng (id > 0 = user id) của user đã mất quyền thì không khôi phục
+    user_chats.update(c for c in state.get("user_chats", ()) if c < 0 or is_allowed(c))
+    last_signal.update(state.get("last_signal", {}))
+
+    restored = []
+    for name in STATE_SNAPSHOTS:
+        snap = state.get(f"snapshot:{name}")
+        if snap is not None and snap.age() <= STATE_SNAPSHOT_MAX_AGE and refresher.get(name) is None:
+            refresher.restore(snap)
+            restored.append(name)
+    if state.get("book_sampler"):
+        get_book_sampler().load_state(state["book_sampler"])
+    if transfer_watcher.height is None:
+        transfer_watcher.height = state.get("transfer_watch_height")
+
+    for chat_id in user_chats:
+        schedule_chat_jobs(application.job_queue, chat_id)
+    logging.info(
+        f"💾 Khôi phục state trong {(time.perf_counter() - started)*1000:.1f}ms: "
+        f"{len(ALLOWED_USERS)} user, {len(ACTIVE_SIGNAL_USERS)} bật tín hiệu, {len(user_chats)} chat, "
+        f"snapshot {', '.join(restored) or '-'}"
+    )
+
+# --- Số đo tức thời cho /metrics (metrics.py) ---
+@register_collector
+def collect_bot_metrics():
+    now = time.time()
+    snaps = [(name, refresher.get(name)) for name in refresher.names()]
+    stream = get_orderbook_stream()
+    sample = get_book_sampler().latest()
+    cst = command_cache.stats
+    delays = signal_scheduler.delays.items() if signal_scheduler is not None else ()
+    return [
+        ("heli_snapshot_age_seconds", "gauge", "Tuổi của snapshot nền",
+         [({"name": n}, snap.age()) for n, snap in snaps if snap]),
+        ("heli_snapshot_version", "gauge", "Version của snapshot nền",
+         [({"name": n}, snap.version) for n, snap in snaps if snap]),
+        ("heli_snapshot_refreshes_total", "counter", "Số lần làm mới snapshot thành công",
+         [({"name": n}, refresher.refreshes.get(n, 0)) for n, _ in snaps]),
+        ("heli_snapshot_last_error_timestamp_seconds", "gauge", "Thời điểm lỗi làm mới gần nhất",
+         [({"name": n}, refresher.errors[n][0]) for n, _ in snaps if n in refresher.errors]),
+        ("heli_cache_events_total", "counter", "Sự kiện của cache lệnh gộp",
+         [({"cache": command_cache.name, "event": k}, v) for k, v in asdict(cst).items()]),
+        ("heli_cache_hit_ratio", "gauge", "Tỷ lệ hit của cache",
+         [({"cache": command_cache.name}, cst.hit_ratio())]),
+        ("heli_orderbook_synced", "gauge", "Book websocket đang đồng bộ (1/0)",
+         [({"symbol": stream.symbol}, int(stream.is_live()))]),
+        ("heli_orderbook_age_seconds", "gauge", "Số giây từ lần cập nhật book websocket cuối",
+         [({"symbol": stream.symbol}, now - stream.book.updated_at)] if stream.book.updated_at else []),
+        ("heli_orderbook_resyncs_total", "counter", "Số lần đồng bộ lại book",
+         [({"symbol": stream.symbol}, stream.resyncs)]),
+        ("heli_orderbook_messages_total", "counter", "Số message websocket book đã xử lý",
+         [({"symbol": stream.symbol}, stream.messages)]),
+        ("heli_orderbook_gaps_total", "counter", "Số lần phát hiện mất update book",
+         [({"symbol": stream.symbol}, stream.gaps)]),
+        ("heli_book_sample_age_seconds", "gauge", "Tuổi mẫu orderbook mới nhất của /flow",
+         [({}, now - sample[SAMPLE_T])] if sample is not None else []),
+        ("heli_unbonding_tracker_live", "gauge", "Tracker unbonding theo block đang chạy (1/0)",
+         [({}, int(get_tracker().is_live()))]),
+        ("heli_signal_delivery_delay_seconds", "gauge", "Độ trễ TB giao auto-signal sau đóng nến",
+         [({"interval": iv}, sum(d) / len(d)) for iv, d in delays if d]),
+        ("heli_watch_addresses", "gauge", "Số ví đang theo dõi chuyển khoản lớn",
+         [({}, len(transfer_watcher.watched))]),
+        ("heli_watch_height", "gauge", "Block cuối đã xử lý bởi watcher ví lớn",
+         [({}, transfer_watcher.height)]),
+        ("heli_watch_alerts_total", "counter", "Số cảnh báo ví lớn theo loại",
+         [({"kind": kind}, n) for kind, n in transfer_watcher.alerted.items()]),
+        ("heli_users", "gauge", "Số user theo loại",
+         [({"kind": "allowed"}, len(ALLOWED_USERS)), ({"kind": "signal"}, len(ACTIVE_SIGNAL_USERS)),
+          ({"kind": "chats"}, len(user_chats))]),
+    ]
+
+background_tasks = []
+
+def start_background(coro):
+    task = asyncio.create_task(coro)
+    background_tasks.append(task)
+    return task
+
+async def post_init(application: Application):
+    """Khởi động các task nền sau khi Application đã sẵn sàng."""
+    try:
+        track_state()
+        restore_state(application)
+        start_background(get_state_store().run())
+    except Exception as e:
+        logging.error(f"Lỗi khôi phục state: {e}")
+
+    if UNBONDING_TRACKER:
+        start_background(run_unbonding_tracker())
+        logging.info("🔓 Tracker unbonding (RPC) đã khởi động nền...")
+
+    if TRANSFER_WATCH:
+        start_background(run_transfer_watcher(transfer_watcher, lambda alert: notify_transfer(application, alert)))
+
+    if ORDERBOOK_STREAM:
+        start_background(run_orderbook_stream())
+    start_background(refresher.run())
+    start_background(run_book_sampler(get_book_sampler()))
+
+    global signal_scheduler
+    signal_scheduler = CandleCloseScheduler(
+        SIGNAL_INTERVALS, lambda intervals, close_ms: check_auto_signal(application, intervals, close_ms)
+    )
+    start_background(signal_scheduler.run())
+    logging.info("🔄 Auto-signal chạy theo giờ đóng nến 15m/1h/4h của MEXC...")
+
+async def post_stop(application: Application):
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
+    try:
+        get_state_store().flush(force=True)
+    except Exception as e:
+        logging.error(f"Lỗi khi lưu state: {e}")
+
 # -------------------------------
 # Main
 # -------------------------------
-def main():
-    import threading
+# Bảng lệnh -> handler, dùng chung cho build_application() và boot.py
+COMMANDS = {
+    # === Lệnh quản lý user ===
+    "whoami": whoami,
+    "grant": grant,
+    "revoke": revoke,
+    # === Lệnh chính ===
+    "start": start,
+    "help": help_command,
+    "ping": ping,
+    "status": status,
+    "unstake": unstake,
+    "unbonding_wallets": unbonding_wallets,
+    "bonded_ratio": bonded_ratio,
+    "apy": apy,
+    "supply": supply,
+    "price": price,
+    "staked": staked,
+    "validator": validator,
+    "coreteam": coreteam,
+    "heatmap": heatmap,
+    "signal": signal_handler,
+    "scan": scan_handler,
+    "orderbook": orderbook,
+    "flow": flow,
+    "detect_doilai": detect_doilai,
+    "alert": alert_handler,
+    "trend": trend_handler,
+    "support_resist": support_resist_handler,
+    "heliinfo": heliinfo,
+    "showusers": showusers_handler,
+    "cachestats": cachestats,
+}
+
+def build_application() -> Application:
+    """Application với đầy đủ CommandHandler (dùng chung cho main() và bench.py)."""
     from telegram.request import HTTPXRequest
 
     request = HTTPXRequest(
@@ -2015,60 +1909,31 @@ def main():
         pool_timeout=20
     )
 
-    application = Application.builder().token(BOT_TOKEN).request(request).build()
-
-    # === Lệnh quản lý user ===
-    application.add_handler(CommandHandler("whoami", whoami))
-    application.add_handler(CommandHandler("grant", grant))
-    application.add_handler(CommandHandler("revoke", revoke))
+    application = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .request(request)
+        .post_init(post_init)
+        .post_stop(post_stop)
+        .post_shutdown(close_clients)
+        .build()
+    )
 
-    # === Lệnh chính ===
-    application.add_handler(CommandHandler("start", start))
-    application.add_handler(CommandHandler("help", help_command))
-    application.add_handler(CommandHandler("ping", ping))
-    application.add_handler(CommandHandler("status", status))
-    application.add_handler(CommandHandler("unstake", unstake))
-    application.add_handler(CommandHandler("unbonding_wallets", unbonding_wallets))
-    application.add_handler(CommandHandler("bonded_ratio", bonded_ratio))
-    application.add_handler(CommandHandler("apy", apy))
-    application.add_handler(CommandHandler("supply", supply))
-    application.add_handler(CommandHandler("price", price))
-    application.add_handler(CommandHandler("staked", staked))
-    application.add_handler(CommandHandler("validator", validator))
-    application.add_handler(CommandHandler("coreteam", coreteam))
-    application.add_handler(CommandHandler("heatmap", heatmap))
-    application.add_handler(CommandHandler("signal", signal_handler))
-    application.add_handler(CommandHandler("orderbook", orderbook))
-    application.add_handler(CommandHandler("flow", flow))
-    application.add_handler(CommandHandler("detect_doilai", detect_doilai))
-    application.add_handler(CommandHandler("alert", alert_handler))
-    application.add_handler(CommandHandler("trend", trend_handler))
-    application.add_handler(CommandHandler("support_resist", support_resist_handler))
-    application.add_handler(CommandHandler("heliinfo", heliinfo))
-    application.add_handler(CommandHandler("showusers", showusers_handler))
-
-    # === Khởi động task auto-signal chạy nền ===
-    def run_auto_signal():
-        try:
-            import asyncio
-            asyncio.run(check_auto_signal(application))
-        except Exception as e:
-            logging.error(f"Lỗi trong check_auto_signal(): {e}")
+    # Đo thời gian / đếm mọi lệnh cho /metrics
+    for name, callback in COMMANDS.items():
+        application.add_handler(CommandHandler(name, instrument_command(name, callback)))
+    return application
 
-    threading.Thread(target=run_auto_signal, daemon=True).start()
-    logging.info("🔄 Nhiệm vụ auto-signal đã khởi động nền...")
+def main():
+    application = build_application()
 
     # === Khởi động bot ===
     logging.info("🚀 Bot HeliChain đã khởi động...")
 
     if os.getenv("RENDER") == "true":
         port = int(os.environ.get("PORT", "10000"))
-        application.run_webhook(
-            listen="0.0.0.0",
-            port=port,
-            url_path=BOT_TOKEN,
-            webhook_url=f"{WEBHOOK_URL}/{BOT_TOKEN}"
-        )
+        # Webhook + /metrics trên cùng cổng Render (webserver.py)
+        run_webhook(application, port, url_path=BOT_TOKEN, webhook_url=f"{WEBHOOK_URL}/{BOT_TOKEN}")
     else:
         application.run_polling()
 
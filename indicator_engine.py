@@ -0,0 +1,324 @@
+"""
+Engine chỉ báo dạng streaming cho generate_signal.
+
+Giữ state chạy của từng chỉ báo theo (symbol, interval) và cập nhật O(1)
+cho mỗi nến mới hoặc nến cuối bị sửa (nến chưa đóng), cho ra cùng giá trị
+với các cột của calculate_indicators (RSI 9/21, Stochastic 14/3, MACD
+12/26/9, EMA 8/21/65/200, Bollinger 20/2, PSAR 0.02/0.2, volume MA 20).
+
+Công thức bám sát thư viện `ta` / pandas (ewm adjust=False, rolling
+min_periods=window) để kết quả khớp tới sai số làm tròn số thực.
+"""
+import math
+import threading
+from collections import deque
+
+import pandas as pd
+
+NAN = float("nan")
+
+
+def _ewm_alpha(span: float | None = None, alpha: float | None = None) -> float:
+    """Đổi span/alpha về alpha giống pandas (qua center of mass)."""
+    com = (span - 1) / 2 if span is not None else 1 / alpha - 1
+    return 1.0 / (1.0 + com)
+
+
+class Ewm:
+    """pandas `ewm(adjust=False, min_periods=n).mean()`, bỏ qua NaN ở đầu chuỗi."""
+
+    def __init__(self, min_periods: int, span: float | None = None, alpha: float | None = None):
+        self.alpha = _ewm_alpha(span, alpha)
+        self.old_wt = 1.0 - self.alpha
+        self.min_periods = min_periods
+        self.value = NAN
+        self.nobs = 0
+
+    def update(self, x: float) -> float:
+        if x == x:  # không phải NaN
+            self.nobs += 1
+            if self.value != self.value:
+                self.value = x
+            elif self.value != x:
+                self.value = (self.old_wt * self.value + self.alpha * x) / (self.old_wt + self.alpha)
+        return self.value if self.nobs >= self.min_periods else NAN
+
+    def snapshot(self):
+        return self.value, self.nobs
+
+    def restore(self, snap):
+        self.value, self.nobs = snap
+
+
+class Rolling:
+    """Cửa sổ trượt cố định (min_periods = window)."""
+
+    def __init__(self, window: int):
+        self.window = window
+        self.values = deque(maxlen=window)
+
+    def push(self, x: float):
+        self.values.append(x)
+
+    def snapshot(self):
+        """Chỉ giữ phần tử sẽ bị đẩy ra ở lần push kế tiếp."""
+        return self.values[0] if len(self.values) == self.window else None
+
+    def restore(self, snap):
+        """Hoàn tác đúng một lần push sau snapshot."""
+        self.values.pop()
+        if snap is not None:
+            self.values.appendleft(snap)
+
+    def full(self) -> bool:
+        return len(self.values) == self.window and all(v == v for v in self.values)
+
+    def mean(self) -> float:
+        return sum(self.values) / self.window if self.full() else NAN
+
+    def std(self) -> float:
+        """Độ lệch chuẩn ddof=0."""
+        if not self.full():
+            return NAN
+        m = sum(self.values) / self.window
+        return math.sqrt(sum((v - m) ** 2 for v in self.values) / self.window)
+
+    def min(self) -> float:
+        return min(self.values) if self.full() else NAN
+
+    def max(self) -> float:
+        return max(self.values) if self.full() else NAN
+
+
+class Rsi:
+    """ta.momentum.RSIIndicator"""
+
+    def __init__(self, window: int):
+        self.up = Ewm(window, alpha=1 / window)
+        self.down = Ewm(window, alpha=1 / window)
+        self.prev_close = NAN
+
+    def update(self, close: float) -> float:
+        diff = close - self.prev_close  # NaN ở nến đầu -> 0 như diff.where(...)
+        self.prev_close = close
+        up = self.up.update(diff if diff > 0 else 0.0)
+        down = self.down.update(-diff if diff < 0 else 0.0)
+        if down == 0:
+            return 100.0
+        return 100 - (100 / (1 + up / down))
+
+    def snapshot(self):
+        return self.up.snapshot(), self.down.snapshot(), self.prev_close
+
+    def restore(self, snap):
+        up, down, self.prev_close = snap
+        self.up.restore(up)
+        self.down.restore(down)
+
+
+class Psar:
+    """ta.trend.PSARIndicator (step=0.02, max_step=0.2)."""
+
+    def __init__(self, step: float = 0.02, max_step: float = 0.2):
+        self.step = step
+        self.max_step = max_step
+        self.n = 0
+        self.up_trend = True
+        self.af = step
+        self.up_trend_high = NAN
+        self.down_trend_low = NAN
+        self.prev_psar = NAN
+        self.highs = deque(maxlen=2)  # high[i-2], high[i-1]
+        self.lows = deque(maxlen=2)
+
+    def update(self, high: float, low: float, close: float) -> float:
+        if self.n == 0:
+            self.up_trend_high = high
+            self.down_trend_low = low
+        if self.n < 2:
+            psar = close
+        elif self.up_trend:
+            psar = self.prev_psar + self.af * (self.up_trend_high - self.prev_psar)
+            if low < psar:
+                self.up_trend = False
+                psar = self.up_trend_high
+                self.down_trend_low = low
+                self.af = self.step
+            else:
+                if high > self.up_trend_high:
+                    self.up_trend_high = high
+                    self.af = min(self.af + self.step, self.max_step)
+                low2, low1 = self.lows
+                if low2 < psar:
+                    psar = low2
+                elif low1 < psar:
+                    psar = low1
+        else:
+            psar = self.prev_psar - self.af * (self.prev_psar - self.down_trend_low)
+            if high > psar:
+                self.up_trend = True
+                psar = self.down_trend_low
+                self.up_trend_high = high
+                self.af = self.step
+            else:
+                if low < self.down_trend_low:
+                    self.down_trend_low = low
+                    self.af = min(self.af + self.step, self.max_step)
+                high2, high1 = self.highs
+                if high2 > psar:
+                    psar = high2
+                elif high1 > psar:
+                    psar = high1
+        self.highs.append(high)
+        self.lows.append(low)
+        self.prev_psar = psar
+        self.n += 1
+        return psar
+
+    def snapshot(self):
+        return (self.n, self.up_trend, self.af, self.up_trend_high, self.down_trend_low,
+                self.prev_psar, tuple(self.highs), tuple(self.lows))
+
+    def restore(self, snap):
+        (self.n, self.up_trend, self.af, self.up_trend_high, self.down_trend_low,
+         self.prev_psar, highs, lows) = snap
+        self.highs.clear()
+        self.highs.extend(highs)
+        self.lows.clear()
+        self.lows.extend(lows)
+
+
+class IndicatorState:
+    """State của toàn bộ chỉ báo sau một nến."""
+
+    def __init__(self):
+        self.rsi_fast = Rsi(9)
+        self.rsi_slow = Rsi(21)
+        self.stoch_low = Rolling(14)
+        self.stoch_high = Rolling(14)
+        self.stoch_k = Rolling(3)
+        self.macd_fast = Ewm(12, span=12)
+        self.macd_slow = Ewm(26, span=26)
+        self.macd_sign = Ewm(9, span=9)
+        self.ema = {n: Ewm(n, span=n) for n in (8, 21, 65, 200)}
+        self.bb = Rolling(20)
+        self.psar = Psar(0.02, 0.2)
+        self.vol = Rolling(20)
+        self._parts = [
+            self.rsi_fast, self.rsi_slow, self.stoch_low, self.stoch_high, self.stoch_k,
+            self.macd_fast, self.macd_slow, self.macd_sign, *self.ema.values(),
+            self.bb, self.psar, self.vol,
+        ]
+
+    def snapshot(self) -> list:
+        """Các trường thay đổi ở một lần update, để tính lại nến chưa đóng."""
+        return [p.snapshot() for p in self._parts]
+
+    def restore(self, snap: list):
+        for p, s in zip(self._parts, snap):
+            p.restore(s)
+
+    def update(self, high: float, low: float, close: float, volume: float) -> dict:
+        row = {}
+        row["rsi_fast"] = self.rsi_fast.update(close)
+        row["rsi_slow"] = self.rsi_slow.update(close)
+        row["rsi"] = row["rsi_fast"]
+
+        self.stoch_low.push(low)
+        self.stoch_high.push(high)
+        smin, smax = self.stoch_low.min(), self.stoch_high.max()
+        if smax - smin != 0:
+            k = 100 * (close - smin) / (smax - smin)
+        else:
+            k = NAN if close - smin == 0 or smin != smin else math.copysign(math.inf, close - smin)
+        self.stoch_k.push(k)
+        row["stoch_k"] = k
+        row["stoch_d"] = self.stoch_k.mean()
+
+        fast = self.macd_fast.update(close)
+        slow = self.macd_slow.update(close)
+        macd = fast - slow
+        signal = self.macd_sign.update(macd)
+        row["macd"] = macd
+        row["macd_signal"] = signal
+        row["macd_hist"] = macd - signal
+
+        for n, ema in self.ema.items():
+            row[f"ema{n}"] = ema.update(close)
+
+        self.bb.push(close)
+        mavg, mstd = self.bb.mean(), self.bb.std()
+        row["bb_upper"] = mavg + 2 * mstd
+        row["bb_lower"] = mavg - 2 * mstd
+        row["bb_mid"] = mavg
+
+        row["sar"] = self.psar.update(high, low, close)
+
+        self.vol.push(volume)
+        row["vol_ma"] = self.vol.mean()
+        row["vol_ratio"] = volume / row["vol_ma"] if row["vol_ma"] else NAN
+        return row
+
+
+class IndicatorEngine:
+    """
+    Nến mới (open_time lớn hơn) -> chốt state của nến trước rồi cập nhật.
+    Cùng open_time -> khôi phục snapshot trước nến cuối rồi tính lại (nến chưa đóng).
+    """
+
+    def __init__(self, history: int = 50):
+        self._state = IndicatorState()      # state sau nến cuối (có thể chưa đóng)
+        self._saved = None                  # snapshot state trước nến cuối
+        self.rows = deque(maxlen=history)   # các dòng gần nhất (OHLCV + chỉ báo)
+        self.last_open_time = None
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def update(self, open_time, open_, high, low, close, volume) -> dict:
+        with self._lock:
+            if self.last_open_time is not None and open_time < self.last_open_time:
+                return self.rows[-1]  # nến cũ hơn, bỏ qua
+            if open_time == self.last_open_time:
+                self.rows.pop()
+                self._state.restore(self._saved)
+            else:
+                self._saved = self._state.snapshot()
+                self.count += 1
+            row = {
+                "timestamp": open_time, "open": open_, "high": high, "low": low,
+                "close": close, "volume": volume,
+            }
+            row.update(self._state.update(high, low, close, volume))
+            self.rows.append(row)
+            self.last_open_time = open_time
+            return row
+
+    def feed(self, candles) -> int:
+        """
+        Nạp các tuple (open_time, open, high, low, close, volume, ...) tăng dần.
+        Trả về số nến mới.
+        """
+        before = self.count
+        for c in candles:
+            if self.last_open_time is None or c[0] >= self.last_open_time:
+                self.update(*c[:6])
+        return self.count - before
+
+    def frame(self) -> pd.DataFrame:
+        """DataFrame các dòng gần nhất, cùng cột với calculate_indicators."""
+        df = pd.DataFrame(list(self.rows))
+        if not df.empty:
+            df["timestamp"] = pd.to_datetime(df["timestamp"], unit="ms")
+        return df
+
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def get_engine(symbol: str, interval: str) -> IndicatorEngine:
+    with _engines_lock:
+        engine = _engines.get((symbol, interval))
+        if engine is None:
+            engine = _engines[(symbol, interval)] = IndicatorEngine()
+        return engine
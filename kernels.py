@@ -0,0 +1,453 @@
+"""
+Kernel chỉ báo trên mảng float liên tục (numpy) cho /trend và /signal:
+ATR (Wilder), Supertrend và Parabolic SAR.
+
+Kết quả giống hệt `ta.volatility.AverageTrueRange`, `ta.trend.PSARIndicator`
+và hàm supertrend() cũ (vòng lặp .iloc). Phần vector hoá được thì dùng numpy;
+các hồi quy tuần tự (Wilder, dải cuối, SAR) chạy trên list float thuần thay
+cho .iloc của pandas.
+
+Chạy `python kernels.py` để đo tốc độ trên 200 / 10k / 1M nến.
+"""
+import sys
+import time
+
+import numpy as np
+
+
+def _as_array(x) -> np.ndarray:
+    return np.ascontiguousarray(x, dtype=np.float64)
+
+
+def true_range(high, low, close) -> np.ndarray:
+    high, low, close = _as_array(high), _as_array(low), _as_array(close)
+    prev_close = np.empty_like(close)
+    prev_close[0] = np.nan
+    prev_close[1:] = close[:-1]
+    # fmax bỏ qua NaN giống DataFrame.max(axis=1): nến đầu chỉ còn high - low
+    return np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+
+
+def atr(high, low, close, window: int = 14) -> np.ndarray:
+    """ATR Wilder như ta: 0 cho window-1 nến đầu, nến thứ window là trung bình TR."""
+    tr = true_range(high, low, close)
+    n = len(tr)
+    out = np.zeros(n)
+    if n < window:
+        return out
+    tr_list = tr.tolist()
+    value = tr[:window].mean()
+    out_list = [0.0] * n
+    out_list[window - 1] = value
+    w1 = window - 1
+    fw = float(window)
+    for i in range(window, n):
+        value = (value * w1 + tr_list[i]) / fw
+        out_list[i] = value
+    out[:] = out_list
+    return out
+
+
+def supertrend(high, low, close, period: int = 10, multiplier: float = 3) -> np.ndarray:
+    """Hướng Supertrend: 1 = tăng, -1 = giảm."""
+    high, low, close = _as_array(high), _as_array(low), _as_array(close)
+    n = len(close)
+    if n == 0:
+        return np.empty(0)
+    hl2 = (high + low) / 2
+    band = multiplier * atr(high, low, close, period)
+    upper = (hl2 + band).tolist()
+    lower = (hl2 - band).tolist()
+    c = close.tolist()
+
+    final_upper = upper[:]
+    final_lower = lower[:]
+    for i in range(1, n):
+        if c[i - 1] <= final_upper[i - 1]:
+            final_upper[i] = min(upper[i], final_upper[i - 1])
+        if c[i - 1] >= final_lower[i - 1]:
+            final_lower[i] = max(lower[i], final_lower[i - 1])
+
+    fu = np.array(final_upper)
+    fl = np.array(final_lower)
+    # 1 / -1 khi phá dải, NaN = giữ hướng của nến trước (forward-fill)
+    raw = np.where(close > fu, 1.0, np.where(close < fl, -1.0, np.nan))
+    if np.isnan(raw[0]):
+        raw[0] = 1.0
+    idx = np.where(~np.isnan(raw), np.arange(n), 0)
+    np.maximum.accumulate(idx, out=idx)
+    return raw[idx]
+
+
+def psar(high, low, close, step: float = 0.02, max_step: float = 0.2) -> np.ndarray:
+    """Parabolic SAR như ta.trend.PSARIndicator.psar()."""
+    h = _as_array(high).tolist()
+    l = _as_array(low).tolist()
+    out = _as_array(close).tolist()  # 2 nến đầu = close
+    n = len(out)
+    if n == 0:
+        return np.empty(0)
+
+    up_trend = True
+    af = step
+    up_trend_high = h[0]
+    down_trend_low = l[0]
+    for i in range(2, n):
+        max_high = h[i]
+        min_low = l[i]
+        prev = out[i - 1]
+        if up_trend:
+            sar = prev + af * (up_trend_high - prev)
+            if min_low < sar:
+                up_trend = False
+                sar = up_trend_high
+                down_trend_low = min_low
+                af = step
+            else:
+                if max_high > up_trend_high:
+                    up_trend_high = max_high
+                    af = min(af + step, max_step)
+                if l[i - 2] < sar:
+                    sar = l[i - 2]
+                elif l[i - 1] < sar:
+                    sar = l[i - 1]
+        else:
+            sar = prev - af * (prev - down_trend_low)
+            if max_high > sar:
+                up_trend = True
+                sar = down_trend_low
+                up_trend_high = max_high
+                af = step
+            else:
+                if min_low < down_trend_low:
+                    down_trend_low = min_low
+                    af = min(af + step, max_step)
+                if h[i - 2] > sar:
+                    sar = h[i - 2]
+                elif h[i - 1] > sar:
+                    sar = h[i - 1]
+        out[i] = sar
+    return np.array(out)
+
+
+def resample_ohlcv(open_time, open_, high, low, close, volume, step_ms: int) -> tuple:
+    """
+    Gộp nến (open_time ms, tăng dần) thành nến khung `step_ms`, căn theo UTC
+    như MEXC (4h: 0h/4h/8h..., 1D: 0h UTC). Nhóm đầu thiếu (chuỗi bắt đầu giữa
+    khung) bị bỏ; nhóm cuối là nến đang chạy.
+    Trả về (open_time, open, high, low, close, volume).
+    """
+    t = np.asarray(open_time, dtype=np.int64)
+    empty = (np.empty(0, dtype=np.int64),) + tuple(np.empty(0) for _ in range(5))
+    if len(t) == 0:
+        return empty
+    bucket = t - t % step_ms
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    if bucket[0] != t[0]:
+        starts = starts[1:]
+    if len(starts) == 0:
+        return empty
+    ends = np.r_[starts[1:], len(t)]
+    high, low, volume = _as_array(high), _as_array(low), _as_array(volume)
+    return (
+        bucket[starts],
+        _as_array(open_)[starts],
+        np.maximum.reduceat(high, starts),
+        np.minimum.reduceat(low, starts),
+        _as_array(close)[ends - 1],
+        np.add.reduceat(volume, starts),
+    )
+
+
+# -------------------------------
+# Batch: ma trận (symbol x nến) cho bộ quét nhiều cặp
+# -------------------------------
+def stack_right(series: list, length: int) -> np.ndarray:
+    """
+    Xếp các chuỗi dài ngắn khác nhau thành ma trận (len(series), length),
+    căn phải theo nến cuối; phần thiếu ở đầu là NaN.
+    """
+    out = np.full((len(series), length), np.nan)
+    for i, s in enumerate(series):
+        s = _as_array(s)[-length:]
+        if len(s):
+            out[i, length - len(s):] = s
+    return out
+
+
+def _ewm_alpha(span: float | None = None, alpha: float | None = None) -> float:
+    com = (span - 1) / 2 if span is not None else 1 / alpha - 1
+    return 1.0 / (1.0 + com)
+
+
+def ewm_2d(x: np.ndarray, min_periods: int, span: float | None = None, alpha: float | None = None) -> np.ndarray:
+    """pandas `ewm(adjust=False, min_periods=...).mean()` theo từng dòng, bỏ qua NaN."""
+    a = _ewm_alpha(span, alpha)
+    old_wt = 1.0 - a
+    rows, cols = x.shape
+    out = np.full_like(x, np.nan, dtype=np.float64)
+    value = np.full(rows, np.nan)
+    nobs = np.zeros(rows, dtype=np.int64)
+    for t in range(cols):
+        col = x[:, t]
+        obs = ~np.isnan(col)
+        nobs += obs
+        blended = (old_wt * value + a * col) / (old_wt + a)
+        value = np.where(obs, np.where(np.isnan(value), col, np.where(value != col, blended, value)), value)
+        out[:, t] = np.where(nobs >= min_periods, value, np.nan)
+    return out
+
+
+def rolling_2d(x: np.ndarray, window: int, func) -> np.ndarray:
+    """Cửa sổ trượt theo từng dòng (min_periods = window), NaN trong cửa sổ -> NaN."""
+    out = np.full_like(x, np.nan, dtype=np.float64)
+    if x.shape[1] >= window:
+        windows = np.lib.stride_tricks.sliding_window_view(x, window, axis=1)
+        out[:, window - 1:] = func(windows, axis=2)
+    return out
+
+
+def rsi_2d(close: np.ndarray, window: int) -> np.ndarray:
+    diff = np.full_like(close, np.nan)
+    diff[:, 1:] = close[:, 1:] - close[:, :-1]
+    missing = np.isnan(close)
+    with np.errstate(invalid="ignore"):
+        up = np.where(diff > 0, diff, 0.0)
+        down = np.where(diff < 0, -diff, 0.0)
+    up[missing] = np.nan
+    down[missing] = np.nan
+    ema_up = ewm_2d(up, window, alpha=1 / window)
+    ema_down = ewm_2d(down, window, alpha=1 / window)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(ema_down == 0, 100.0, 100 - (100 / (1 + ema_up / ema_down)))
+
+
+def atr_2d(high: np.ndarray, low: np.ndarray, close: np.ndarray, window: int = 14) -> np.ndarray:
+    """atr() theo từng dòng (mỗi dòng là một chuỗi nến riêng)."""
+    prev_close = np.full_like(close, np.nan)
+    prev_close[:, 1:] = close[:, :-1]
+    tr = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+    out = np.zeros_like(close)
+    if close.shape[1] < window:
+        return out
+    value = tr[:, :window].mean(axis=1)
+    out[:, window - 1] = value
+    for i in range(window, close.shape[1]):
+        value = (value * (window - 1) + tr[:, i]) / window
+        out[:, i] = value
+    return out
+
+
+def supertrend_2d(high: np.ndarray, low: np.ndarray, close: np.ndarray,
+                  period: int = 10, multiplier: float = 3) -> np.ndarray:
+    """supertrend() theo từng dòng: 1 = tăng, -1 = giảm."""
+    hl2 = (high + low) / 2
+    band = multiplier * atr_2d(high, low, close, period)
+    upper, lower = hl2 + band, hl2 - band
+    final_upper, final_lower = np.copy(upper), np.copy(lower)
+    for i in range(1, close.shape[1]):
+        keep_upper = close[:, i - 1] <= final_upper[:, i - 1]
+        final_upper[:, i] = np.where(keep_upper, np.minimum(upper[:, i], final_upper[:, i - 1]), upper[:, i])
+        keep_lower = close[:, i - 1] >= final_lower[:, i - 1]
+        final_lower[:, i] = np.where(keep_lower, np.maximum(lower[:, i], final_lower[:, i - 1]), lower[:, i])
+    raw = np.where(close > final_upper, 1.0, np.where(close < final_lower, -1.0, np.nan))
+    raw[:, 0] = np.where(np.isnan(raw[:, 0]), 1.0, raw[:, 0])
+    idx = np.where(~np.isnan(raw), np.arange(close.shape[1]), 0)
+    np.maximum.accumulate(idx, axis=1, out=idx)
+    return np.take_along_axis(raw, idx, axis=1)
+
+
+def psar_2d(high: np.ndarray, low: np.ndarray, close: np.ndarray,
+            step: float = 0.02, max_step: float = 0.2) -> np.ndarray:
+    """psar() theo từng dòng: cùng hồi quy, mỗi bước cột xử lý mọi dòng một lượt."""
+    out = np.copy(close)  # 2 nến đầu = close
+    rows, cols = close.shape
+    up_trend = np.ones(rows, dtype=bool)
+    af = np.full(rows, step)
+    up_trend_high = high[:, 0].copy()
+    down_trend_low = low[:, 0].copy()
+    for i in range(2, cols):
+        max_high, min_low, prev = high[:, i], low[:, i], out[:, i - 1]
+
+        # Đang tăng
+        sar_up = prev + af * (up_trend_high - prev)
+        reverse_up = up_trend & (min_low < sar_up)
+        stay_up = up_trend & ~reverse_up
+        new_high = stay_up & (max_high > up_trend_high)
+        sar_up = np.where(low[:, i - 2] < sar_up, low[:, i - 2], np.where(low[:, i - 1] < sar_up, low[:, i - 1], sar_up))
+
+        # Đang giảm
+        sar_down = prev - af * (prev - down_trend_low)
+        reverse_down = ~up_trend & (max_high > sar_down)
+        stay_down = ~up_trend & ~reverse_down
+        new_low = stay_down & (min_low < down_trend_low)
+        sar_down = np.where(high[:, i - 2] > sar_down, high[:, i - 2],
+                            np.where(high[:, i - 1] > sar_down, high[:, i - 1], sar_down))
+
+        out[:, i] = np.select(
+            [reverse_up, stay_up, reverse_down], [up_trend_high, sar_up, down_trend_low], sar_down
+        )
+        af = np.where(reverse_up | reverse_down, step,
+                      np.where(new_high | new_low, np.minimum(af + step, max_step), af))
+        up_trend_high = np.where(new_high | reverse_down, max_high, up_trend_high)
+        down_trend_low = np.where(new_low | reverse_up, min_low, down_trend_low)
+        up_trend = (up_trend & ~reverse_up) | reverse_down
+    return out
+
+
+def signal_indicators_2d(high: np.ndarray, low: np.ndarray, close: np.ndarray, volume: np.ndarray) -> dict:
+    """
+    Các chỉ báo generate_signal cần ở nến cuối của mọi symbol, tính một lượt
+    trên ma trận (symbol x nến). Trả về {tên cột: mảng 1 chiều theo symbol}.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        smin = rolling_2d(low, 14, np.min)
+        smax = rolling_2d(high, 14, np.max)
+        stoch_k = 100 * (close - smin) / (smax - smin)
+        stoch_d = rolling_2d(stoch_k, 3, np.mean)
+        macd = ewm_2d(close, 12, span=12) - ewm_2d(close, 26, span=26)
+        macd_signal = ewm_2d(macd, 9, span=9)
+        vol_ma = rolling_2d(volume, 20, np.mean)
+        vol_ratio = volume[:, -1] / vol_ma[:, -1]
+    return {
+        "close": close[:, -1],
+        "rsi": rsi_2d(close, 9)[:, -1],
+        "stoch_k": stoch_k[:, -1],
+        "stoch_d": stoch_d[:, -1],
+        "macd": macd[:, -1],
+        "macd_signal": macd_signal[:, -1],
+        "ema8": ewm_2d(close, 8, span=8)[:, -1],
+        "ema21": ewm_2d(close, 21, span=21)[:, -1],
+        "ema65": ewm_2d(close, 65, span=65)[:, -1],
+        "ema200": ewm_2d(close, 200, span=200)[:, -1],
+        "vol_ratio": vol_ratio,
+    }
+
+
+# -------------------------------
+# Chuỗi 1 chiều dài (cả lịch sử) cho backtest
+# -------------------------------
+def ewm(x, min_periods: int, span: float | None = None, alpha: float | None = None) -> np.ndarray:
+    """pandas `ewm(adjust=False, min_periods=...).mean()` trên một chuỗi, bỏ qua NaN."""
+    a = _ewm_alpha(span, alpha)
+    old_wt = 1.0 - a
+    values = _as_array(x).tolist()
+    out = [np.nan] * len(values)
+    value = np.nan
+    nobs = 0
+    for i, v in enumerate(values):
+        if v == v:  # không phải NaN
+            nobs += 1
+            if value != value:
+                value = v
+            elif value != v:
+                value = (old_wt * value + a * v) / (old_wt + a)
+        if nobs >= min_periods:
+            out[i] = value
+    return np.array(out)
+
+
+def rolling(x, window: int, func) -> np.ndarray:
+    """Cửa sổ trượt (min_periods = window) trên một chuỗi."""
+    return rolling_2d(_as_array(x)[None, :], window, func)[0]
+
+
+def rsi(close, window: int) -> np.ndarray:
+    """RSI như ta.momentum.RSIIndicator (Wilder, nến đầu tính là không đổi)."""
+    close = _as_array(close)
+    diff = np.zeros_like(close)
+    diff[1:] = close[1:] - close[:-1]
+    ema_up = ewm(np.where(diff > 0, diff, 0.0), window, alpha=1 / window)
+    ema_down = ewm(np.where(diff < 0, -diff, 0.0), window, alpha=1 / window)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(ema_down == 0, 100.0, 100 - (100 / (1 + ema_up / ema_down)))
+
+
+# -------------------------------
+# Microbenchmark
+# -------------------------------
+def _random_ohlc(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    close = np.cumprod(1 + rng.normal(0, 0.01, n)) * 0.001
+    open_ = np.r_[close[0], close[:-1]]
+    high = np.maximum(open_, close) * (1 + rng.random(n) * 0.01)
+    low = np.minimum(open_, close) * (1 - rng.random(n) * 0.01)
+    return high, low, close
+
+
+def _reference_supertrend(df, period=10, multiplier=3):
+    """Bản supertrend() cũ dùng .iloc, giữ lại để so kết quả và tốc độ."""
+    import pandas as pd
+    import ta
+
+    hl2 = (df['h'] + df['l']) / 2
+    atr_ = ta.volatility.AverageTrueRange(df['h'], df['l'], df['c'], window=period).average_true_range()
+    upperband = hl2 + (multiplier * atr_)
+    lowerband = hl2 - (multiplier * atr_)
+    final_upperband = upperband.copy()
+    final_lowerband = lowerband.copy()
+    for i in range(1, len(df)):
+        if df['c'].iloc[i-1] <= final_upperband.iloc[i-1]:
+            final_upperband.iloc[i] = min(upperband.iloc[i], final_upperband.iloc[i-1])
+        else:
+            final_upperband.iloc[i] = upperband.iloc[i]
+        if df['c'].iloc[i-1] >= final_lowerband.iloc[i-1]:
+            final_lowerband.iloc[i] = max(lowerband.iloc[i], final_lowerband.iloc[i-1])
+        else:
+            final_lowerband.iloc[i] = lowerband.iloc[i]
+    st = pd.Series(index=df.index, dtype="float64")
+    for i in range(len(df)):
+        if df['c'].iloc[i] > final_upperband.iloc[i]:
+            st.iloc[i] = 1
+        elif df['c'].iloc[i] < final_lowerband.iloc[i]:
+            st.iloc[i] = -1
+        else:
+            st.iloc[i] = st.iloc[i-1] if i > 0 else 1
+    return st
+
+
+def _timeit(fn, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def benchmark(sizes=(200, 10_000, 1_000_000), reference_max: int = 10_000):
+    """In thời gian kernel so với bản ta/.iloc; bản cũ chỉ chạy tới `reference_max` nến."""
+    import pandas as pd
+    import ta
+
+    print(f"{'kernel':<12}{'nến':>10}{'kernel (ms)':>14}{'ta/.iloc (ms)':>16}{'tăng tốc':>11}{'lệch max':>12}")
+    for n in sizes:
+        high, low, close = _random_ohlc(n)
+        df = pd.DataFrame({"h": high, "l": low, "c": close})
+        cases = {
+            "atr": (
+                lambda: atr(high, low, close, 10),
+                lambda: ta.volatility.AverageTrueRange(df['h'], df['l'], df['c'], window=10).average_true_range().values,
+            ),
+            "psar": (
+                lambda: psar(high, low, close),
+                lambda: ta.trend.PSARIndicator(df['h'], df['l'], df['c']).psar().values,
+            ),
+            "supertrend": (
+                lambda: supertrend(high, low, close),
+                lambda: _reference_supertrend(df).values,
+            ),
+        }
+        for name, (fast, ref) in cases.items():
+            t_fast = _timeit(fast)
+            if n <= reference_max:
+                t_ref = _timeit(ref, repeat=1)
+                diff = np.nanmax(np.abs(fast() - ref()))
+                print(f"{name:<12}{n:>10,}{t_fast*1e3:>14.2f}{t_ref*1e3:>16.1f}{t_ref/t_fast:>10.0f}x{diff:>12.1e}")
+            else:
+                print(f"{name:<12}{n:>10,}{t_fast*1e3:>14.2f}{'-':>16}{'-':>11}{'-':>12}")
+
+
+if __name__ == "__main__":
+    # python kernels.py [--full]  (--full: chạy cả bản cũ cho 1M nến, rất lâu)
+    benchmark(reference_max=10**9 if "--full" in sys.argv else 10_000)
@@ -0,0 +1,86 @@
+"""
+Các lệnh nhẹ trả lời được ngay lúc khởi động (/ping, /help, /price): chỉ cần
+telegram + aiohttp, không đụng tới pandas/ta/numpy.
+
+Snapshot "price" (refresher.py) cũng đăng ký ở đây để /price của boot.py
+đọc được trước khi heli_bot nạp xong.
+"""
+import logging
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from clients import get_coingecko, get_mexc
+from refresher import get_refresher
+from users import is_allowed
+
+refresher = get_refresher()
+
+
+async def ping(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await update.message.reply_text("✅ Bot đang hoạt động!")
+
+async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    help_text = """
+📖 Danh sách lệnh khả dụng:
+
+/help - Xem hướng dẫn
+/whoami - Hiển thị ID và quyền của bạn
+/grant <id> - Cấp quyền tạm thời cho user (admin)
+/revoke <id> - Thu hồi tạm thời quyền user (admin)
+/clear - Xóa 50 tin nhắn gần đây
+/showusers - Liệt kê ID được cấp quyền
+/cachestats - Thống kê cache (admin)
+/heliinfo - Tổng quan HELI
+
+/staked - Xem tổng HELI đã staking
+/unstake - Xem tổng HELI đang unstake
+/unbonding_wallets - Xem số ví đang unbonding
+/validator - Danh sách validator & trạng thái jail
+/status - Trạng thái hệ thống
+
+/price - Giá HELI hiện tại
+/supply - Tổng cung HELI
+/apy - Tính APY staking (đã trừ commission)
+/coreteam - Tình trạng các ví Core Team
+
+/heatmap - Chi tiết lượng unstake trong 14 ngày
+/orderbook - Tổng quan cung cầu MUA - BÁN
+/flow [5m|1h|24h] - Biến động M-B (mặc định 1h)
+/detect_doilai - Phát hiện ĐỘI LÁI
+/alert - Cảnh báo Spam lệnh mồi
+/trend - Đánh giá xu hướng HELI
+/signal - Chỉ báo tín hiệu Mua/ Bán
+/scan - Quét tín hiệu các cặp USDT trên MEXC
+"""
+    await update.message.reply_text(help_text)
+
+async def fetch_market_price() -> tuple[float, str]:
+    """(giá USD, nguồn): ưu tiên MEXC, dự phòng CoinGecko."""
+    try:
+        price_usd = await get_mexc().ticker_price("HELIUSDT")
+        if price_usd > 0:
+            return price_usd, "MEXC"
+    except Exception as e:
+        logging.warning(f"Lỗi lấy giá MEXC, chuyển sang CoinGecko: {e}")
+
+    params = {"ids": "heli", "vs_currencies": "usd"}
+    r = await get_coingecko().get_json("/api/v3/simple/price", params=params)
+    price_usd = r.get("heli", {}).get("usd")
+    if not price_usd:
+        raise ValueError("Không lấy được giá HELI từ API.")
+    return float(price_usd), "CoinGecko"
+
+refresher.register("price", fetch_market_price)
+
+async def price(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_allowed(update.effective_user.id):
+        await update.message.reply_text("🚫 Bạn chưa được cấp quyền. Dùng /whoami gửi admin.")
+        return
+    try:
+        price_usd, source = await refresher.value("price")
+        await update.message.reply_text(
+            f"💲 Giá HELI hiện tại ({source}): ${price_usd:,.6f}\n{refresher.freshness('price')}"
+        )
+    except Exception as e:
+        await update.message.reply_text(f"⚠️ Lỗi khi lấy giá: {e}")
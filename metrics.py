@@ -0,0 +1,203 @@
+"""
+Số đo nội bộ của bot, xuất theo định dạng text của Prometheus (route /metrics).
+
+- Counter / Histogram có nhãn, giữ trong bộ nhớ tiến trình.
+- Collector: hàm được gọi lúc scrape để xuất số liệu tức thời (tuổi
+  snapshot, tỷ lệ hit cache, trạng thái orderbook...) mà không phải cập nhật
+  liên tục ở nơi khác.
+"""
+import functools
+import logging
+import re
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_started = time.time()
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra: dict | None = None) -> str:
+    pairs = list(zip(names, values)) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _num(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values = {}  # tuple nhãn -> giá trị
+
+    def labels(self, *values):
+        return _CounterChild(self, tuple(str(v) for v in values))
+
+    def inc(self, value: float = 1.0):
+        self.labels().inc(value)
+
+    def lines(self) -> list[str]:
+        return [f"{self.name}{_labels(self.label_names, k)} {_num(v)}" for k, v in sorted(self._values.items())]
+
+
+class _CounterChild:
+    def __init__(self, parent: Counter, key: tuple):
+        self.parent = parent
+        self.key = key
+
+    def inc(self, value: float = 1.0):
+        values = self.parent._values
+        values[self.key] = values.get(self.key, 0) + value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # tuple nhãn -> [đếm theo bucket..., count, sum]
+
+    def labels(self, *values):
+        return _HistogramChild(self, tuple(str(v) for v in values))
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def lines(self) -> list[str]:
+        out = []
+        for key, series in sorted(self._series.items()):
+            counts, count, total = series[:-2], series[-2], series[-1]
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                out.append(f"{self.name}_bucket{_labels(self.label_names, key, {'le': _num(float(bound))})} {cumulative}")
+            out.append(f"{self.name}_bucket{_labels(self.label_names, key, {'le': '+Inf'})} {count}")
+            out.append(f"{self.name}_count{_labels(self.label_names, key)} {count}")
+            out.append(f"{self.name}_sum{_labels(self.label_names, key)} {_num(total)}")
+        return out
+
+
+class _HistogramChild:
+    def __init__(self, parent: Histogram, key: tuple):
+        self.parent = parent
+        self.key = key
+
+    def observe(self, value: float):
+        p = self.parent
+        series = p._series.get(self.key)
+        if series is None:
+            series = p._series[self.key] = [0] * len(p.buckets) + [0, 0.0]
+        for i, bound in enumerate(p.buckets):
+            if value <= bound:
+                series[i] += 1
+                break
+        series[-2] += 1
+        series[-1] += value
+
+
+_metrics = []
+_collectors = []
+
+
+def counter(name: str, help: str, labels=()) -> Counter:
+    metric = Counter(name, help, labels)
+    _metrics.append(metric)
+    return metric
+
+
+def histogram(name: str, help: str, labels=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+    metric = Histogram(name, help, labels, buckets)
+    _metrics.append(metric)
+    return metric
+
+
+def register_collector(fn):
+    """
+    `fn()` trả về list (tên, kiểu, mô tả, [(dict nhãn, giá trị), ...]),
+    được gọi mỗi lần scrape.
+    """
+    _collectors.append(fn)
+    return fn
+
+
+def render() -> str:
+    lines = []
+    for metric in _metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines += metric.lines()
+    families = [("heli_uptime_seconds", "gauge", "Số giây từ khi tiến trình khởi động",
+                 [({}, time.time() - _started)])]
+    for fn in _collectors:
+        try:
+            families += fn()
+        except Exception as e:
+            logging.warning(f"[metrics] Lỗi collector {getattr(fn, '__name__', fn)}: {e}")
+    for name, kind, help, samples in families:
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            if value is None:
+                continue
+            lines.append(f"{name}{_labels(labels.keys(), labels.values())} {_num(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# --- Số đo dùng chung ---
+COMMAND_SECONDS = histogram("heli_command_duration_seconds", "Thời gian xử lý lệnh Telegram", ("command",))
+COMMANDS = counter("heli_commands_total", "Số lệnh Telegram đã xử lý", ("command", "status"))
+UPSTREAM_SECONDS = histogram(
+    "heli_upstream_request_duration_seconds", "Thời gian gọi upstream HTTP", ("upstream", "endpoint")
+)
+UPSTREAM_REQUESTS = counter(
+    "heli_upstream_requests_total", "Số request upstream HTTP theo kết quả", ("upstream", "endpoint", "status")
+)
+UPSTREAM_BYTES = counter("heli_upstream_response_bytes_total", "Byte nhận từ upstream", ("upstream", "endpoint"))
+LOOP_SECONDS = histogram("heli_loop_iteration_seconds", "Thời gian một vòng của task nền", ("loop",))
+
+# Địa chỉ ví / validator / số trong path gộp về một nhãn để không nổ số series
+_PATH_IDS = [
+    (re.compile(r"helivaloper1[0-9a-z]+"), "{valoper}"),
+    (re.compile(r"heli1[0-9a-z]+"), "{address}"),
+    (re.compile(r"/\d+(?=/|$)"), "/{n}"),
+]
+
+
+def endpoint_label(path: str) -> str:
+    path = path.split("?", 1)[0]
+    for pattern, repl in _PATH_IDS:
+        path = pattern.sub(repl, path)
+    return path
+
+
+def instrument_command(command: str, callback):
+    """Bọc handler để đo thời gian và đếm lệnh (status ok/error)."""
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        started = time.perf_counter()
+        status = "ok"
+        try:
+            return await callback(update, context)
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            COMMAND_SECONDS.labels(command).observe(time.perf_counter() - started)
+            COMMANDS.labels(command, status).inc()
+    return wrapper
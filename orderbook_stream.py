@@ -0,0 +1,410 @@
+"""
+Orderbook HELIUSDT cục bộ, duy trì từ luồng diff-depth websocket của MEXC.
+
+Quy trình đồng bộ (theo tài liệu MEXC):
+1. Subscribe kênh depth, đệm các update nhận được.
+2. Lấy snapshot REST /api/v3/depth (lastUpdateId).
+3. Bỏ update có version <= lastUpdateId, áp dụng phần còn lại theo thứ tự.
+4. Version không liên tục (gap) -> lấy lại snapshot.
+
+Có thể ghi luồng ra file JSONL (ORDERBOOK_RECORD) và replay lại khi test.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+
+import aiohttp
+import numpy as np
+
+from clients import MEXC_WS_ENDPOINT, MexcClient, get_mexc
+
+ORDERBOOK_SYMBOL = os.getenv("ORDERBOOK_SYMBOL", "HELIUSDT")
+ORDERBOOK_STREAM = os.getenv("ORDERBOOK_STREAM", "1") == "1"
+ORDERBOOK_CHANNEL = os.getenv("ORDERBOOK_CHANNEL", "spot@public.increase.depth.v3.api@{symbol}")
+ORDERBOOK_SNAPSHOT_LIMIT = int(os.getenv("ORDERBOOK_SNAPSHOT_LIMIT", 1000))
+ORDERBOOK_RECORD = os.getenv("ORDERBOOK_RECORD", "")  # file JSONL ghi lại luồng để replay
+ORDERBOOK_WALL = float(os.getenv("ORDERBOOK_WALL", 1_000_000))  # KL tối thiểu của "tường" (HELI)
+PING_INTERVAL = 20    # giây; MEXC ngắt kết nối nếu không có PING
+RECONNECT_DELAY = 5   # giây
+
+
+@dataclass
+class DepthUpdate:
+    first: int   # version đầu (bằng `last` với kênh increase.depth)
+    last: int
+    bids: list   # [(giá, KL)], KL = 0 là xoá mức giá
+    asks: list
+
+
+def _levels(raw) -> list[tuple[float, float]]:
+    """[["giá", "KL"], ...] (REST) hoặc [{"p": .., "v": ..}, ...] (websocket)."""
+    out = []
+    for lv in raw or []:
+        if isinstance(lv, dict):
+            out.append((float(lv["p"]), float(lv["v"])))
+        else:
+            out.append((float(lv[0]), float(lv[1])))
+    return out
+
+
+def parse_depth_message(msg: dict) -> DepthUpdate | None:
+    """Update từ message websocket; None nếu là message khác (ack, PONG...)."""
+    d = msg.get("d") or msg.get("publicAggreDepths") or msg.get("publicIncreaseDepths")
+    if not isinstance(d, dict):
+        return None
+    if "r" in d:
+        first = last = int(d["r"])
+    elif "fromVersion" in d:
+        first, last = int(d["fromVersion"]), int(d["toVersion"])
+    else:
+        return None
+    return DepthUpdate(first, last, _levels(d.get("bids")), _levels(d.get("asks")))
+
+
+class BookSide:
+    """
+    Một phía của book: mảng giá tăng dần, KL tương ứng và tổng cộng dồn KL.
+    Tổng cộng dồn chỉ tính lại từ vị trí thay đổi đầu tiên, khi có truy vấn.
+    Chỉ mục `walls` giữ các mức giá có KL >= `wall_threshold`.
+    """
+
+    def __init__(self, descending: bool, wall_threshold: float = 0):
+        self.descending = descending  # bids: giá tốt nhất là giá cao nhất
+        self.wall_threshold = wall_threshold
+        self.prices = np.empty(0)
+        self.qty = np.empty(0)
+        self._cum = np.empty(0)
+        self._dirty = None            # vị trí đầu tiên mà _cum chưa đúng
+        self.walls = np.empty(0)      # giá của các mức >= wall_threshold (tăng dần)
+
+    def load(self, levels: list[tuple[float, float]]):
+        levels = sorted((p, q) for p, q in levels if q > 0)
+        arr = np.array(levels, dtype=np.float64).reshape(-1, 2)
+        self.prices = np.ascontiguousarray(arr[:, 0])
+        self.qty = np.ascontiguousarray(arr[:, 1])
+        self._dirty = 0
+        self.walls = self.prices[self.qty >= self.wall_threshold] if self.wall_threshold else np.empty(0)
+
+    def set(self, price: float, qty: float):
+        i = int(np.searchsorted(self.prices, price))
+        exists = i < len(self.prices) and self.prices[i] == price
+        if qty > 0 and exists:
+            self.qty[i] = qty
+        elif qty > 0:
+            self.prices = np.insert(self.prices, i, price)
+            self.qty = np.insert(self.qty, i, qty)
+        elif exists:
+            self.prices = np.delete(self.prices, i)
+            self.qty = np.delete(self.qty, i)
+        else:
+            return
+        self._dirty = i if self._dirty is None else min(self._dirty, i)
+        if self.wall_threshold:
+            self._set_wall(price, qty >= self.wall_threshold)
+
+    def _set_wall(self, price: float, is_wall: bool):
+        j = int(np.searchsorted(self.walls, price))
+        present = j < len(self.walls) and self.walls[j] == price
+        if is_wall and not present:
+            self.walls = np.insert(self.walls, j, price)
+        elif not is_wall and present:
+            self.walls = np.delete(self.walls, j)
+
+    def cum(self) -> np.ndarray:
+        if self._dirty is not None:
+            i = self._dirty
+            if i == 0 or len(self._cum) < i:
+                self._cum = np.cumsum(self.qty)
+            else:
+                self._cum = np.concatenate((self._cum[:i], self._cum[i - 1] + np.cumsum(self.qty[i:])))
+            self._dirty = None
+        return self._cum
+
+    def __len__(self) -> int:
+        return len(self.prices)
+
+    def as_dict(self) -> dict:
+        return dict(zip(self.prices.tolist(), self.qty.tolist()))
+
+    def _sum(self, i: int, j: int) -> float:
+        """Tổng KL các mức [i, j) theo chỉ số mảng tăng dần."""
+        if j <= i:
+            return 0.0
+        cum = self.cum()
+        return float(cum[j - 1] - (cum[i - 1] if i > 0 else 0.0))
+
+    def _range(self, lo: float, hi: float) -> tuple[int, int]:
+        return int(np.searchsorted(self.prices, lo, "left")), int(np.searchsorted(self.prices, hi, "right"))
+
+    def best(self) -> float | None:
+        if not len(self.prices):
+            return None
+        return float(self.prices[-1] if self.descending else self.prices[0])
+
+    def top(self, n: int | None = None) -> list[tuple[float, float]]:
+        n = len(self.prices) if n is None else min(n, len(self.prices))
+        if self.descending:
+            p, q = self.prices[len(self.prices) - n:][::-1], self.qty[len(self.prices) - n:][::-1]
+        else:
+            p, q = self.prices[:n], self.qty[:n]
+        return list(zip(p.tolist(), q.tolist()))
+
+    def total(self, n: int | None = None) -> float:
+        size = len(self.prices)
+        n = size if n is None else min(n, size)
+        return self._sum(size - n, size) if self.descending else self._sum(0, n)
+
+    def volume_in_range(self, lo: float, hi: float) -> float:
+        return self._sum(*self._range(lo, hi))
+
+    def levels_in_range(self, lo: float, hi: float, min_qty: float = 0) -> list[tuple[float, float]]:
+        """Các mức trong [lo, hi] có KL >= min_qty, giá tốt nhất trước."""
+        if self.wall_threshold and min_qty == self.wall_threshold:
+            a, b = np.searchsorted(self.walls, lo, "left"), np.searchsorted(self.walls, hi, "right")
+            prices = self.walls[a:b]
+            qty = self.qty[np.searchsorted(self.prices, prices)]
+        else:
+            i, j = self._range(lo, hi)
+            prices, qty = self.prices[i:j], self.qty[i:j]
+            mask = qty >= min_qty
+            prices, qty = prices[mask], qty[mask]
+        if self.descending:
+            prices, qty = prices[::-1], qty[::-1]
+        return list(zip(prices.tolist(), qty.tolist()))
+
+
+class OrderBook:
+    """Hai phía bids/asks (BookSide); các truy vấn trả về (giá, KL) theo thứ tự tốt nhất trước."""
+
+    def __init__(self, symbol: str = ORDERBOOK_SYMBOL, wall_threshold: float = ORDERBOOK_WALL):
+        self.symbol = symbol
+        self.version = None
+        self.bids = BookSide(descending=True, wall_threshold=wall_threshold)
+        self.asks = BookSide(descending=False, wall_threshold=wall_threshold)
+        self.updated_at = 0.0
+
+    def load_snapshot(self, data: dict):
+        self.bids.load(_levels(data.get("bids")))
+        self.asks.load(_levels(data.get("asks")))
+        self.version = int(data.get("lastUpdateId") or 0)
+        self.updated_at = time.time()
+
+    def apply(self, upd: DepthUpdate):
+        for side, levels in ((self.bids, upd.bids), (self.asks, upd.asks)):
+            for price, qty in levels:
+                side.set(price, qty)
+        self.version = upd.last
+        self.updated_at = time.time()
+
+    def _side(self, side: str) -> BookSide:
+        return self.bids if side == "bids" else self.asks
+
+    def top(self, side: str, n: int | None = None) -> list[tuple[float, float]]:
+        return self._side(side).top(n)
+
+    def best(self, side: str) -> float | None:
+        return self._side(side).best()
+
+    def mid(self) -> float | None:
+        bid, ask = self.best("bids"), self.best("asks")
+        return (bid + ask) / 2 if bid is not None and ask is not None else None
+
+    def total(self, side: str, n: int | None = None) -> float:
+        return self._side(side).total(n)
+
+    def volume_in_range(self, side: str, lo: float, hi: float) -> float:
+        return self._side(side).volume_in_range(lo, hi)
+
+    def levels_in_range(self, side: str, lo: float, hi: float, min_qty: float = 0) -> list[tuple[float, float]]:
+        return self._side(side).levels_in_range(lo, hi, min_qty)
+
+    def walls(self, side: str, lo: float, hi: float) -> list[tuple[float, float]]:
+        """Các mức KL >= ORDERBOOK_WALL trong [lo, hi]."""
+        return self._side(side).levels_in_range(lo, hi, self._side(side).wall_threshold)
+
+    def to_depth(self, n: int) -> dict:
+        return {"bids": self.top("bids", n), "asks": self.top("asks", n)}
+
+
+class OrderBookStream:
+    def __init__(self, symbol: str = ORDERBOOK_SYMBOL, mexc: MexcClient | None = None,
+                 url: str = MEXC_WS_ENDPOINT, record_path: str = ORDERBOOK_RECORD):
+        self.symbol = symbol
+        self.mexc = mexc or get_mexc()
+        self.url = url
+        self.record_path = record_path
+        self.book = OrderBook(symbol)
+        self.synced = False
+        self.connected = False
+        self.messages = 0
+        self.resyncs = 0
+        self.gaps = 0
+        self._buffer = []            # update chờ snapshot
+        self._resync_task = None
+        self._record = None
+
+    def is_live(self) -> bool:
+        return self.connected and self.synced
+
+    # --- Xử lý update / snapshot (dùng chung cho live và replay) ---
+    def _gap(self, upd: DepthUpdate):
+        self.gaps += 1
+        logging.warning(
+            f"[orderbook] Mất update {self.symbol}: version {self.book.version} -> {upd.first}, đồng bộ lại"
+        )
+        self.synced = False
+        self._buffer = [upd]
+
+    def on_update(self, upd: DepthUpdate) -> bool:
+        """Áp dụng update; trả về False nếu book cần snapshot mới."""
+        if not self.synced:
+            self._buffer.append(upd)
+            return False
+        if upd.last <= self.book.version:
+            return True  # đã có trong snapshot
+        if upd.first > self.book.version + 1:
+            self._gap(upd)
+            return False
+        self.book.apply(upd)
+        return True
+
+    def on_snapshot(self, data: dict):
+        self.book.load_snapshot(data)
+        self.synced = True
+        buffered, self._buffer = self._buffer, []
+        for i, upd in enumerate(buffered):
+            if not self.on_update(upd):
+                # snapshot cũ hơn update đầu trong đệm: giữ phần còn lại, chờ snapshot sau
+                self._buffer.extend(buffered[i + 1:])
+                break
+
+    def handle_message(self, msg: dict) -> bool:
+        self._write({"t": time.time(), "msg": msg})
+        upd = parse_depth_message(msg)
+        if upd is None:
+            return True
+        self.messages += 1
+        return self.on_update(upd)
+
+    # --- Ghi / replay ---
+    def _write(self, record: dict):
+        if not self.record_path:
+            return
+        if self._record is None:
+            self._record = open(self.record_path, "a", encoding="utf-8")
+        self._record.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self._record.flush()  # replay đọc được tới dòng cuối kể cả khi bot bị dừng đột ngột
+
+    def close(self):
+        """Đóng file ghi (gọi khi task stream bị huỷ lúc dừng bot)."""
+        if self._record is not None:
+            self._record.close()
+            self._record = None
+
+    def replay(self, path: str) -> int:
+        """Replay file JSONL đã ghi (dòng "snapshot" hoặc "msg"). Trả về số update đã đọc."""
+        count = 0
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if "snapshot" in record:
+                    self.on_snapshot(record["snapshot"])
+                    continue
+                upd = parse_depth_message(record.get("msg") or {})
+                if upd is not None:
+                    self.on_update(upd)
+                    count += 1
+        return count
+
+    # --- Live ---
+    async def resync(self):
+        data = await self.mexc.depth(self.symbol, ORDERBOOK_SNAPSHOT_LIMIT)
+        self.resyncs += 1
+        self._write({"t": time.time(), "snapshot": data})
+        self.on_snapshot(data)
+        logging.info(f"[orderbook] Snapshot {self.symbol} version {self.book.version}")
+
+    def _schedule_resync(self):
+        if self._resync_task is None or self._resync_task.done():
+            self._resync_task = asyncio.create_task(self._resync_until_synced())
+
+    async def _resync_until_synced(self):
+        while not self.synced:
+            try:
+                await self.resync()
+            except Exception as e:
+                logging.warning(f"[orderbook] Lỗi lấy snapshot {self.symbol}: {e}")
+            if not self.synced:
+                await asyncio.sleep(1)
+
+    async def _ping(self, ws):
+        while True:
+            await asyncio.sleep(PING_INTERVAL)
+            await ws.send_json({"method": "PING"})
+
+    async def _session(self):
+        async with self.mexc.ws_connect(self.url, heartbeat=None) as ws:
+            channel = ORDERBOOK_CHANNEL.format(symbol=self.symbol)
+            await ws.send_json({"method": "SUBSCRIPTION", "params": [channel]})
+            self.connected = True
+            self.synced = False
+            self._buffer = []
+            self._schedule_resync()
+            pinger = asyncio.create_task(self._ping(ws))
+            try:
+                async for m in ws:
+                    if m.type == aiohttp.WSMsgType.TEXT:
+                        if not self.handle_message(json.loads(m.data)):
+                            self._schedule_resync()
+                    elif m.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                        break
+            finally:
+                pinger.cancel()
+                self.connected = False
+
+    async def run(self):
+        try:
+            while True:
+                try:
+                    await self._session()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logging.warning(f"[orderbook] Mất kết nối websocket MEXC: {e}")
+                finally:
+                    self.connected = False
+                    if self._resync_task is not None:
+                        self._resync_task.cancel()
+                await asyncio.sleep(RECONNECT_DELAY)
+        finally:
+            self.close()
+
+
+_stream: OrderBookStream | None = None
+
+
+def get_orderbook_stream() -> OrderBookStream:
+    global _stream
+    if _stream is None:
+        _stream = OrderBookStream()
+    return _stream
+
+
+async def read_book(limit: int = 500) -> OrderBook:
+    """Book cục bộ nếu đang đồng bộ; ngược lại snapshot REST `limit` mức giá."""
+    stream = get_orderbook_stream()
+    if stream.is_live():
+        return stream.book
+    book = OrderBook(stream.symbol)
+    book.load_snapshot(await stream.mexc.depth(stream.symbol, limit))
+    return book
+
+
+async def run_orderbook_stream():
+    logging.info(f"📚 Orderbook {ORDERBOOK_SYMBOL} theo websocket MEXC đã khởi động nền...")
+    await get_orderbook_stream().run()
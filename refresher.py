@@ -0,0 +1,187 @@
+"""
+Làm mới nền các snapshot dữ liệu (chain, validator, unbonding, giá,
+orderbook, tín hiệu) theo lịch riêng của từng loại.
+
+Handler đọc snapshot mới nhất thay vì gọi LCD/MEXC nên trả lời ngay, và
+tải lên upstream cố định theo lịch dù có bao nhiêu user. Mỗi snapshot có
+version (tăng sau mỗi lần làm mới thành công) và thời điểm lấy để handler
+hiển thị tuổi dữ liệu.
+
+Lịch mặc định ở REFRESH_DEFAULTS, ghi đè bằng biến môi trường
+REFRESH_INTERVALS, ví dụ "price=5,chain=60" (giây).
+"""
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+
+from metrics import LOOP_SECONDS
+
+REFRESH_DEFAULTS = {  # giây giữa 2 lần làm mới
+    "chain": 30,
+    "validators": 60,
+    "unbonding": 30,
+    "price": 10,
+    "book": 15,
+    "signal": 60,
+    "coreteam": 300,
+    "transfers": 300,
+}
+
+
+def _parse_intervals(raw: str) -> dict:
+    out = {}
+    for part in raw.split(","):
+        name, _, value = part.partition("=")
+        if name.strip() and value.strip():
+            out[name.strip()] = float(value)
+    return out
+
+
+REFRESH_INTERVALS = {**REFRESH_DEFAULTS, **_parse_intervals(os.getenv("REFRESH_INTERVALS", ""))}
+
+
+def format_age(seconds: float) -> str:
+    if seconds < 60:
+        return f"{seconds:.0f}s"
+    if seconds < 3600:
+        return f"{seconds / 60:.0f} phút"
+    return f"{seconds / 3600:.1f} giờ"
+
+
+@dataclass
+class Snapshot:
+    name: str
+    value: Any
+    version: int
+    taken_at: float  # time.time()
+
+    def age(self) -> float:
+        return max(0.0, time.time() - self.taken_at)
+
+
+class Refresher:
+    def __init__(self, intervals: dict | None = None):
+        self.intervals = dict(REFRESH_INTERVALS if intervals is None else intervals)
+        self._jobs = {}        # name -> coroutine function trả về giá trị mới
+        self._snapshots = {}   # name -> Snapshot
+        self._inflight = {}    # name -> asyncio.Future
+        self._idle = {}        # name -> (live(), giây giữa 2 lần làm mới khi không live)
+        self.errors = {}       # name -> (thời điểm, lỗi gần nhất)
+        self.refreshes = {}    # name -> số lần làm mới thành công
+
+    def register(self, name: str, fetch: Callable[[], Awaitable[Any]], interval: float | None = None,
+                 live: Callable[[], bool] | None = None, idle_interval: float | None = None):
+        """
+        `live`: nguồn rẻ có sẵn không (vd. tracker theo block). Khi live() là
+        False, chỉ làm mới lại sau `idle_interval` giây (fetch lúc đó tốn upstream).
+        """
+        self._jobs[name] = fetch
+        if interval is not None:
+            self.intervals[name] = interval
+        self.intervals.setdefault(name, 60)
+        if live is not None:
+            self._idle[name] = (live, idle_interval or 30 * 60)
+
+    def names(self) -> list[str]:
+        return list(self._jobs)
+
+    def get(self, name: str) -> Snapshot | None:
+        return self._snapshots.get(name)
+
+    def put(self, name: str, value, taken_at: float | None = None) -> Snapshot:
+        """Ghi snapshot mới (version + 1)."""
+        old = self._snapshots.get(name)
+        snap = Snapshot(name, value, (old.version if old else 0) + 1,
+                        time.time() if taken_at is None else taken_at)
+        self._snapshots[name] = snap
+        return snap
+
+    def clear(self):
+        """Bỏ mọi snapshot (bench đo từng lệnh từ trạng thái lạnh)."""
+        self._snapshots.clear()
+
+    def restore(self, snap: Snapshot):
+        """Nạp lại snapshot đã lưu (khởi động lại bot)."""
+        self._snapshots[snap.name] = snap
+
+    async def refresh(self, name: str) -> Snapshot:
+        """Làm mới ngay; các lệnh gọi trùng lúc đó chờ chung một lần fetch."""
+        future = self._inflight.get(name)
+        if future is None:
+            future = asyncio.ensure_future(self._fetch(name))
+            self._inflight[name] = future
+            future.add_done_callback(lambda _: self._inflight.pop(name, None))
+        return await asyncio.shield(future)
+
+    async def _fetch(self, name: str) -> Snapshot:
+        try:
+            value = await self._jobs[name]()
+        except Exception as e:
+            self.errors[name] = (time.time(), str(e))
+            raise
+        self.refreshes[name] = self.refreshes.get(name, 0) + 1
+        return self.put(name, value)
+
+    async def read(self, name: str) -> Snapshot:
+        """Snapshot hiện có (dù cũ); chỉ fetch trực tiếp khi chưa có lần nào."""
+        snap = self._snapshots.get(name)
+        return snap if snap is not None else await self.refresh(name)
+
+    async def value(self, name: str):
+        return (await self.read(name)).value
+
+    def freshness(self, *names: str) -> str:
+        """Dòng hiển thị tuổi của snapshot cũ nhất trong `names`."""
+        ages = [s.age() for s in map(self.get, names) if s is not None]
+        return f"🕒 Dữ liệu cập nhật {format_age(max(ages))} trước" if ages else ""
+
+    def _due(self, name: str) -> bool:
+        idle = self._idle.get(name)
+        if idle is None:
+            return True
+        live, idle_interval = idle
+        snap = self._snapshots.get(name)
+        return live() or snap is None or snap.age() >= idle_interval
+
+    async def _loop(self, name: str):
+        while True:
+            started = time.monotonic()
+            try:
+                if self._due(name):
+                    await self.refresh(name)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.warning(f"[refresher] Lỗi làm mới {name}: {e}")
+            elapsed = time.monotonic() - started
+            LOOP_SECONDS.labels(f"refresh:{name}").observe(elapsed)
+            await asyncio.sleep(max(0.0, self.intervals[name] - elapsed))
+
+    async def run(self):
+        logging.info(
+            "♻️ Làm mới snapshot nền: "
+            + ", ".join(f"{n} {self.intervals[n]:.0f}s" for n in self._jobs)
+        )
+        await asyncio.gather(*(self._loop(name) for name in self._jobs))
+
+    def summary(self) -> str:
+        lines = ["♻️ Snapshot nền:"]
+        for name in self._jobs:
+            snap = self._snapshots.get(name)
+            state = f"v{snap.version}, {format_age(snap.age())} trước" if snap else "chưa có"
+            line = f"• {name} (mỗi {self.intervals[name]:.0f}s): {state}, {self.refreshes.get(name, 0)} lần làm mới"
+            err = self.errors.get(name)
+            if err and (snap is None or err[0] > snap.taken_at):
+                line += f" ⚠️ {err[1][:80]}"
+            lines.append(line)
+        return "\n".join(lines)
+
+
+_refresher = Refresher()
+
+
+def get_refresher() -> Refresher:
+    return _refresher
@@ -0,0 +1,218 @@
+"""
+Quét tín hiệu trên nhiều cặp USDT của MEXC.
+
+- Danh sách cặp lấy từ SCAN_SYMBOLS (phân tách bằng dấu phẩy) hoặc
+  /api/v3/defaultSymbols, giới hạn SCAN_MAX_SYMBOLS.
+- Nến tải song song qua kho nến (chỉ tải phần mới), giữ trong ngân sách
+  request weight của MEXC bằng token bucket.
+- Chỉ báo tính một lượt trên ma trận (symbol x nến), chấm điểm như
+  generate_signal rồi xếp hạng và chỉ giữ các cặp biến động mạnh nhất.
+"""
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+
+import kernels
+from candle_store import CandleStore, get_candle_store
+from clients import MexcClient, get_mexc
+from fanout import ScanStats, scan_paginated
+from scoring import classify_signal, signal_scores
+
+SCAN_SYMBOLS = [s.strip().upper() for s in os.getenv("SCAN_SYMBOLS", "").split(",") if s.strip()]
+SCAN_MAX_SYMBOLS = int(os.getenv("SCAN_MAX_SYMBOLS", 300))
+SCAN_INTERVAL = os.getenv("SCAN_INTERVAL", "15m")
+SCAN_CANDLES = int(os.getenv("SCAN_CANDLES", 300))       # đủ cho EMA200
+SCAN_TOP_N = int(os.getenv("SCAN_TOP_N", 5))
+SCAN_CONCURRENCY = int(os.getenv("SCAN_CONCURRENCY", 16))
+MEXC_WEIGHT_PER_SEC = float(os.getenv("MEXC_WEIGHT_PER_SEC", 40))  # MEXC: 500 weight / 10s mỗi IP
+MEXC_WEIGHT_BURST = float(os.getenv("MEXC_WEIGHT_BURST", 100))
+KLINES_WEIGHT = 1
+UNIVERSE_TTL = 6 * 3600  # giây
+CHANGE_BARS = 4          # % thay đổi tính trên 4 nến cuối
+
+
+class WeightBudget:
+    """Token bucket theo request weight; `acquire` chờ tới khi đủ weight."""
+
+    def __init__(self, rate: float = MEXC_WEIGHT_PER_SEC, burst: float = MEXC_WEIGHT_BURST):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.waited = 0.0  # tổng thời gian đã phải chờ (giây)
+
+    def _reserve(self, weight: float) -> float:
+        """Trừ weight (có thể âm) và trả về số giây cần chờ."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= weight
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    async def acquire(self, weight: float = 1):
+        delay = self._reserve(weight)
+        if delay > 0:
+            self.waited += delay
+            await asyncio.sleep(delay)
+
+
+class BudgetedMexc:
+    """Bọc MexcClient: mỗi lệnh gọi klines trừ weight trước khi gửi."""
+
+    def __init__(self, mexc: MexcClient, budget: WeightBudget):
+        self.mexc = mexc
+        self.budget = budget
+        self.requests = 0
+
+    async def klines(self, *args, **kwargs) -> list:
+        await self.budget.acquire(KLINES_WEIGHT)
+        self.requests += 1
+        return await self.mexc.klines(*args, **kwargs)
+
+
+_budget = WeightBudget()
+_universe = ([], 0.0)  # (danh sách cặp, thời điểm lấy)
+
+
+async def load_universe(mexc: MexcClient | None = None) -> list[str]:
+    """SCAN_SYMBOLS nếu có, ngược lại các cặp USDT từ defaultSymbols (cache 6 giờ)."""
+    global _universe
+    if SCAN_SYMBOLS:
+        return SCAN_SYMBOLS[:SCAN_MAX_SYMBOLS]
+    symbols, fetched_at = _universe
+    if not symbols or time.time() - fetched_at > UNIVERSE_TTL:
+        await _budget.acquire(1)
+        data = await (mexc or get_mexc()).default_symbols()
+        symbols = sorted(s for s in data if s.endswith("USDT"))
+        _universe = (symbols, time.time())
+    return symbols[:SCAN_MAX_SYMBOLS]
+
+
+@dataclass
+class ScanResult:
+    symbol: str
+    signal: str
+    buy_score: int
+    sell_score: int
+    price: float
+    change_pct: float
+    vol_ratio: float
+    rsi: float
+
+    @property
+    def strength(self) -> int:
+        return abs(self.buy_score - self.sell_score)
+
+    def is_neutral(self) -> bool:
+        return self.signal.startswith("⚪")
+
+
+@dataclass
+class ScanReport:
+    interval: str
+    universe: int
+    results: list = field(default_factory=list)   # ScanResult của mọi cặp đủ dữ liệu
+    ranked: list = field(default_factory=list)    # các cặp có tín hiệu, mạnh nhất trước
+    stats: ScanStats | None = None
+    requests: int = 0
+    fetch_time: float = 0.0
+    compute_time: float = 0.0
+    elapsed: float = 0.0
+
+    def top(self, n: int = SCAN_TOP_N) -> list:
+        return self.ranked[:n]
+
+    def format(self, n: int = SCAN_TOP_N) -> str:
+        lines = [f"🛰 Quét {self.universe} cặp USDT ({self.interval}) trong {self.elapsed:.1f}s"]
+        top = self.top(n)
+        if not top:
+            lines.append("⚪ Không có cặp nào có tín hiệu rõ.")
+        for i, r in enumerate(top, 1):
+            vol = f"{r.vol_ratio:.1f}" if np.isfinite(r.vol_ratio) else "-"
+            lines.append(
+                f"{i}. {r.symbol}: {r.signal} (MUA {r.buy_score}/BÁN {r.sell_score}) | "
+                f"{r.change_pct:+.2f}% | RSI {r.rsi:.0f} | vol x{vol}"
+            )
+        failed = len(self.stats.failures) if self.stats else 0
+        lines.append(
+            f"⏱ Tải nến {self.fetch_time:.1f}s ({self.requests} request, {failed} lỗi) | "
+            f"tính chỉ báo {self.compute_time*1000:.0f}ms"
+        )
+        return "\n".join(lines)
+
+
+def rank(results: list) -> list:
+    """Bỏ tín hiệu trung lập; xếp theo chênh lệch điểm, rồi khối lượng đột biến, rồi % biến động."""
+    def key(r):
+        vol = r.vol_ratio if np.isfinite(r.vol_ratio) else 0.0
+        return (r.strength, vol, abs(r.change_pct))
+    return sorted((r for r in results if not r.is_neutral()), key=key, reverse=True)
+
+
+def score_batch(symbols: list, candles: dict, length: int = SCAN_CANDLES) -> list:
+    """Chỉ báo + điểm cho mọi symbol có đủ nến (>= 50)."""
+    symbols = [s for s in symbols if len(candles.get(s) or []) >= 50]
+    if not symbols:
+        return []
+    cols = [np.array([row[1:6] for row in candles[s]], dtype=np.float64) for s in symbols]
+    high = kernels.stack_right([c[:, 1] for c in cols], length)
+    low = kernels.stack_right([c[:, 2] for c in cols], length)
+    close = kernels.stack_right([c[:, 3] for c in cols], length)
+    volume = kernels.stack_right([c[:, 4] for c in cols], length)
+    ind = kernels.signal_indicators_2d(high, low, close, volume)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        change = (close[:, -1] / close[:, -1 - CHANGE_BARS] - 1) * 100
+
+    results = []
+    for i, symbol in enumerate(symbols):
+        row = {k: float(v[i]) for k, v in ind.items()}
+        buy, sell = signal_scores(row)
+        signal, _ = classify_signal(buy, sell)
+        results.append(ScanResult(
+            symbol=symbol, signal=signal, buy_score=buy, sell_score=sell,
+            price=row["close"], change_pct=float(np.nan_to_num(change[i])),
+            vol_ratio=row["vol_ratio"], rsi=row["rsi"],
+        ))
+    return results
+
+
+async def scan_market(
+    symbols: list | None = None,
+    interval: str = SCAN_INTERVAL,
+    candles: int = SCAN_CANDLES,
+    mexc: MexcClient | None = None,
+    store: CandleStore | None = None,
+) -> ScanReport:
+    started = time.perf_counter()
+    mexc = mexc or get_mexc()
+    store = store or get_candle_store()
+    symbols = symbols or await load_universe(mexc)
+    budgeted = BudgetedMexc(mexc, _budget)
+
+    async def fetch(symbol, _page_key):
+        return await store.sync(symbol, interval, candles, mexc=budgeted)
+
+    pages, stats = await scan_paginated(
+        symbols, fetch, name=f"scan {interval}",
+        concurrency=SCAN_CONCURRENCY, next_key=lambda _: None,
+    )
+    fetched = time.perf_counter()
+
+    results = score_batch(symbols, {s: p[0] for s, p in pages.items()}, candles)
+    computed = time.perf_counter()
+
+    report = ScanReport(
+        interval=interval, universe=len(symbols), results=results, ranked=rank(results),
+        stats=stats, requests=budgeted.requests,
+        fetch_time=fetched - started, compute_time=computed - fetched, elapsed=computed - started,
+    )
+    logging.info(
+        f"[scanner] {len(symbols)} cặp, {len(report.ranked)} có tín hiệu, "
+        f"{report.requests} request trong {report.elapsed:.2f}s (chờ weight {_budget.waited:.1f}s)"
+    )
+    return report
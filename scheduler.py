@@ -0,0 +1,105 @@
+"""
+Lịch chạy theo giờ đóng nến MEXC cho auto-signal.
+
+Chạy trên event loop của Application: tính thời điểm đóng nến kế tiếp của
+từng khung (theo giờ server MEXC), ngủ tới lúc đó + SIGNAL_CLOSE_GRACE rồi
+gọi callback với các khung vừa đóng nến.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict, deque
+
+from candle_store import INTERVAL_MS
+from clients import MexcClient, get_mexc
+from metrics import LOOP_SECONDS
+
+SIGNAL_CLOSE_GRACE = float(os.getenv("SIGNAL_CLOSE_GRACE", 2))  # giây chờ MEXC chốt nến
+CLOCK_SYNC_INTERVAL = 3600  # giây giữa 2 lần đồng bộ giờ MEXC
+
+
+class MexcClock:
+    """Giờ server MEXC = giờ máy + offset (đo qua /api/v3/time)."""
+
+    def __init__(self, mexc: MexcClient | None = None):
+        self.mexc = mexc or get_mexc()
+        self.offset_ms = 0.0
+        self.synced_at = 0.0
+
+    async def sync(self):
+        t0 = time.time()
+        server = await self.mexc.server_time()
+        t1 = time.time()
+        # server trả giờ ở khoảng giữa lúc gửi và lúc nhận
+        self.offset_ms = server - (t0 + t1) / 2 * 1000
+        self.synced_at = t1
+        logging.info(f"[scheduler] Lệch giờ MEXC {self.offset_ms:+.0f}ms (RTT {(t1 - t0) * 1000:.0f}ms)")
+
+    async def maybe_sync(self):
+        if time.time() - self.synced_at > CLOCK_SYNC_INTERVAL:
+            try:
+                await self.sync()
+            except Exception as e:
+                logging.warning(f"[scheduler] Không lấy được giờ MEXC, dùng offset cũ: {e}")
+                self.synced_at = time.time()
+
+    def now_ms(self) -> float:
+        return time.time() * 1000 + self.offset_ms
+
+
+def next_close(now_ms: float, interval_ms: int) -> int:
+    """Thời điểm đóng nến kế tiếp (ms) của khung `interval_ms`."""
+    return (int(now_ms) // interval_ms + 1) * interval_ms
+
+
+class CandleCloseScheduler:
+    """
+    `intervals` là danh sách tên khung của MEXC (vd "15m", "60m", "4h").
+    callback: `await callback(intervals_closed, close_ms)`; nhiều khung đóng cùng
+    lúc (vd 15m + 60m lúc tròn giờ) được gộp vào 1 lần gọi.
+    """
+
+    def __init__(self, intervals, callback, clock: MexcClock | None = None,
+                 grace: float = SIGNAL_CLOSE_GRACE):
+        self.intervals = list(intervals)
+        self.callback = callback
+        self.clock = clock or MexcClock()
+        self.grace = grace
+        self.delays = defaultdict(lambda: deque(maxlen=100))  # interval -> độ trễ giao tín hiệu (s)
+
+    def upcoming(self) -> tuple[int, list]:
+        now = self.clock.now_ms()
+        closes = {iv: next_close(now, INTERVAL_MS[iv]) for iv in self.intervals}
+        close_ms = min(closes.values())
+        return close_ms, [iv for iv, c in closes.items() if c == close_ms]
+
+    def record_delivery(self, interval: str, close_ms: int) -> float:
+        """Ghi lại số giây từ lúc đóng nến tới khi tín hiệu được gửi xong."""
+        delay = (self.clock.now_ms() - close_ms) / 1000
+        self.delays[interval].append(delay)
+        return delay
+
+    def summary(self) -> str:
+        parts = []
+        for iv in self.intervals:
+            d = self.delays.get(iv)
+            if d:
+                parts.append(f"{iv}: {len(d)} lần, TB {sum(d)/len(d):.1f}s, max {max(d):.1f}s")
+        return " | ".join(parts) if parts else "chưa có tín hiệu nào"
+
+    async def run(self):
+        await self.clock.maybe_sync()
+        while True:
+            close_ms, closed = self.upcoming()
+            wait = (close_ms - self.clock.now_ms()) / 1000 + self.grace
+            await asyncio.sleep(max(0.0, wait))
+            started = time.perf_counter()
+            try:
+                await self.callback(closed, close_ms)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Lỗi xử lý đóng nến {closed}: {e}")
+            LOOP_SECONDS.labels("candle_close").observe(time.perf_counter() - started)
+            await self.clock.maybe_sync()
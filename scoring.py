@@ -0,0 +1,44 @@
+"""
+Chấm điểm MUA/BÁN dùng chung cho generate_signal (/signal, auto-signal)
+và bộ quét nhiều cặp (scanner).
+"""
+
+
+def signal_scores(row) -> tuple[int, int]:
+    """
+    (điểm MUA, điểm BÁN) từ dòng chỉ báo cuối (dict hoặc pd.Series có các
+    khoá ema8, ema21, macd, macd_signal, rsi, close, stoch_k, stoch_d).
+    """
+    ema8, ema21 = row["ema8"], row["ema21"]
+    macd, macd_signal = row["macd"], row["macd_signal"]
+    rsi, price = row["rsi"], row["close"]
+    stoch_k, stoch_d = row["stoch_k"], row["stoch_d"]
+
+    buy_conditions = [
+        (ema8 > ema21),
+        (macd > macd_signal),
+        (rsi > 40 and rsi < 70),
+        (price > ema8),
+        (stoch_k > stoch_d)
+    ]
+    sell_conditions = [
+        (ema8 < ema21),
+        (macd < macd_signal),
+        (rsi > 70 or rsi < 30),
+        (price < ema21),
+        (stoch_k < stoch_d)
+    ]
+    return int(sum(buy_conditions)), int(sum(sell_conditions))
+
+
+def classify_signal(buy_score: int, sell_score: int) -> tuple[str, str]:
+    """(kết luận, mô tả mức độ) theo điểm MUA/BÁN."""
+    if buy_score >= 4 and sell_score <= 2:
+        if buy_score == 5:
+            return "🟢 MUA mạnh", "Tín hiệu mua rất mạnh (5/5 chỉ báo ủng hộ)"
+        return "🟢 MUA yếu", "Xu hướng nghiêng tăng (đa phần chỉ báo ủng hộ)"
+    if sell_score >= 4 and buy_score <= 2:
+        if sell_score == 5:
+            return "🔴 BÁN mạnh", "Tín hiệu bán rất mạnh (5/5 chỉ báo ủng hộ)"
+        return "🔴 BÁN yếu", "Xu hướng nghiêng giảm (đa phần chỉ báo ủng hộ)"
+    return "⚪ Trung lập yếu", "Thị trường sideway hoặc tín hiệu yếu."
@@ -0,0 +1,124 @@
+"""
+Lưu trạng thái của bot xuống SQLite để khởi động lại không mất dữ liệu.
+
+Ghi kiểu write-behind: mỗi key đăng ký một hàm `dump()` trả về giá trị hiện
+tại. Task nền gọi `flush()` định kỳ và chỉ ghi các key có giá trị đổi so với
+lần ghi trước. Các handler không phải gọi store khi sửa state. Lúc khởi động,
+`load()` đọc lại toàn bộ trong một truy vấn.
+
+Giá trị được pickle (file nội bộ của bot). Trên Render, STATE_DB cần trỏ vào
+ổ đĩa bền (persistent disk) để sống qua các lần deploy.
+"""
+import asyncio
+import logging
+import os
+import pickle
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable
+
+from metrics import LOOP_SECONDS
+
+STATE_DB = os.getenv("STATE_DB", "data/state.sqlite")
+STATE_FLUSH_INTERVAL = float(os.getenv("STATE_FLUSH_INTERVAL", 5))  # giây
+
+
+@dataclass
+class _Tracked:
+    dump: Callable[[], Any]
+    every: float = 0.0       # giây tối thiểu giữa 2 lần ghi key này
+    written: bytes | None = None
+    written_at: float = 0.0
+
+
+class StateStore:
+    def __init__(self, path: str = STATE_DB):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._tracked = {}  # key -> _Tracked
+        self.writes = 0
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS state (
+                    key TEXT PRIMARY KEY,
+                    value BLOB NOT NULL,
+                    updated REAL NOT NULL
+                )"""
+            )
+
+    def load(self, keys: Iterable[str] | None = None) -> dict:
+        """{key: giá trị} của mọi key đã lưu (hoặc chỉ `keys`); key hỏng bị bỏ qua."""
+        out = {}
+        if keys is None:
+            rows = self._conn.execute("SELECT key, value FROM state")
+        else:
+            keys = list(keys)
+            rows = self._conn.execute(
+                f"SELECT key, value FROM state WHERE key IN ({','.join('?' * len(keys))})", keys
+            )
+        for key, blob in rows:
+            try:
+                out[key] = pickle.loads(blob)
+            except Exception as e:
+                logging.warning(f"[state] Bỏ qua key {key} không đọc được: {e}")
+                continue
+            if key in self._tracked:
+                self._tracked[key].written = blob
+        return out
+
+    def track(self, key: str, dump: Callable[[], Any], every: float = 0.0):
+        """Đăng ký `key`; `dump()` trả về giá trị cần lưu (None = bỏ qua)."""
+        self._tracked[key] = _Tracked(dump, every)
+
+    def flush(self, force: bool = False) -> int:
+        """Ghi các key đã đổi; trả về số key đã ghi."""
+        now = time.time()
+        rows = []
+        for key, t in self._tracked.items():
+            if not force and now - t.written_at < t.every:
+                continue
+            try:
+                value = t.dump()
+                if value is None:
+                    continue
+                blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            except Exception as e:
+                logging.warning(f"[state] Lỗi đọc {key}: {e}")
+                continue
+            if blob != t.written:
+                rows.append((key, blob, now))
+                t.written = blob
+            t.written_at = now
+        if rows:
+            with self._conn:
+                self._conn.executemany("INSERT OR REPLACE INTO state VALUES (?,?,?)", rows)
+            self.writes += len(rows)
+        return len(rows)
+
+    async def run(self, interval: float = STATE_FLUSH_INTERVAL):
+        logging.info(f"💾 Lưu state vào {self.path} mỗi {interval:.0f}s đã khởi động nền...")
+        while True:
+            await asyncio.sleep(interval)
+            started = time.perf_counter()
+            try:
+                self.flush()
+            except Exception as e:
+                logging.error(f"Lỗi khi lưu state: {e}")
+            LOOP_SECONDS.labels("state_flush").observe(time.perf_counter() - started)
+
+    def close(self):
+        self._conn.close()
+
+
+_store: StateStore | None = None
+
+
+def get_state_store() -> StateStore:
+    global _store
+    if _store is None:
+        _store = StateStore()
+    return _store
@@ -0,0 +1,209 @@
+"""
+Chỉ mục các lệnh chuyển HELI (event `transfer`) của những ví được theo dõi
+(CORE_WALLETS), lưu trên đĩa (SQLite).
+
+Mỗi ví có một con trỏ: height cao nhất đã ghi. `sync()` đọc
+/cosmos/tx/v1beta1/txs theo `transfer.sender`, mới nhất trước, và dừng ở
+height đã ghi nên mỗi lần chỉ tải tx mới. Lần đầu tải lùi
+TRANSFER_HISTORY_DAYS ngày. Số lượng và thời điểm được parse một lần lúc ghi;
+tổng chuyển ra theo cửa sổ 7d/30d/90d là một truy vấn SQL.
+"""
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+from block_follower import decode_attr
+from clients import LcdClient, get_lcd
+
+TRANSFER_DB = os.getenv("TRANSFER_DB", "data/transfers.sqlite")
+TRANSFER_HISTORY_DAYS = int(os.getenv("TRANSFER_HISTORY_DAYS", 90))  # lịch sử tải lần đầu
+TRANSFER_PAGE_LIMIT = 100
+OUTFLOW_WINDOWS = {"7d": 7, "30d": 30, "90d": 90}  # nhãn -> số ngày
+
+
+def parse_time(value: str) -> float | None:
+    """Timestamp RFC3339 của LCD -> epoch giây (UTC); None nếu lỗi."""
+    try:
+        ts = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except (TypeError, ValueError):
+        return None
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp()
+
+
+def parse_uheli(amount: str) -> int:
+    """'123uheli' hoặc '5ibc/...,123uheli' -> 123."""
+    total = 0
+    for coin in (amount or "").split(","):
+        coin = coin.strip()
+        if coin.endswith("uheli") and coin[:-5].isdigit():
+            total += int(coin[:-5])
+    return total
+
+
+def _transfer_events(tx: dict) -> list[dict]:
+    events = tx.get("events")
+    if events:
+        return [e for e in events if e.get("type") == "transfer"]
+    # SDK cũ: chỉ có logs, các transfer của một msg bị gộp vào một event
+    return [e for log in tx.get("logs") or [] for e in log.get("events", []) if e.get("type") == "transfer"]
+
+
+def transfers_from_tx(tx: dict) -> list[tuple]:
+    """
+    Các dòng (txhash, seq, sender, recipient, amount uheli, height, ts) của một
+    tx thành công. Event bị gộp (key lặp lại) được tách thành từng transfer.
+    """
+    if int(tx.get("code", 0) or 0) != 0:
+        return []
+    txhash, height, ts = tx.get("txhash", ""), int(tx.get("height", 0)), parse_time(tx.get("timestamp", ""))
+    rows = []
+
+    def emit(attrs: dict):
+        amount = parse_uheli(attrs.get("amount", ""))
+        if amount and attrs.get("sender"):
+            rows.append((txhash, len(rows), attrs["sender"], attrs.get("recipient", ""), amount, height, ts))
+
+    for event in _transfer_events(tx):
+        attrs = {}
+        for attr in event.get("attributes") or []:
+            key, value = attr.get("key") or "", attr.get("value") or ""
+            decoded = decode_attr(key)
+            if decoded != key and decoded.isidentifier():  # event base64 (CometBFT <= 0.34)
+                key, value = decoded, decode_attr(value)
+            if key in attrs and key in ("recipient", "sender", "amount"):
+                emit(attrs)
+                attrs = {}
+            attrs[key] = value
+        emit(attrs)
+    return rows
+
+
+class TransferIndex:
+    def __init__(self, path: str = TRANSFER_DB):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS transfers (
+                    txhash TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    sender TEXT NOT NULL,
+                    recipient TEXT NOT NULL,
+                    amount INTEGER NOT NULL,
+                    height INTEGER NOT NULL,
+                    ts REAL,
+                    PRIMARY KEY (txhash, seq)
+                ) WITHOUT ROWID"""
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS transfers_sender_ts ON transfers (sender, ts)")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS cursors (
+                    address TEXT PRIMARY KEY,
+                    height INTEGER NOT NULL,
+                    since REAL NOT NULL,
+                    synced REAL NOT NULL
+                )"""
+            )
+
+    # --- Truy vấn cục bộ ---
+    def add(self, rows: list[tuple]) -> int:
+        """Ghi các transfer (bỏ qua dòng đã có); trả về số dòng mới."""
+        if not rows:
+            return 0
+        with self._lock, self._conn:
+            before = self._conn.total_changes
+            self._conn.executemany("INSERT OR IGNORE INTO transfers VALUES (?,?,?,?,?,?,?)", rows)
+            return self._conn.total_changes - before
+
+    def cursor(self, address: str) -> tuple[int, float, float] | None:
+        """(height đã ghi tới, bắt đầu lịch sử từ, lần đồng bộ cuối) hoặc None nếu chưa đồng bộ."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT height, since, synced FROM cursors WHERE address=?", (address,)
+            ).fetchone()
+
+    def _set_cursor(self, address: str, height: int, since: float):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cursors VALUES (?,?,?,?)", (address, height, since, time.time())
+            )
+
+    def outflows(self, address: str, windows: dict = OUTFLOW_WINDOWS, now: float | None = None) -> dict:
+        """{nhãn: tổng uheli chuyển ra} cho từng cửa sổ ngày, một truy vấn."""
+        now = time.time() if now is None else now
+        cutoffs = [now - days * 86400 for days in windows.values()]
+        sums = ", ".join("COALESCE(SUM(CASE WHEN ts>=? THEN amount END), 0)" for _ in cutoffs)
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {sums} FROM transfers WHERE sender=? AND ts>=?", (*cutoffs, address, min(cutoffs))
+            ).fetchone()
+        return dict(zip(windows, row))
+
+    # --- Đồng bộ với LCD ---
+    async def sync(self, address: str, lcd: LcdClient | None = None) -> int:
+        """Tải các tx mới (sender = `address`) từ con trỏ trở đi; trả về số transfer mới."""
+        lcd = lcd or get_lcd()
+        cursor = self.cursor(address)
+        stop_height = cursor[0] if cursor else 0
+        since = cursor[1] if cursor else time.time() - TRANSFER_HISTORY_DAYS * 86400
+        top, added, offset = stop_height, 0, 0
+        by_page, first_hash = False, None
+        while True:
+            data = await lcd.txs_by_event(f"transfer.sender='{address}'", offset, TRANSFER_PAGE_LIMIT, by_page)
+            txs = data.get("tx_responses") or []
+            if offset and txs and txs[0].get("txhash") == first_hash:
+                # LCD bỏ qua pagination.offset và trả lại trang đầu: chuyển sang page/limit
+                if by_page:
+                    logging.warning(f"[transfers] LCD lặp lại trang tx của {address}, dừng (giữ con trỏ cũ)")
+                    return added
+                by_page = True
+                continue
+            if offset == 0:
+                first_hash = txs[0].get("txhash") if txs else None
+            done = len(txs) < TRANSFER_PAGE_LIMIT
+            rows = []
+            for tx in txs:
+                height, ts = int(tx.get("height", 0)), parse_time(tx.get("timestamp", ""))
+                if height <= stop_height or (ts is not None and ts < since):
+                    done = True
+                    break
+                top = max(top, height)
+                rows += transfers_from_tx(tx)
+            added += self.add(rows)
+            if done:
+                break
+            offset += len(txs)
+        # Con trỏ chỉ tiến khi đã đi hết phần mới: lỗi giữa chừng thì lần sau đọc lại (dòng trùng bị bỏ qua)
+        self._set_cursor(address, top, since)
+        return added
+
+    async def sync_all(self, addresses) -> int:
+        """Đồng bộ song song; ví lỗi được log và giữ con trỏ cũ."""
+        addresses = list(addresses)
+        results = await asyncio.gather(*(self.sync(a) for a in addresses), return_exceptions=True)
+        added = 0
+        for address, result in zip(addresses, results):
+            if isinstance(result, Exception):
+                logging.warning(f"[transfers] Lỗi đồng bộ {address}: {result}")
+            else:
+                added += result
+        return added
+
+
+_index: TransferIndex | None = None
+
+
+def get_transfer_index() -> TransferIndex:
+    global _index
+    if _index is None:
+        _index = TransferIndex()
+    return _index
@@ -0,0 +1,210 @@
+"""
+Cảnh báo ví lớn (core team, DAO, incentive, cá voi) chuyển / stake / unstake
+HELI, theo dõi trực tiếp từ block mới.
+
+TransferWatcher là consumer của BlockFollower (follower riêng, con trỏ height
+được lưu qua state_store nên khởi động lại thì đọc tiếp từ block cũ). Mỗi
+event `transfer`, `delegate`, `unbond` được tra trong dict địa chỉ -> nhãn
+(O(1) mỗi event), nên theo dõi hàng nghìn ví không cần poll từng ví. Event
+vượt ngưỡng thành WatchAlert trong hàng đợi để task gửi tin đọc ra.
+
+Danh sách ví: CORE_WALLETS (heli_bot) + WATCH_ADDRESSES ("heli1...:Nhãn,...")
++ file WATCH_FILE (mỗi dòng "heli1... Nhãn", dòng # bỏ qua).
+
+Replay block_results đã lưu (test):
+    python transfer_watcher.py data/blocks [heli1... ...]
+"""
+import asyncio
+import logging
+import os
+import sys
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+from block_follower import BlockEvent, BlockFollower
+from clients import get_rpc
+from transfer_index import parse_uheli
+
+TRANSFER_WATCH = os.getenv("TRANSFER_WATCH", "1") != "0"
+WATCH_ADDRESSES = os.getenv("WATCH_ADDRESSES", "")
+WATCH_FILE = os.getenv("WATCH_FILE", "")
+WATCH_TRANSFER_MIN = float(os.getenv("WATCH_TRANSFER_MIN", 100_000))  # HELI
+WATCH_STAKING_MIN = float(os.getenv("WATCH_STAKING_MIN", 500_000))    # HELI, delegate / unbond
+WATCH_MAX_CATCHUP = int(os.getenv("WATCH_MAX_CATCHUP", 2000))         # block đọc bù sau khi khởi động lại
+WATCH_QUEUE = 1000
+
+KIND_TEXT = {
+    "send": "📤 chuyển ra",
+    "receive": "📥 nhận vào",
+    "delegate": "🔒 stake",
+    "unbond": "⏳ unstake",
+}
+
+
+def _amount(value: str) -> int:
+    """uheli từ '123uheli', '5ibc/..,123uheli' hoặc '123' (event staking SDK cũ)."""
+    value = (value or "").strip()
+    return int(value) if value.isdigit() else parse_uheli(value)
+
+
+def short_address(address: str) -> str:
+    return f"{address[:10]}...{address[-6:]}" if len(address) > 20 else address
+
+
+@dataclass
+class WatchAlert:
+    height: int
+    kind: str           # send / receive / delegate / unbond
+    address: str        # ví được theo dõi
+    label: str
+    amount: int         # uheli
+    counterparty: str   # ví nhận / gửi hoặc validator
+
+    def format(self) -> str:
+        arrow = "➡️" if self.kind in ("send", "delegate", "unbond") else "⬅️"
+        return (
+            f"🚨 Ví lớn {KIND_TEXT.get(self.kind, self.kind)} {self.amount / 1e6:,.0f} HELI\n"
+            f"🔹 {self.label} ({short_address(self.address)})\n"
+            f"{arrow} {short_address(self.counterparty) or '?'}\n"
+            f"⛓ Block {self.height}"
+        )
+
+
+def load_watch_list(raw: str = WATCH_ADDRESSES, path: str = WATCH_FILE) -> dict:
+    """{địa chỉ: nhãn} từ biến môi trường và file."""
+    watched = {}
+    for part in raw.split(","):
+        address, _, label = part.strip().partition(":")
+        if address:
+            watched[address] = label.strip() or address
+    if path:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                address, _, label = line.partition(" ")
+                watched[address] = label.strip() or address
+    return watched
+
+
+class TransferWatcher:
+    """Consumer của BlockFollower: lọc event theo tập địa chỉ theo dõi."""
+
+    def __init__(self, watched: dict | None = None,
+                 transfer_min: float = WATCH_TRANSFER_MIN, staking_min: float = WATCH_STAKING_MIN):
+        self.watched = dict(watched or {})  # địa chỉ -> nhãn
+        self.transfer_min = int(transfer_min * 1e6)  # uheli
+        self.staking_min = int(staking_min * 1e6)
+        self.height = None  # block cuối đã xử lý (lưu qua state_store)
+        self.alerts = asyncio.Queue(maxsize=WATCH_QUEUE)
+        self.events_seen = 0
+        self.matched = 0
+        self.alerted = {kind: 0 for kind in KIND_TEXT}
+        self.dropped = 0
+        self.gaps = 0
+
+    def watch(self, address: str, label: str | None = None):
+        self.watched[address] = label or self.watched.get(address) or address
+
+    def watch_many(self, addresses: dict):
+        for address, label in addresses.items():
+            self.watch(address, label)
+
+    # --- BlockFollower consumer ---
+    def apply_block(self, height: int, events: list[BlockEvent]):
+        if self.height is not None and height <= self.height:
+            return
+        senders = {}
+        for ev in events:
+            if ev.type == "message" and ev.tx_index is not None and ev.attrs.get("sender"):
+                senders.setdefault(ev.tx_index, ev.attrs["sender"])
+
+        watched = self.watched
+        for ev in events:
+            self.events_seen += 1
+            if ev.type == "transfer":
+                sender, recipient = ev.attrs.get("sender", ""), ev.attrs.get("recipient", "")
+                if sender in watched or recipient in watched:
+                    self.matched += 1
+                    amount = _amount(ev.attrs.get("amount"))
+                    if amount >= self.transfer_min:
+                        if sender in watched:
+                            self._emit(WatchAlert(height, "send", sender, watched[sender], amount, recipient))
+                        if recipient in watched:
+                            self._emit(WatchAlert(height, "receive", recipient, watched[recipient], amount, sender))
+            elif ev.type in ("delegate", "unbond"):
+                delegator = ev.attrs.get("delegator") or senders.get(ev.tx_index, "")
+                if delegator in watched:
+                    self.matched += 1
+                    amount = _amount(ev.attrs.get("amount"))
+                    if amount >= self.staking_min:
+                        self._emit(WatchAlert(
+                            height, ev.type, delegator, watched[delegator], amount, ev.attrs.get("validator", "")
+                        ))
+        self.height = height
+
+    def on_gap(self, height: int):
+        self.gaps += 1
+        self.height = height
+
+    def _emit(self, alert: WatchAlert):
+        try:
+            self.alerts.put_nowait(alert)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logging.warning(f"[watch] Hàng đợi cảnh báo đầy, bỏ cảnh báo block {alert.height}")
+            return
+        self.alerted[alert.kind] += 1
+
+    def drain(self) -> list[WatchAlert]:
+        """Lấy hết cảnh báo đang chờ (dùng khi replay / test)."""
+        out = []
+        while not self.alerts.empty():
+            out.append(self.alerts.get_nowait())
+        return out
+
+
+async def run_transfer_watcher(watcher: TransferWatcher, notify: Callable[[WatchAlert], Awaitable],
+                               follower: BlockFollower | None = None):
+    """Task nền: đọc block từ con trỏ đã lưu (hoặc block mới nhất) và gửi cảnh báo."""
+    follower = follower or BlockFollower(get_rpc(), max_catchup=WATCH_MAX_CATCHUP, name="transfer_watch")
+    follower.height = watcher.height
+    follower.subscribe(watcher)
+    follow_task = asyncio.create_task(follower.run())
+    logging.info(
+        f"🚨 Theo dõi {len(watcher.watched)} ví lớn từ block {watcher.height or 'mới nhất'} "
+        f"(chuyển ≥ {watcher.transfer_min / 1e6:,.0f}, stake/unstake ≥ {watcher.staking_min / 1e6:,.0f} HELI)"
+    )
+    try:
+        while True:
+            alert = await watcher.alerts.get()
+            try:
+                await notify(alert)
+            except Exception as e:
+                logging.error(f"Lỗi gửi cảnh báo ví lớn: {e}")
+    finally:
+        follow_task.cancel()
+
+
+_watcher: TransferWatcher | None = None
+
+
+def get_transfer_watcher() -> TransferWatcher:
+    global _watcher
+    if _watcher is None:
+        _watcher = TransferWatcher(load_watch_list())
+    return _watcher
+
+
+if __name__ == "__main__":
+    directory, *addresses = sys.argv[1:] or ["."]
+    watcher = get_transfer_watcher()
+    watcher.watch_many({a: a for a in addresses})
+    follower = BlockFollower()
+    follower.subscribe(watcher)
+    blocks = follower.replay_dir(directory)
+    for alert in watcher.drain():
+        print(alert.format(), end="\n\n")
+    print(f"{blocks} block, {watcher.events_seen} event, {watcher.matched} khớp ví theo dõi, "
+          f"{sum(watcher.alerted.values())} cảnh báo")
@@ -0,0 +1,357 @@
+"""
+Snapshot unbonding toàn mạng: quét `unbonding_delegations` của mọi validator
+một lần, các lệnh /unstake, /heatmap, /unbonding_wallets, /heliinfo cùng đọc.
+
+Sau lượt quét đầu, UnbondingTracker cập nhật state từ event của block mới
+(`unbond`, `complete_unbonding`, `cancel_unbonding_delegation`) nên các lệnh
+không phải quét lại toàn mạng.
+"""
+import asyncio
+import logging
+import os
+import re
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+from dateutil import parser
+
+from block_follower import BlockEvent, BlockFollower
+from clients import LcdClient, get_lcd, get_rpc
+from fanout import ScanStats, scan_paginated
+
+SNAPSHOT_MAX_AGE = 60  # giây, snapshot cũ hơn sẽ quét lại
+TRACKER_STALE_AFTER = 120  # giây không nhận block thì quay về quét LCD
+TRACKER_RESEED_INTERVAL = int(os.getenv("TRACKER_RESEED_INTERVAL", 6 * 3600))  # quét lại định kỳ để chống lệch
+UNBONDING_TRACKER = os.getenv("UNBONDING_TRACKER", "1") != "0"
+UNBONDING_SCAN_INTERVAL = int(os.getenv("UNBONDING_SCAN_INTERVAL", 30 * 60))  # giây giữa 2 lượt quét LCD nền khi tracker không live
+
+_AMOUNT = re.compile(r"^\s*(\d+)")
+
+
+@dataclass
+class UnbondingEntry:
+    delegator: str
+    validator: str
+    balance: int                      # uheli
+    completion_time: datetime | None  # UTC
+    creation_height: int = 0
+
+
+@dataclass
+class UnbondingSnapshot:
+    entries: list[UnbondingEntry] = field(default_factory=list)
+    taken_at: float = field(default_factory=time.time)
+    validators_scanned: int = 0
+    failed_validators: list[str] = field(default_factory=list)
+    stats: ScanStats | None = None
+
+    def total(self) -> int:
+        """Tổng uheli đang unbonding."""
+        return sum(e.balance for e in self.entries)
+
+    def by_delegator(self) -> dict[str, int]:
+        out = defaultdict(int)
+        for e in self.entries:
+            out[e.delegator] += e.balance
+        return dict(out)
+
+    def by_validator(self) -> dict[str, int]:
+        out = defaultdict(int)
+        for e in self.entries:
+            out[e.validator] += e.balance
+        return dict(out)
+
+    def wallet_count(self) -> int:
+        return len({e.delegator for e in self.entries})
+
+    def top_wallets(self, n: int = 10) -> list[tuple[str, int]]:
+        return sorted(self.by_delegator().items(), key=lambda x: x[1], reverse=True)[:n]
+
+    def heatmap(self, days: int = 14, now: datetime | None = None) -> dict[int, int]:
+        """uheli sẽ được giải phóng theo số ngày còn lại (0..days)."""
+        now = now or datetime.now(timezone.utc)
+        heatmap = {i: 0 for i in range(days + 1)}
+        for e in self.entries:
+            if e.completion_time is None:
+                continue
+            days_left = (e.completion_time - now).days
+            if 0 <= days_left <= days:
+                heatmap[days_left] += e.balance
+        return heatmap
+
+    def age(self) -> float:
+        return time.time() - self.taken_at
+
+
+def _parse_time(ts: str | None) -> datetime | None:
+    if not ts:
+        return None
+    try:
+        dt = parser.isoparse(ts)
+    except Exception as e:
+        logging.warning(f"Lỗi parse completion_time: {e}")
+        return None
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+def _parse_int(value) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        try:
+            return int(float(value))
+        except (TypeError, ValueError):
+            return 0
+
+
+def parse_unbonding_responses(responses: list[dict], valoper: str | None = None) -> list[UnbondingEntry]:
+    """Chuyển `unbonding_responses` của LCD thành danh sách UnbondingEntry."""
+    entries = []
+    for ub in responses:
+        delegator = ub.get("delegator_address")
+        validator = ub.get("validator_address") or valoper
+        for entry in ub.get("entries", []):
+            entries.append(UnbondingEntry(
+                delegator=delegator,
+                validator=validator,
+                balance=_parse_int(entry.get("balance", "0")),
+                completion_time=_parse_time(entry.get("completion_time")),
+                creation_height=_parse_int(entry.get("creation_height", 0)),
+            ))
+    return entries
+
+
+async def scan_unbonding(lcd: LcdClient | None = None, concurrency: int | None = None) -> UnbondingSnapshot:
+    """Quét toàn mạng một lượt (song song theo validator) và trả về snapshot."""
+    lcd = lcd or get_lcd()
+    validators = await lcd.validators(limit=2000)
+    valopers = [v.get("operator_address") for v in validators if v.get("operator_address")]
+
+    kwargs = {"concurrency": concurrency} if concurrency else {}
+    pages, stats = await scan_paginated(
+        valopers, lcd.validator_unbonding_page, name="unbonding", **kwargs
+    )
+
+    snapshot = UnbondingSnapshot(stats=stats)
+    for valoper in valopers:  # giữ thứ tự validator như LCD trả về
+        for page in pages.get(valoper, []):
+            snapshot.entries.extend(parse_unbonding_responses(page.get("unbonding_responses", []), valoper))
+    snapshot.validators_scanned = len(pages)
+    snapshot.failed_validators = list(stats.failures)
+    snapshot.taken_at = time.time()
+    return snapshot
+
+
+def _parse_amount(value: str | None) -> int:
+    """'123uheli' -> 123"""
+    m = _AMOUNT.match(value or "")
+    return int(m.group(1)) if m else 0
+
+
+class UnbondingTracker:
+    """State unbonding cập nhật theo event của từng block."""
+
+    def __init__(self):
+        self.entries = {}          # (delegator, validator) -> [UnbondingEntry]
+        self.height = None         # block cuối đã áp dụng
+        self.seeded_at = 0.0
+        self.updated_at = 0.0
+        self.validators_scanned = 0
+        self.needs_reseed = False
+        self.cancels_applied = set()  # (height, delegator, validator, creation_height) đã trừ
+        self.applied = {"unbond": 0, "complete_unbonding": 0, "cancel_unbonding_delegation": 0}
+
+    def seed(self, snapshot: UnbondingSnapshot, height: int):
+        """Nạp state ban đầu từ lượt quét LCD ứng với block `height`."""
+        self.entries = {}
+        for e in snapshot.entries:
+            self.entries.setdefault((e.delegator, e.validator), []).append(e)
+        self.height = height
+        self.cancels_applied = set()
+        self.validators_scanned = snapshot.validators_scanned
+        self.seeded_at = self.updated_at = time.time()
+        self.needs_reseed = False
+
+    def is_live(self) -> bool:
+        return (
+            self.height is not None
+            and not self.needs_reseed
+            and time.time() - self.updated_at <= TRACKER_STALE_AFTER
+        )
+
+    # --- BlockFollower consumer ---
+    def apply_block(self, height: int, events: list[BlockEvent]):
+        if self.height is not None and height <= self.height:
+            return  # block đã có trong lượt quét seed
+        senders = {}
+        for ev in events:
+            if ev.type == "message" and ev.tx_index is not None and ev.attrs.get("sender"):
+                senders.setdefault(ev.tx_index, ev.attrs["sender"])
+
+        for ev in events:
+            if ev.type == "unbond":
+                self._on_unbond(height, ev, senders.get(ev.tx_index))
+            elif ev.type == "complete_unbonding":
+                self._on_complete(ev)
+            elif ev.type == "cancel_unbonding_delegation":
+                self._on_cancel(height, ev)
+        self.height = height
+        self.updated_at = time.time()
+
+    def on_gap(self, height: int):
+        self.needs_reseed = True
+
+    def _on_unbond(self, height: int, ev: BlockEvent, sender: str | None):
+        delegator = ev.attrs.get("delegator") or sender
+        validator = ev.attrs.get("validator")
+        amount = _parse_amount(ev.attrs.get("amount"))
+        if not delegator or not validator or amount <= 0:
+            return
+        bucket = self.entries.setdefault((delegator, validator), [])
+        if any(e.creation_height == height and e.balance == amount for e in bucket):
+            return  # đã có trong lượt quét seed
+        bucket.append(UnbondingEntry(
+            delegator=delegator,
+            validator=validator,
+            balance=amount,
+            completion_time=_parse_time(ev.attrs.get("completion_time")),
+            creation_height=height,
+        ))
+        self.applied["unbond"] += 1
+
+    def _on_complete(self, ev: BlockEvent):
+        key = (ev.attrs.get("delegator"), ev.attrs.get("validator"))
+        bucket = self.entries.get(key)
+        if not bucket:
+            return
+        # Chỉ giải phóng entry đã đáo hạn: event lặp lại (hoặc đã có trong
+        # lượt quét) không xoá nhầm entry còn hiệu lực
+        now = datetime.now(timezone.utc)
+        remaining = _parse_amount(ev.attrs.get("amount"))
+        kept = []
+        for e in bucket:
+            if e.completion_time is not None and e.completion_time <= now:
+                remaining -= e.balance
+            else:
+                kept.append(e)
+        # Entry không rõ thời điểm đáo hạn: trừ theo phần số lượng còn lại
+        for e in [e for e in kept if e.completion_time is None]:
+            if remaining <= 0:
+                break
+            remaining -= e.balance
+            kept.remove(e)
+        if kept:
+            self.entries[key] = kept
+        else:
+            del self.entries[key]
+        self.applied["complete_unbonding"] += 1
+
+    def _on_cancel(self, height: int, ev: BlockEvent):
+        key = (ev.attrs.get("delegator"), ev.attrs.get("validator"))
+        bucket = self.entries.get(key)
+        if not bucket:
+            return
+        amount = _parse_amount(ev.attrs.get("amount"))
+        creation_height = _parse_int(ev.attrs.get("creation_height"))
+        applied_key = (height, *key, creation_height)
+        if applied_key in self.cancels_applied:
+            return  # cùng event cancel đã trừ
+        self.cancels_applied.add(applied_key)
+        for e in bucket:
+            if e.creation_height == creation_height:
+                e.balance -= amount
+                break
+        self.entries[key] = [e for e in bucket if e.balance > 0]
+        if not self.entries[key]:
+            del self.entries[key]
+        self.applied["cancel_unbonding_delegation"] += 1
+
+    def snapshot(self) -> UnbondingSnapshot:
+        """Snapshot hiện tại (bỏ các entry đã đáo hạn)."""
+        now = datetime.now(timezone.utc)
+        entries = [
+            e for bucket in self.entries.values() for e in bucket
+            if e.completion_time is None or e.completion_time > now
+        ]
+        return UnbondingSnapshot(
+            entries=entries,
+            taken_at=self.updated_at,
+            validators_scanned=self.validators_scanned,
+        )
+
+
+_snapshot: UnbondingSnapshot | None = None
+_snapshot_lock = asyncio.Lock()
+_tracker = UnbondingTracker()
+
+
+def get_tracker() -> UnbondingTracker:
+    return _tracker
+
+
+def invalidate_snapshot():
+    """Bỏ lượt quét LCD đang giữ (lần đọc sau quét lại nếu tracker không live)."""
+    global _snapshot
+    _snapshot = None
+
+
+async def get_unbonding_snapshot(max_age: float = SNAPSHOT_MAX_AGE) -> UnbondingSnapshot:
+    """
+    Trả về snapshot còn mới; nếu đã cũ thì quét lại. Các lệnh gọi đồng thời
+    chờ chung một lượt quét.
+    """
+    global _snapshot
+    if _tracker.is_live():
+        return _tracker.snapshot()
+    if _snapshot is not None and _snapshot.age() <= max_age:
+        return _snapshot
+    async with _snapshot_lock:
+        if _snapshot is not None and _snapshot.age() <= max_age:
+            return _snapshot
+        _snapshot = await scan_unbonding()
+        logging.info(
+            f"🔓 Quét unbonding xong: {_snapshot.validators_scanned} validator, "
+            f"{len(_snapshot.entries)} entry trong {_snapshot.stats.elapsed:.1f}s"
+        )
+        return _snapshot
+
+
+async def seed_tracker(follower: BlockFollower):
+    """Quét LCD một lần rồi gắn tracker vào block hiện tại của follower."""
+    global _snapshot
+    # giữ lock để get_unbonding_snapshot chờ lượt quét này thay vì quét song song
+    async with _snapshot_lock:
+        snapshot = await scan_unbonding()
+        # Height lấy SAU khi quét: các block tới đây coi như đã nằm trong lượt
+        # quét, follower không áp dụng lại (complete/cancel không được trừ 2 lần)
+        height = await follower.rpc.latest_height()
+        _tracker.seed(snapshot, height)
+        _snapshot = snapshot
+    if follower.height is None or follower.height < height:
+        follower.height = height
+    logging.info(f"🔓 Tracker unbonding đã seed tại block {height} ({len(snapshot.entries)} entry)")
+
+
+async def run_unbonding_tracker(follower: BlockFollower | None = None):
+    """Task nền: seed từ LCD, theo dõi block mới, seed lại khi lệch hoặc định kỳ."""
+    follower = follower or BlockFollower(get_rpc())
+    follower.subscribe(_tracker)
+    follow_task = None
+    while True:
+        try:
+            if _tracker.height is None or _tracker.needs_reseed or \
+                    time.time() - _tracker.seeded_at > TRACKER_RESEED_INTERVAL:
+                await seed_tracker(follower)
+            if follow_task is None or follow_task.done():
+                follow_task = asyncio.create_task(follower.run())
+        except asyncio.CancelledError:
+            if follow_task:
+                follow_task.cancel()
+            raise
+        except Exception as e:
+            logging.warning(f"🔓 Không seed được tracker unbonding: {e}")
+        await asyncio.sleep(30)
@@ -0,0 +1,127 @@
+"""
+Quản lý quyền user (/whoami, /grant, /revoke, /showusers).
+
+Tách khỏi heli_bot để boot.py trả lời /whoami ngay khi khởi động mà chưa
+phải nạp pandas/ta. Các set được sửa tại chỗ nên heli_bot và state_store
+dùng chung một đối tượng.
+"""
+import os
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+ADMIN_ID = 2028673755
+# Đọc danh sách ID từ biến môi trường ALLOWED_IDS
+env_ids = os.getenv("ALLOWED_IDS", "")
+ENV_USERS = set()
+
+if env_ids.strip():
+    # loại bỏ khoảng trắng khi split
+    ENV_USERS = set(int(uid.strip()) for uid in env_ids.split(",") if uid.strip())
+
+# Chỉ các thay đổi qua lệnh được lưu (state_store); ALLOWED_IDS luôn đọc lại từ env
+GRANTED_USERS = set()  # user được /grant thêm
+REVOKED_USERS = set()  # user bị /revoke (kể cả có trong ALLOWED_IDS)
+ALLOWED_USERS = set()  # = ENV_USERS ∪ GRANTED_USERS − REVOKED_USERS (+ ADMIN_ID)
+USER_STATE_KEYS = ("granted_users", "revoked_users")
+
+_revoke_hooks = []  # fn(user_id, context) chạy sau /revoke (heli_bot: bỏ chat + job)
+
+
+def rebuild_allowed():
+    """Tính lại ALLOWED_USERS tại chỗ (các module khác giữ cùng đối tượng set)."""
+    ALLOWED_USERS.clear()
+    ALLOWED_USERS.update((ENV_USERS | GRANTED_USERS) - REVOKED_USERS)
+    # Luôn đảm bảo ADMIN_ID nằm trong danh sách
+    ALLOWED_USERS.add(ADMIN_ID)
+
+
+rebuild_allowed()
+
+
+def track_users(store):
+    store.track("granted_users", lambda: sorted(GRANTED_USERS))
+    store.track("revoked_users", lambda: sorted(REVOKED_USERS))
+
+
+def restore_users(state: dict):
+    """Nạp /grant, /revoke đã lưu (state từ StateStore.load)."""
+    GRANTED_USERS.update(state.get("granted_users", ()))
+    REVOKED_USERS.update(state.get("revoked_users", ()))
+    rebuild_allowed()
+
+
+def on_revoke(fn):
+    _revoke_hooks.append(fn)
+    return fn
+
+
+def is_allowed(user_id: int) -> bool:
+    return user_id in ALLOWED_USERS
+
+async def whoami(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.effective_user.id
+    if is_allowed(user_id):
+        await update.message.reply_text(
+            f"👤 ID của bạn là `{user_id}` và đã có quyền.",
+            parse_mode="Markdown"
+        )
+    else:
+        await update.message.reply_text(
+            f"⚠️ ID của bạn là `{user_id}` nhưng *chưa được cấp quyền.*\n"
+            f"👉 Hãy gửi ID này cho admin để thêm vào biến `ALLOWED_IDS`.",
+            parse_mode="Markdown"
+        )
+
+async def showusers_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_allowed(update.effective_user.id):
+        await update.message.reply_text("🚫 Bạn không có quyền dùng lệnh này.")
+        return
+
+    env_ids = os.getenv("ALLOWED_IDS", "")
+    if not env_ids.strip():
+        await update.message.reply_text("⚠️ Hiện chưa có ID nào trong ALLOWED_IDS (biến môi trường).")
+        return
+
+    ids = [uid.strip() for uid in env_ids.split(",") if uid.strip()]
+    ids_list = "\n".join(f"- `{uid}`" for uid in sorted(ids, key=lambda x: int(x)))
+    msg = f"👥 *Danh sách ID trong ALLOWED_IDS (Render Env):*\n{ids_list}"
+    await update.message.reply_text(msg, parse_mode="Markdown")
+
+
+async def grant(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id != ADMIN_ID:
+        await update.message.reply_text("🚫 Bạn không có quyền thêm user.")
+        return
+    if not context.args:
+        await update.message.reply_text("⚠️ Dùng: /grant <user_id>")
+        return
+    try:
+        new_id = int(context.args[0])
+        GRANTED_USERS.add(new_id)
+        REVOKED_USERS.discard(new_id)
+        rebuild_allowed()
+        await update.message.reply_text(f"✅ Đã cấp quyền cho user {new_id}")
+    except ValueError:
+        await update.message.reply_text("⚠️ User ID không hợp lệ.")
+
+async def revoke(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id != ADMIN_ID:
+        await update.message.reply_text("🚫 Bạn không có quyền xoá user.")
+        return
+    if not context.args:
+        await update.message.reply_text("⚠️ Dùng: /revoke <user_id>")
+        return
+    try:
+        rem_id = int(context.args[0])
+        if rem_id in ALLOWED_USERS:
+            GRANTED_USERS.discard(rem_id)
+            REVOKED_USERS.add(rem_id)
+            rebuild_allowed()
+            for hook in _revoke_hooks:
+                hook(rem_id, context)
+            await update.message.reply_text(f"✅ Đã xoá quyền user {rem_id}")
+        else:
+            await update.message.reply_text("⚠️ User này chưa được cấp quyền.")
+    except ValueError:
+        await update.message.reply_text("⚠️ User ID không hợp lệ.")
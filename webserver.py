@@ -0,0 +1,94 @@
+"""
+Server aiohttp cho chế độ webhook trên Render: nhận update Telegram và phục
+vụ /metrics (Prometheus) trên cùng một cổng.
+
+Thay cho `Application.run_webhook` (server riêng của PTB, không thêm route
+được) nhưng giữ cùng vòng đời: initialize -> post_init -> set_webhook ->
+start, và khi dừng: stop -> post_stop -> shutdown -> post_shutdown.
+"""
+import asyncio
+import hmac
+import logging
+import os
+import signal
+from typing import Callable
+
+from aiohttp import web
+from telegram import Update
+from telegram.ext import Application
+
+import metrics
+
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")  # nếu đặt: /metrics cần ?token= hoặc Bearer
+
+
+def _metrics_allowed(request: web.Request) -> bool:
+    if not METRICS_TOKEN:
+        return True
+    auth = request.headers.get("Authorization", "")
+    given = auth[7:] if auth.startswith("Bearer ") else request.query.get("token", "")
+    return hmac.compare_digest(given, METRICS_TOKEN)
+
+
+def make_web_app(application: Application, url_path: str) -> web.Application:
+    async def telegram_update(request: web.Request) -> web.Response:
+        try:
+            data = await request.json()
+        except Exception:
+            return web.Response(status=400)
+        await application.update_queue.put(Update.de_json(data, application.bot))
+        return web.Response()
+
+    async def metrics_route(request: web.Request) -> web.Response:
+        if not _metrics_allowed(request):
+            return web.Response(status=401)
+        return web.Response(body=metrics.render().encode(), headers={"Content-Type": metrics.CONTENT_TYPE})
+
+    async def health(request: web.Request) -> web.Response:
+        return web.Response(text="ok")
+
+    app = web.Application()
+    app.router.add_post(f"/{url_path}", telegram_update)
+    app.router.add_get("/metrics", metrics_route)
+    app.router.add_get("/", health)
+    return app
+
+
+async def serve_webhook(
+    application: Application, port: int, url_path: str, webhook_url: str,
+    on_started: Callable[[], None] | None = None,
+):
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass
+
+    runner = web.AppRunner(make_web_app(application, url_path), access_log=None)
+    await application.initialize()
+    try:
+        if application.post_init:
+            await application.post_init(application)
+        await runner.setup()
+        await web.TCPSite(runner, "0.0.0.0", port).start()
+        await application.bot.set_webhook(webhook_url)
+        await application.start()
+        logging.info(f"🌐 Webhook + /metrics đang chạy trên cổng {port}")
+        if on_started is not None:
+            on_started()
+        await stop.wait()
+    finally:
+        await runner.cleanup()
+        if application.running:
+            await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+
+def run_webhook(application: Application, port: int, url_path: str, webhook_url: str, on_started=None):
+    asyncio.run(serve_webhook(application, port, url_path, webhook_url, on_started))